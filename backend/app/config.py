@@ -1,8 +1,4 @@
 import os
-from pymongo import MongoClient
-
-from langchain_groq import ChatGroq
-from langchain_nomic import NomicEmbeddings
 
 
 # ========= MongoDB =========
@@ -10,37 +6,196 @@ from langchain_nomic import NomicEmbeddings
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
 MONGODB_DB = os.getenv("MONGODB_DB", "ai_pdf_tutor")
 
-mongo_client = MongoClient(MONGODB_URI)
-db = mongo_client[MONGODB_DB]
+# Each process has two clients, each with its own connection pool:
+# - async (AsyncMongoClient): every request path; sized for concurrent requests
+# - sync (MongoClient): work that runs in threads, where the async client
+#   cannot be used: the ingestion jobs (up to INGEST_WORKERS x
+#   EMBED_CONCURRENCY batch writes at once), the retention cleanup, the
+#   ingestion heartbeat and the rare BM25 rebuild of a document indexed
+#   before BM25 existed (a search, off the event loop)
+# Each API worker process opens at most MONGO_MAX_POOL_SIZE +
+# MONGO_SYNC_MAX_POOL_SIZE connections (times the worker count against
+# the server's connection limit).
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_SYNC_MAX_POOL_SIZE = int(os.getenv("MONGO_SYNC_MAX_POOL_SIZE", "20"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+
+# Auto-delete documents older than 3 days
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "3"))
+
+# Expired documents are removed by a background task every
+# CLEANUP_INTERVAL_MINUTES, CLEANUP_BATCH_SIZE documents per round trip,
+# pausing CLEANUP_BATCH_PAUSE_MS between batches so uploads keep priority.
+# 0 minutes disables the task.
+CLEANUP_INTERVAL_MINUTES = float(os.getenv("CLEANUP_INTERVAL_MINUTES", "60"))
+CLEANUP_BATCH_SIZE = int(os.getenv("CLEANUP_BATCH_SIZE", "200"))
+CLEANUP_BATCH_PAUSE_MS = int(os.getenv("CLEANUP_BATCH_PAUSE_MS", "50"))
+
+# Create the MongoDB indexes at startup (see services/indexes.py)
+ENSURE_INDEXES_ON_STARTUP = os.getenv("ENSURE_INDEXES_ON_STARTUP", "1") == "1"
 
 
 # ========= Groq LLM (for summaries + MCQs) =========
 # Get your key from https://console.groq.com
+# The client itself is created lazily (see resources.py).
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-if not GROQ_API_KEY:
-    raise ValueError(
-        "GROQ_API_KEY is not set. Please export it before running the backend."
-    )
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")  # or "llama-3.2-3b-preview" etc.
+
+# Max open HTTP connections to Groq (bounds concurrent LLM calls per process)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+
 
-# ChatGroq reads GROQ_API_KEY from env automatically
-llm = ChatGroq(
-    model="llama-3.3-70b-versatile",  # You can change to "llama-3.2-3b-preview" etc.
-    temperature=0.3,
-    max_tokens=None,
-)
+# ========= Map-reduce summaries =========
+# Full-document summaries split the chunks into sections of about
+# SUMMARY_SECTION_TOKENS tokens, summarize up to SUMMARY_MAX_CONCURRENCY
+# sections at a time, then reduce the partial summaries into one.
+
+SUMMARY_SECTION_TOKENS = int(os.getenv("SUMMARY_SECTION_TOKENS", "3000"))
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "4"))
+
+
+# ========= LLM result cache =========
+# Summaries and questions are cached per document content / mode / params.
+# RESULT_CACHE_SIZE entries are also kept in memory for the fastest hits.
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "512"))
 
 
 # ========= Nomic Embeddings (for vector search) =========
 # Get your key from https://atlas.nomic.ai
+# LangChain-Nomic uses the NOMIC_API_KEY env var internally.
 
 NOMIC_API_KEY = os.getenv("NOMIC_API_KEY")
-if not NOMIC_API_KEY:
-    raise ValueError(
-        "NOMIC_API_KEY is not set. Please export it before running the backend."
-    )
-
-# LangChain-Nomic uses NOMIC_API_KEY env var internally
-embeddings = NomicEmbeddings(
-    model="nomic-embed-text-v1.5",  # long-context, high-quality embeddings
-)
+NOMIC_MODEL = os.getenv("NOMIC_MODEL", "nomic-embed-text-v1.5")  # long-context, high-quality embeddings
+
+
+# ========= Startup =========
+# Create the Mongo clients, LLM and embeddings (and compile the graphs)
+# while the app starts, instead of on the first request.
+
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "1") == "1"
+
+
+# ========= Vector search cache =========
+# Per-document embedding matrices kept in memory for fast similarity search.
+# Least recently used documents are evicted once the total size exceeds this.
+
+VECTOR_CACHE_MAX_MB = int(os.getenv("VECTOR_CACHE_MAX_MB", "256"))
+
+
+# ========= Embedding storage =========
+# How chunk embeddings are stored in MongoDB:
+# "float32" (packed binary, exact) or "int8" (quantized, 4x smaller again)
+
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "float32")
+
+# Chunk embeddings are cached by (model, chunk text hash) so re-uploads of
+# edited documents only embed the changed chunks. Unused entries expire.
+EMBEDDING_CACHE_TTL_DAYS = int(os.getenv("EMBEDDING_CACHE_TTL_DAYS", "30"))
+
+# Search query embeddings: in-process LRU entries (plus a MongoDB tier with
+# the same TTL as the chunk embedding cache)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+
+
+# ========= Embedding pipeline =========
+# index_document embeds chunks in batches of at most EMBED_BATCH_SIZE chunks
+# and EMBED_BATCH_MAX_CHARS characters, EMBED_CONCURRENCY batches at a time.
+# Provider calls share a token bucket of EMBED_REQUESTS_PER_MINUTE (0 = no
+# limit) and are retried EMBED_MAX_RETRIES times with exponential backoff.
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_BATCH_MAX_CHARS = int(os.getenv("EMBED_BATCH_MAX_CHARS", "60000"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_REQUESTS_PER_MINUTE = float(os.getenv("EMBED_REQUESTS_PER_MINUTE", "120"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+EMBED_RETRY_BASE_S = float(os.getenv("EMBED_RETRY_BASE_S", "1.0"))
+
+
+# ========= Background ingestion =========
+# Uploads are extracted + indexed by a pool of INGEST_WORKERS threads.
+# Extraction itself runs on the PDF_WORKERS process pool, so the threads
+# mostly wait on it, the embeddings API and MongoDB (default: one per core).
+# At most INGEST_QUEUE_SIZE uploads may be queued or running at once;
+# further uploads get HTTP 503 until the queue drains. Batch uploads may
+# fill the queue up to INGEST_BATCH_QUEUE_SIZE.
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(max(2, os.cpu_count() or 1))))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "16"))
+INGEST_BATCH_QUEUE_SIZE = int(os.getenv("INGEST_BATCH_QUEUE_SIZE", "256"))
+
+# Attempts at indexing a document; a retry resumes after the chunks the
+# failed attempt already stored
+INGEST_INDEX_ATTEMPTS = int(os.getenv("INGEST_INDEX_ATTEMPTS", "2"))
+
+# Jobs live in the API process: a restart loses the queued / running ones.
+# At startup, documents stuck in a non-terminal stage with no heartbeat for
+# INGEST_STALE_MINUTES are marked failed, and upload temp files at least
+# that old are deleted unless a live job still owns them (0 = don't recover).
+INGEST_STALE_MINUTES = int(os.getenv("INGEST_STALE_MINUTES", "60"))
+# Every INGEST_HEARTBEAT_SECONDS each API worker refreshes updated_at on
+# all of its jobs, queued ones included, so a deep queue never looks
+# stale to another worker's startup recovery (keep it well under
+# INGEST_STALE_MINUTES; 0 = off).
+INGEST_HEARTBEAT_SECONDS = int(os.getenv("INGEST_HEARTBEAT_SECONDS", "60"))
+
+# Uploads are streamed to a temp file (UPLOAD_TMP_DIR, default: system temp)
+# and rejected with HTTP 413 once they exceed UPLOAD_MAX_MB.
+UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB", "200"))
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or None
+
+# POST /api/documents/upload/batch: several files or one ZIP archive of at
+# most BATCH_UPLOAD_MAX_MB in total and BATCH_MAX_FILES files (each file /
+# archive member is still capped at UPLOAD_MAX_MB)
+BATCH_UPLOAD_MAX_MB = int(os.getenv("BATCH_UPLOAD_MAX_MB", "1024"))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "100"))
+
+# POST /api/documents/search: most documents one search may cover
+SEARCH_MAX_DOCUMENTS = int(os.getenv("SEARCH_MAX_DOCUMENTS", "20"))
+
+
+# ========= Approximate nearest-neighbour index =========
+# Documents with more chunks than ANN_MIN_CHUNKS get an IVF index
+# (clustered chunk lists) that is searched instead of the full scan.
+# ANN_NLIST = 0 picks sqrt(num_chunks) clusters; ANN_NPROBE clusters are
+# scanned per query (higher = better recall, slower).
+
+ANN_MIN_CHUNKS = int(os.getenv("ANN_MIN_CHUNKS", "2000"))
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+ANN_INDEX_DIR = os.getenv("ANN_INDEX_DIR", os.path.join(os.getcwd(), "ann_indexes"))
+
+
+# ========= Prompt context =========
+# The summary / MCQ nodes retrieve CONTEXT_CANDIDATES chunks and build a
+# prompt context from them within a per-node token budget:
+# MMR selection (CONTEXT_MMR_LAMBDA: 1.0 = relevance only, lower = more
+# diversity), chunks at least CONTEXT_DUPLICATE_SIM similar to a picked
+# one are dropped, and adjacent chunks are merged without their overlap.
+# The budgets default to what each node used to send (top-k chunks of
+# ~800 characters): MCQ 10 chunks, full summary 15, topic summary 8.
+
+CONTEXT_TOKENS_MCQ = int(os.getenv("CONTEXT_TOKENS_MCQ", "2000"))
+CONTEXT_TOKENS_SUMMARY = int(os.getenv("CONTEXT_TOKENS_SUMMARY", "3000"))
+CONTEXT_TOKENS_TOPIC = int(os.getenv("CONTEXT_TOKENS_TOPIC", "1600"))
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "30"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_DUPLICATE_SIM = float(os.getenv("CONTEXT_DUPLICATE_SIM", "0.95"))
+
+
+# ========= Lexical (BM25) search =========
+# Every document also gets a BM25 index (db.lexical_index). Topic summaries
+# retrieve with TOPIC_SEARCH_MODE: "vector" (embeddings only), "hybrid"
+# (BM25 + embeddings, reciprocal-rank fusion) or "lexical" (BM25 only,
+# no embedding call).
+
+TOPIC_SEARCH_MODE = os.getenv("TOPIC_SEARCH_MODE", "hybrid")
+
+
+# ========= Metrics =========
+# Per-stage / per-route latency histograms and LLM token counts at
+# GET /metrics (Prometheus text format), plus a timing log line per request.
+# Off by default; instrumented code is a no-op then.
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
@@ -1,5 +1,3 @@
-from pymongo import MongoClient
-from .config import MONGODB_URI, MONGODB_DB
-
-client = MongoClient(MONGODB_URI)
-db = client[MONGODB_DB]
+# The Mongo databases live in the shared resource registry (one client
+# of each kind per process, created on first use); kept here for imports.
+from .resources import db, async_db  # noqa: F401
@@ -1,9 +1,150 @@
-from fastapi import FastAPI
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from . import resources
+from .config import WARM_UP_ON_STARTUP, ENSURE_INDEXES_ON_STARTUP, CLEANUP_INTERVAL_MINUTES, METRICS_ENABLED
 from .routers import documents, questions, summaries
+from .services.indexes import ensure_indexes
+from .services.ingestion import queue_depth, recover_interrupted_jobs, run_ingest_heartbeat
+from .services.query_cache import query_cache_stats
+from .services import metrics
+from .services.retention import run_periodic_cleanup, cleanup_stats
+from .services.single_flight import llm_requests
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the shared clients + graphs before serving (client constructors
+    # may block on network, so off the event loop)
+    if WARM_UP_ON_STARTUP:
+        await run_in_threadpool(resources.warm_up)
+    if ENSURE_INDEXES_ON_STARTUP:
+        await run_in_threadpool(ensure_indexes)
+    # Jobs queued / running when the previous process stopped are lost;
+    # this worker's own jobs keep a heartbeat so others never recover them
+    await run_in_threadpool(recover_interrupted_jobs)
+    heartbeat_task = asyncio.create_task(run_ingest_heartbeat())
+
+    # Retention cleanup runs in the background, never on the upload path
+    cleanup_task = None
+    if CLEANUP_INTERVAL_MINUTES > 0:
+        cleanup_task = asyncio.create_task(run_periodic_cleanup())
+
+    yield
+
+    heartbeat_task.cancel()
+    try:
+        await heartbeat_task
+    except asyncio.CancelledError:
+        pass
+    if cleanup_task is not None:
+        cleanup_task.cancel()
+        try:
+            await cleanup_task
+        except asyncio.CancelledError:
+            pass
+    await resources.close()
+
+
+app = FastAPI(title="AI PDF Tutor Backend", lifespan=lifespan)
+
+
+class UploadSizeLimit:
+    """
+    Cap upload request bodies while they arrive:
+    - a declared Content-Length over the limit gets 413 before the body is read
+    - chunked uploads (no length) are counted as they stream in, and get 413
+      as soon as they pass the limit (FastAPI parses the multipart body into
+      UploadFiles before the route runs, so the route cannot stop it)
+    Batch uploads have their own, larger limit.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or scope["method"] != "POST" or not path.startswith("/api/documents/"):
+            await self.app(scope, receive, send)
+            return
+
+        if path.rstrip("/") == "/api/documents/upload/batch":
+            max_bytes, max_mb = documents.BATCH_UPLOAD_MAX_BYTES, documents.BATCH_UPLOAD_MAX_MB
+        else:
+            max_bytes, max_mb = documents.UPLOAD_MAX_BYTES, documents.UPLOAD_MAX_MB
+        # Allow some room for multipart boundaries and headers
+        limit = max_bytes + 64 * 1024
+        detail = f"File is larger than the {max_mb} MB upload limit."
 
-app = FastAPI(title="AI PDF Tutor Backend")
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > limit:
+            await JSONResponse(status_code=413, content={"detail": detail})(scope, receive, send)
+            return
 
+        received = 0
+
+        async def capped_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Re-raised by FastAPI's body parsing -> 413 response
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, capped_receive, send)
+
+
+app.add_middleware(UploadSizeLimit)
+
+
+if METRICS_ENABLED:
+
+    @app.middleware("http")
+    async def record_request_timings(request: Request, call_next):
+        """
+        Per-route latency histogram + one structured log line per request
+        with the time spent in each pipeline stage (see services/metrics.py).
+        """
+        token, stages = metrics.begin_request()
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            elapsed = time.perf_counter() - started
+            # Route template (/api/documents/{doc_id}/status), not the raw path
+            matched = request.scope.get("route")
+            route = _route_templates.get(id(matched)) or getattr(matched, "path", "unmatched")
+            metrics.observe_request(request.method, route, status, elapsed)
+            logger.info(
+                "request timing %s",
+                json.dumps(
+                    {
+                        "route": route,
+                        "method": request.method,
+                        "status": status,
+                        "total_ms": round(elapsed * 1000, 2),
+                        "stages_ms": {k: round(v * 1000, 2) for k, v in stages.items()},
+                    }
+                ),
+            )
+            metrics.end_request(token)
+
+
+# Added last so it is the outermost middleware (413s above still get CORS headers)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -12,10 +153,44 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(documents.router, prefix="/api/documents", tags=["documents"])
-app.include_router(questions.router, prefix="/api/questions", tags=["questions"])
-app.include_router(summaries.router, prefix="/api/summaries", tags=["summaries"])
+_ROUTERS = (
+    (documents.router, "/api/documents", "documents"),
+    (questions.router, "/api/questions", "questions"),
+    (summaries.router, "/api/summaries", "summaries"),
+)
+for _router, _prefix, _tag in _ROUTERS:
+    app.include_router(_router, prefix=_prefix, tags=[_tag])
+
+# Full route templates for the metrics labels (a matched route of an
+# included router may only carry its own path, without the prefix)
+_route_templates = {id(r): prefix + r.path for router, prefix, _ in _ROUTERS for r in router.routes}
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+@app.get("/stats/coalescing")
+def coalescing_stats():
+    """How many summary/question requests ran vs. joined an identical in-flight one."""
+    return llm_requests.stats()
+
+@app.get("/stats/cleanup")
+def retention_cleanup_stats():
+    """Documents / chunks removed by the retention cleanup and how long the last pass took."""
+    return cleanup_stats()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Stage / route latency histograms and LLM token counts (Prometheus text format)."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (set METRICS_ENABLED=1).")
+    coalescing = llm_requests.stats()
+    cleanup = cleanup_stats()
+    gauges = {
+        "llm_requests_executed": coalescing["executed"],
+        "llm_requests_coalesced": coalescing["coalesced"],
+        "cleanup_documents_removed": cleanup["documents_removed"],
+        "ingestion_queue_depth": queue_depth(),
+        "query_cache_entries": query_cache_stats()["entries"],
+    }
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,200 @@
+import importlib
+import logging
+import threading
+import time
+from typing import Callable, Dict
+
+from .config import (
+    MONGODB_URI,
+    MONGODB_DB,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_SYNC_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    GROQ_API_KEY,
+    GROQ_MODEL,
+    LLM_MAX_CONNECTIONS,
+    NOMIC_API_KEY,
+    NOMIC_MODEL,
+)
+
+
+# ========= Shared resource registry =========
+# One instance per process of each external client, created on first use:
+#   db         -> sync MongoClient database (background / threadpool work)
+#   async_db   -> AsyncMongoClient database (request path)
+# Two Mongo pools per process on purpose: the ingestion / cleanup threads
+# cannot use the async client, and requests must not block the event loop
+# on the sync one. Each pool is sized separately (see config.py).
+#   llm        -> ChatGroq
+#   embeddings -> NomicEmbeddings
+# Importing the app no longer connects anywhere or needs the API keys;
+# warm_up() (called from the FastAPI lifespan) builds everything at startup.
+
+logger = logging.getLogger(__name__)
+
+_instances: Dict[str, object] = {}
+# Re-entrant: the db factories resolve their client through _shared too
+_lock = threading.RLock()
+
+
+def _shared(name: str, factory: Callable[[], object]) -> object:
+    instance = _instances.get(name)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(name)
+            if instance is None:
+                instance = factory()
+                _instances[name] = instance
+    return instance
+
+
+def _make_mongo_client():
+    from pymongo import MongoClient
+
+    return MongoClient(
+        MONGODB_URI,
+        maxPoolSize=MONGO_SYNC_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+    )
+
+
+def _make_async_mongo_client():
+    from pymongo import AsyncMongoClient
+
+    return AsyncMongoClient(
+        MONGODB_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+    )
+
+
+def _make_llm():
+    if not GROQ_API_KEY:
+        raise ValueError(
+            "GROQ_API_KEY is not set. Please export it before running the backend."
+        )
+    import httpx
+    from langchain_groq import ChatGroq
+
+    limits = httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+    )
+    # ChatGroq reads GROQ_API_KEY from env automatically
+    return ChatGroq(
+        model=GROQ_MODEL,
+        temperature=0.3,
+        max_tokens=None,
+        http_client=httpx.Client(limits=limits),
+        http_async_client=httpx.AsyncClient(limits=limits),
+    )
+
+
+def _make_embeddings():
+    if not NOMIC_API_KEY:
+        raise ValueError(
+            "NOMIC_API_KEY is not set. Please export it before running the backend."
+        )
+    from langchain_nomic import NomicEmbeddings
+
+    return NomicEmbeddings(model=NOMIC_MODEL)
+
+
+def get_mongo_client():
+    return _shared("mongo_client", _make_mongo_client)
+
+
+def get_async_mongo_client():
+    return _shared("async_mongo_client", _make_async_mongo_client)
+
+
+def get_llm():
+    return _shared("llm", _make_llm)
+
+
+def get_embeddings():
+    return _shared("embeddings", _make_embeddings)
+
+
+class _Lazy:
+    """
+    Module-level stand-in for a shared resource: attribute and item access
+    are forwarded to the real object, which is created on first use.
+    """
+
+    __slots__ = ("_name", "_resolve")
+
+    def __init__(self, name: str, resolve: Callable[[], object]):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_resolve", resolve)
+
+    def __getattr__(self, name: str):
+        return getattr(self._resolve(), name)
+
+    def __getitem__(self, name: str):
+        return self._resolve()[name]
+
+    def __repr__(self) -> str:
+        return f"<lazy {self._name}>"
+
+
+def get_db():
+    return _shared("db", lambda: get_mongo_client()[MONGODB_DB])
+
+
+def get_async_db():
+    return _shared("async_db", lambda: get_async_mongo_client()[MONGODB_DB])
+
+
+db = _Lazy("db", get_db)
+async_db = _Lazy("async_db", get_async_db)
+llm = _Lazy("llm", get_llm)
+embeddings = _Lazy("embeddings", get_embeddings)
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    Create every shared client now (and compile the graphs, embed the
+    anchor queries, load the extraction libraries) so the first request
+    does not pay for it. Returns seconds spent per resource.
+    Mongo connections are opened in the background by the drivers.
+    """
+    from .services.langgraph_flows import get_question_graph, get_summary_graph
+    from .services.query_cache import warm_anchor_queries
+
+    steps = {
+        "mongo": get_db,
+        "async_mongo": get_async_db,
+        "llm": get_llm,
+        "embeddings": get_embeddings,
+        # The graphs' fixed search queries: no embedding call per request
+        "anchor_queries": warm_anchor_queries,
+        "graphs": lambda: (get_question_graph(), get_summary_graph()),
+        "text_extraction": lambda: importlib.import_module(".services.text_extraction", __package__),
+    }
+    timings = {}
+    for name, step in steps.items():
+        started = time.perf_counter()
+        step()
+        timings[name] = round(time.perf_counter() - started, 3)
+    logger.info("warm-up done: %s", timings)
+    return timings
+
+
+async def close() -> None:
+    """Close the shared clients that were created (FastAPI shutdown)."""
+    with _lock:
+        instances = dict(_instances)
+        _instances.clear()
+
+    if "async_mongo_client" in instances:
+        await instances["async_mongo_client"].close()
+    if "mongo_client" in instances:
+        instances["mongo_client"].close()
+    if "llm" in instances:
+        async_http = getattr(instances["llm"], "http_async_client", None)
+        sync_http = getattr(instances["llm"], "http_client", None)
+        if async_http is not None:
+            await async_http.aclose()
+        if sync_http is not None:
+            sync_http.close()
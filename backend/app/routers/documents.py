@@ -1,94 +1,385 @@
 from __future__ import annotations
 
 import datetime
+import mimetypes
+import os
+import tempfile
 import uuid
+import zipfile
+from typing import List, Optional
 
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
 
-from ..db import db
-from ..services.vector_store import index_document
-from ..services.text_extraction import extract_text_from_bytes
+from ..config import (
+    UPLOAD_MAX_MB,
+    UPLOAD_TMP_DIR,
+    BATCH_UPLOAD_MAX_MB,
+    BATCH_MAX_FILES,
+    INGEST_QUEUE_SIZE,
+    INGEST_BATCH_QUEUE_SIZE,
+    SEARCH_MAX_DOCUMENTS,
+)
+from ..db import async_db
+from ..services.content_store import content_hasher, aacquire_content
+from ..services.ingestion import submit_ingestion
+from ..services.vector_store import asearch_documents
 
 router = APIRouter()  # prefix added in main.py
 
-# Auto-delete documents older than 3 days
-RETENTION_DAYS = 3
+UPLOAD_MAX_BYTES = UPLOAD_MAX_MB * 1024 * 1024
+BATCH_UPLOAD_MAX_BYTES = BATCH_UPLOAD_MAX_MB * 1024 * 1024
+_UPLOAD_READ_SIZE = 1024 * 1024
 
 
-def cleanup_expired_documents() -> int:
+async def _spool_upload(file: UploadFile, max_mb: int = UPLOAD_MAX_MB):
     """
-    Delete documents (and related chunks) older than RETENTION_DAYS.
-    Uses the stored `created_at` field (your old system already has it).
+    Copy an upload to our own temp file in 1 MB pieces, hashing as we go,
+    so ingestion can read it by path after the request ends.
+    Starlette has already received the whole body into the UploadFile
+    (memory, then its own temp file): the request size is capped while it
+    arrives by main.UploadSizeLimit; this only enforces `max_mb` per file
+    (UPLOAD_MAX_MB), with 413. Returns (path, size, sha256 hex).
     """
-    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=RETENTION_DAYS)
+    hasher = content_hasher()
+    size = 0
+    fd, path = tempfile.mkstemp(prefix="upload-", dir=UPLOAD_TMP_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                piece = await file.read(_UPLOAD_READ_SIZE)
+                if not piece:
+                    break
+                size += len(piece)
+                if size > max_mb * 1024 * 1024:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File is larger than the {max_mb} MB upload limit.",
+                    )
+                hasher.update(piece)
+                out.write(piece)
+    except BaseException:
+        _discard(path)
+        raise
+    return path, size, hasher.hexdigest()
 
-    # Find expired docs
-    expired = list(db.documents.find({"created_at": {"$lt": cutoff}}))
-    if not expired:
-        return 0
 
-    removed = 0
-    for doc in expired:
-        doc_id = doc.get("doc_id")
-        if not doc_id:
-            continue
+def _discard(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
 
-        # Delete vector chunks for this document
-        db.chunks.delete_many({"doc_id": doc_id})
+async def _register_upload(
+    path: str,
+    size: int,
+    hash_hex: str,
+    filename: Optional[str],
+    content_type: Optional[str],
+    max_pending: int = INGEST_QUEUE_SIZE,
+) -> dict:
+    """
+    Create the document record for a spooled upload and hand the temp file
+    to the ingestion queue (or link it to identical content stored before).
+    Raises 503 if the queue is full; the temp file is removed then.
+    """
+    # UUID doc_id (same as your old system)
+    doc_id = str(uuid.uuid4())
 
-        # Delete the document record
-        db.documents.delete_one({"doc_id": doc_id})
-        removed += 1
+    # Same bytes uploaded before? Link to the existing chunks instead of
+    # extracting and embedding again.
+    content = await aacquire_content(hash_hex)
+    if content is not None:
+        _discard(path)
+        await async_db.documents.insert_one(
+            {
+                "doc_id": doc_id,
+                "filename": filename,
+                "content_type": content_type,
+                "created_at": datetime.datetime.utcnow(),
+                "has_text": content.get("has_text", False),
+                "content_hash": hash_hex,
+                "chunks_doc_id": content["chunks_doc_id"],
+                "status": "done",
+                "progress": 1.0,
+                "chunks_indexed": content.get("num_chunks", 0),
+                "deduplicated": True,
+            }
+        )
+        return {
+            "doc_id": doc_id,
+            "status": "done",
+            "chunks_indexed": content.get("num_chunks", 0),
+            "has_text": content.get("has_text", False),
+            "deduplicated": True,
+        }
 
-    return removed
+    # Store ONLY metadata (no large binary); the worker pool fills in the rest
+    await async_db.documents.insert_one(
+        {
+            "doc_id": doc_id,
+            "filename": filename,
+            "content_type": content_type,
+            "size_bytes": size,
+            "created_at": datetime.datetime.utcnow(),
+            "has_text": False,
+            "status": "queued",
+            "progress": 0.0,
+            # Kept on disk by startup recovery while the job is live
+            "upload_path": path,
+        }
+    )
+
+    # Extraction + indexing (GROQ + Nomic) run in the background from the temp file
+    queued = submit_ingestion(
+        doc_id,
+        path,
+        filename=filename,
+        content_type=content_type,
+        hash_hex=hash_hex,
+        max_pending=max_pending,
+    )
+    if not queued:
+        _discard(path)
+        await async_db.documents.delete_one({"doc_id": doc_id})
+        raise HTTPException(
+            status_code=503,
+            detail="Ingestion queue is full. Please retry in a moment.",
+        )
+
+    return {
+        "doc_id": doc_id,
+        "status": "queued",
+        "deduplicated": False,
+    }
 
 
 @router.post("/upload")
 async def upload_document(file: UploadFile = File(...)):
     """
     Upload any study file (PDF, image, DOCX, text/code).
-    - Before doing anything: auto-delete expired documents (> 3 days)
-    - Extract text (OCR friendly)
-    - Store only metadata in MongoDB
-    - Index embeddings for semantic search
+    - Stream the file to a temp file (size-capped) while hashing it (SHA-256);
+      a repeated upload reuses the existing chunks
+    - Store only metadata in MongoDB and return the doc_id right away
+    - Extract text (OCR friendly) and index embeddings in the background;
+      poll GET /api/documents/{doc_id}/status for progress
     """
     if not file:
         raise HTTPException(status_code=400, detail="No file uploaded.")
 
-    # ⚡ Auto-clean old documents every upload
-    cleanup_expired_documents()
-
-    raw_bytes = await file.read()
-    if not raw_bytes:
+    path, size, hash_hex = await _spool_upload(file)
+    if size == 0:
+        _discard(path)
         raise HTTPException(status_code=400, detail="Uploaded file is empty.")
 
-    text = extract_text_from_bytes(
-        raw_bytes,
-        filename=file.filename,
-        content_type=file.content_type,
-    ) or ""
+    return await _register_upload(path, size, hash_hex, file.filename, file.content_type)
 
-    # UUID doc_id (same as your old system)
-    doc_id = str(uuid.uuid4())
 
-    # Store ONLY metadata (no large binary)
-    db.documents.insert_one(
-        {
-            "doc_id": doc_id,
-            "filename": file.filename,
-            "content_type": file.content_type,
-            "created_at": datetime.datetime.utcnow(),
-            "has_text": bool(text.strip()),
-        }
-    )
+# ========= Batch upload =========
+# Several files, or ZIP archives whose members are streamed out one by one
+# (never the whole archive in memory, each member capped at UPLOAD_MAX_MB of
+# actual decompressed bytes). Every file is queued as soon as it is spooled,
+# so extraction (process pool) and embedding / inserts (ingestion threads)
+# of the first files overlap with unpacking the rest.
+
+_ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed"}
+
+
+def _is_zip(file: UploadFile) -> bool:
+    return (file.filename or "").lower().endswith(".zip") or file.content_type in _ZIP_CONTENT_TYPES
+
 
-    # Index chunks into vector store (GROQ + Nomic)
-    num_chunks = 0
-    if text.strip():
-        num_chunks = index_document(doc_id, text)
+def _archive_members(zf: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """Files of an archive, without directories and macOS / hidden metadata files."""
+    members = []
+    for info in zf.infolist():
+        name = info.filename
+        if info.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+            continue
+        members.append(info)
+    return members
+
+
+def _spool_member(zf: zipfile.ZipFile, info: zipfile.ZipInfo):
+    """
+    Decompress one archive member to a temp file in 1 MB pieces, hashing as
+    we go. The cap counts the bytes actually read, not the size the archive
+    claims. Returns (path, size, sha256 hex).
+    """
+    hasher = content_hasher()
+    size = 0
+    fd, path = tempfile.mkstemp(prefix="upload-", dir=UPLOAD_TMP_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out, zf.open(info) as member:
+            while True:
+                piece = member.read(_UPLOAD_READ_SIZE)
+                if not piece:
+                    break
+                size += len(piece)
+                if size > UPLOAD_MAX_BYTES:
+                    raise ValueError(f"File is larger than the {UPLOAD_MAX_MB} MB upload limit.")
+                hasher.update(piece)
+                out.write(piece)
+    except BaseException:
+        _discard(path)
+        raise
+    return path, size, hasher.hexdigest()
+
+
+async def _register_spooled(spooled, filename: Optional[str], content_type: Optional[str]) -> dict:
+    """Queue one spooled batch file; failures are reported per file."""
+    path, size, hash_hex = spooled
+    if size == 0:
+        _discard(path)
+        return {"filename": filename, "error": "File is empty."}
+    try:
+        result = await _register_upload(
+            path, size, hash_hex, filename, content_type, max_pending=INGEST_BATCH_QUEUE_SIZE
+        )
+    except HTTPException as exc:
+        return {"filename": filename, "error": exc.detail}
+    return {"filename": filename, **result}
+
+
+async def _upload_archive(file: UploadFile, results: List[dict], remaining: int) -> None:
+    try:
+        archive_path, _, _ = await _spool_upload(file, max_mb=BATCH_UPLOAD_MAX_MB)
+    except HTTPException as exc:
+        # Reported per file: earlier files of the batch are already queued
+        results.append({"filename": file.filename, "error": exc.detail})
+        return
+    try:
+        try:
+            zf = zipfile.ZipFile(archive_path)
+        except zipfile.BadZipFile:
+            results.append({"filename": file.filename, "error": "Not a valid ZIP archive."})
+            return
+        with zf:
+            members = _archive_members(zf)
+            if len(members) > remaining:
+                # Reported per file: earlier files of the batch are already queued
+                results.append(
+                    {
+                        "filename": file.filename,
+                        "error": f"Archive has {len(members)} files; a batch may contain at most {BATCH_MAX_FILES}.",
+                    }
+                )
+                return
+            for info in members:
+                if info.filename.lower().endswith(".zip"):
+                    results.append({"filename": info.filename, "error": "Nested archives are not supported."})
+                    continue
+                try:
+                    spooled = await run_in_threadpool(_spool_member, zf, info)
+                except (ValueError, zipfile.BadZipFile, NotImplementedError, RuntimeError) as exc:
+                    # Over the size cap, CRC mismatch, unsupported compression, encrypted
+                    results.append({"filename": info.filename, "error": str(exc)})
+                    continue
+                content_type = mimetypes.guess_type(info.filename)[0]
+                results.append(await _register_spooled(spooled, info.filename, content_type))
+    finally:
+        _discard(archive_path)
+
+
+@router.post("/upload/batch")
+async def upload_documents_batch(files: List[UploadFile] = File(...)):
+    """
+    Upload several study files at once, or ZIP archives of them.
+    - Up to BATCH_MAX_FILES files (archive members included)
+    - Each file goes through the same pipeline as /upload (dedupe, background
+      extraction + indexing) and is queued as soon as it is unpacked
+    - Returns per-file doc_id and status (or error) plus totals;
+      poll GET /api/documents/{doc_id}/status for each
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="No files uploaded.")
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch may contain at most {BATCH_MAX_FILES} files.",
+        )
+
+    results: List[dict] = []
+    for file in files:
+        if _is_zip(file):
+            await _upload_archive(file, results, BATCH_MAX_FILES - len(results))
+            continue
+        try:
+            spooled = await _spool_upload(file)
+        except HTTPException as exc:
+            results.append({"filename": file.filename, "error": exc.detail})
+            continue
+        results.append(await _register_spooled(spooled, file.filename, file.content_type))
+
+    return {
+        "files": results,
+        "queued": sum(1 for r in results if r.get("status") == "queued"),
+        "deduplicated": sum(1 for r in results if r.get("deduplicated")),
+        "failed": sum(1 for r in results if "error" in r),
+    }
+
+
+class SearchRequest(BaseModel):
+    doc_ids: List[str]
+    query: str
+    n_results: int = 8
+
+
+@router.post("/search")
+async def search_across_documents(req: SearchRequest):
+    """
+    Semantic search over several documents at once: the query is embedded
+    once and the best chunks of all of them are merged into one ranking
+    (each result has its doc_id, chunk_index, text, page / char offsets
+    and score).
+    """
+    doc_ids = list(dict.fromkeys(req.doc_ids))
+    if not doc_ids:
+        raise HTTPException(status_code=400, detail="No documents to search.")
+    if len(doc_ids) > SEARCH_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A search may cover at most {SEARCH_MAX_DOCUMENTS} documents.",
+        )
+    if not 1 <= req.n_results <= 50:
+        raise HTTPException(status_code=400, detail="n_results must be between 1 and 50.")
+
+    found = await async_db.documents.distinct("doc_id", {"doc_id": {"$in": doc_ids}})
+    missing = [d for d in doc_ids if d not in set(found)]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Documents not found: {', '.join(missing)}")
+
+    results = await asearch_documents(doc_ids, req.query, n_results=req.n_results)
+    return {"query": req.query, "results": results}
+
+
+@router.get("/{doc_id}/status")
+async def document_status(doc_id: str):
+    """
+    Ingestion status of an uploaded document:
+    stage (queued / extracting / chunking / embedding / indexing / done / failed),
+    progress (0..1; chunks stored so far while embedding), per-stage timings
+    in seconds and, when done, index stats.
+    """
+    doc = await async_db.documents.find_one({"doc_id": doc_id}, {"_id": 0})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found.")
 
     return {
         "doc_id": doc_id,
-        "chunks_indexed": num_chunks,
-        "has_text": bool(text.strip()),
+        # Documents uploaded before the ingestion queue existed are complete
+        "status": doc.get("status", "done"),
+        "progress": doc.get("progress", 1.0),
+        "timings": doc.get("timings", {}),
+        "error": doc.get("error"),
+        "has_text": doc.get("has_text", False),
+        "chunks_indexed": doc.get("chunks_indexed"),
+        "chunks_stored": doc.get("chunks_stored"),
+        "chunks_total": doc.get("chunks_total"),
+        "deduplicated": doc.get("deduplicated", False),
+        "embedding_cache_hits": doc.get("embedding_cache_hits"),
+        "embedding_cache_misses": doc.get("embedding_cache_misses"),
+        "memory": doc.get("memory", {}),
     }
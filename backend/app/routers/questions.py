@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
-from ..services.langgraph_flows import question_graph
+from ..services.langgraph_flows import run_questions, stream_questions
+from ..services.sse import sse_response
 
 router = APIRouter()
 
@@ -8,17 +9,30 @@ class QuestionRequest(BaseModel):
     doc_id: str
     num_questions: int = 5
 
-@router.post("/")
-async def generate_questions(req: QuestionRequest):
-    state = {
+def _initial_state(req: QuestionRequest) -> dict:
+    return {
         "doc_id": req.doc_id,
         "num_questions": req.num_questions,
         "mode": "questions",
         "questions": [],
         "answers": [],
     }
-    result = question_graph.invoke(state)
-    return {
+
+@router.post("/")
+async def generate_questions(req: QuestionRequest, refresh: bool = False):
+    """Generate MCQs (cached per document content; ?refresh=true regenerates)."""
+    result = await run_questions(_initial_state(req), refresh=refresh)
+    response = {
         "questions": result.get("questions", []),
         "answers": result.get("answers", []),
+        "cached": result.get("cached", False),
     }
+    if result.get("stats"):
+        # Prompt context tokens used / saved
+        response["stats"] = result["stats"]
+    return response
+
+@router.post("/stream")
+async def generate_questions_stream(req: QuestionRequest, refresh: bool = False):
+    """Same as /, but emits each MCQ as a server-sent event as soon as it is complete."""
+    return sse_response(stream_questions(_initial_state(req), refresh=refresh), "questions/stream")
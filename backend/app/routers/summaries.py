@@ -1,34 +1,57 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
-from ..services.langgraph_flows import summary_graph
+from ..services.langgraph_flows import run_summary, stream_summary
+from ..services.sse import sse_response
 
 router = APIRouter()
 
 class FullSummaryRequest(BaseModel):
     doc_id: str
+    # Summarize every section of the document (map-reduce) instead of
+    # only the best-matching chunks
+    map_reduce: bool = False
 
 class TopicSummaryRequest(BaseModel):
     doc_id: str
     topic: str
 
-@router.post("/full")
-async def full_summary(req: FullSummaryRequest):
-    state = {
+def _full_state(req: FullSummaryRequest) -> dict:
+    return {
         "doc_id": req.doc_id,
-        "mode": "full_summary",
+        "mode": "map_reduce_summary" if req.map_reduce else "full_summary",
         "topic": None,
         "summary": "",
     }
-    result = summary_graph.invoke(state)
-    return {"summary": result.get("summary", "")}
 
-@router.post("/topic")
-async def topic_summary(req: TopicSummaryRequest):
-    state = {
+def _topic_state(req: TopicSummaryRequest) -> dict:
+    return {
         "doc_id": req.doc_id,
         "mode": "topic_summary",
         "topic": req.topic,
         "summary": "",
     }
-    result = summary_graph.invoke(state)
-    return {"summary": result.get("summary", "")}
+
+@router.post("/full")
+async def full_summary(req: FullSummaryRequest, refresh: bool = False):
+    """Full summary (cached per document content; ?refresh=true regenerates)."""
+    return await run_summary(_full_state(req), refresh=refresh)
+
+@router.post("/topic")
+async def topic_summary(req: TopicSummaryRequest, refresh: bool = False):
+    """Topic summary (cached per document content + topic; ?refresh=true regenerates)."""
+    result = await run_summary(_topic_state(req), refresh=refresh)
+    response = {"summary": result.get("summary", ""), "cached": result.get("cached", False)}
+    if result.get("stats"):
+        # Prompt context tokens used / saved
+        response["stats"] = result["stats"]
+    return response
+
+@router.post("/full/stream")
+async def full_summary_stream(req: FullSummaryRequest, refresh: bool = False):
+    """Same as /full, but streams the summary as server-sent events."""
+    return sse_response(stream_summary(_full_state(req), refresh=refresh), "summaries/full/stream")
+
+@router.post("/topic/stream")
+async def topic_summary_stream(req: TopicSummaryRequest, refresh: bool = False):
+    """Same as /topic, but streams the summary as server-sent events."""
+    return sse_response(stream_summary(_topic_state(req), refresh=refresh), "summaries/topic/stream")
@@ -0,0 +1,203 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from ..config import ANN_INDEX_DIR, ANN_NLIST, ANN_NPROBE
+
+
+# ========= IVF index =========
+
+
+class IVFIndex:
+    """
+    Inverted-file index over a document's normalized chunk embeddings.
+
+    Chunks are clustered with spherical k-means; a query only scores the
+    chunks in the `nprobe` clusters whose centroids are closest to it.
+    The index stores row positions only - the vectors themselves stay in
+    the cached search matrix (rows ordered by chunk_index).
+    """
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray, n_rows: int):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.n_rows = n_rows
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: int = 0, n_iter: int = 10, seed: int = 0) -> "IVFIndex":
+        """
+        Cluster normalized row vectors into `nlist` lists (default: sqrt(n)).
+        """
+        n = vectors.shape[0]
+        if nlist <= 0:
+            nlist = int(np.sqrt(n))
+        nlist = max(1, min(nlist, n))
+
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(n, nlist, replace=False)].copy()
+
+        for _ in range(n_iter):
+            assign = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, vectors)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty clusters keep their previous centroid
+            empty = norms[:, 0] == 0
+            sums[empty] = centroids[empty]
+            norms[empty] = 1.0
+            centroids = sums / norms
+
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable").astype(np.int32)
+        counts = np.bincount(assign, minlength=nlist)
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        return cls(centroids.astype(np.float32), order, offsets, n)
+
+    def candidates(self, query: np.ndarray, nprobe: int = ANN_NPROBE) -> np.ndarray:
+        """
+        Row positions to score for a normalized query vector, in ascending order.
+        """
+        nprobe = max(1, min(nprobe, self.nlist))
+        sims = self.centroids @ query
+        if nprobe < self.nlist:
+            probe = np.argpartition(-sims, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(self.nlist)
+        rows = [self.order[self.offsets[c] : self.offsets[c + 1]] for c in probe]
+        return np.sort(np.concatenate(rows))
+
+    # ---- persistence ----
+
+    def save(self, path: str) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                order=self.order,
+                offsets=self.offsets,
+                n_rows=np.array(self.n_rows),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path) as data:
+            return cls(
+                data["centroids"],
+                data["order"],
+                data["offsets"],
+                int(data["n_rows"]),
+            )
+
+
+# ========= Storage (local disk + lazy in-memory cache) =========
+
+# Loaded indexes are small (centroids + row ids), so a count bound is enough
+_MAX_LOADED = 64
+_loaded: "OrderedDict[str, IVFIndex]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _index_path(doc_id: str) -> str:
+    return os.path.join(ANN_INDEX_DIR, f"{doc_id}.npz")
+
+
+def _remember(doc_id: str, index: IVFIndex) -> None:
+    with _lock:
+        _loaded[doc_id] = index
+        _loaded.move_to_end(doc_id)
+        while len(_loaded) > _MAX_LOADED:
+            _loaded.popitem(last=False)
+
+
+def build_index(doc_id: str, vectors: np.ndarray) -> IVFIndex:
+    """
+    Build the IVF index for a document and persist it to ANN_INDEX_DIR.
+    `vectors` must be the normalized embeddings in chunk_index order.
+    """
+    index = IVFIndex.build(vectors, nlist=ANN_NLIST)
+    try:
+        os.makedirs(ANN_INDEX_DIR, exist_ok=True)
+        index.save(_index_path(doc_id))
+    except OSError:
+        # Disk is only a cache; the index can be rebuilt from the chunks
+        pass
+    _remember(doc_id, index)
+    return index
+
+
+def get_index(doc_id: str, vectors: np.ndarray) -> IVFIndex:
+    """
+    Return the document's index: from memory, else from disk,
+    else rebuilt from `vectors` (e.g. on a fresh instance).
+    """
+    with _lock:
+        index = _loaded.get(doc_id)
+        if index is not None:
+            _loaded.move_to_end(doc_id)
+
+    if index is None:
+        try:
+            index = IVFIndex.load(_index_path(doc_id))
+        except (OSError, KeyError, ValueError):
+            index = None
+
+    if index is None or index.n_rows != vectors.shape[0]:
+        return build_index(doc_id, vectors)
+
+    _remember(doc_id, index)
+    return index
+
+
+def forget_index(doc_id: str) -> None:
+    """Drop the in-memory copy (the file is kept)."""
+    with _lock:
+        _loaded.pop(doc_id, None)
+
+
+def delete_index(doc_id: str) -> None:
+    """Remove a document's index from memory and disk."""
+    forget_index(doc_id)
+    try:
+        os.remove(_index_path(doc_id))
+    except OSError:
+        pass
+
+
+# ========= Tuning =========
+
+
+def recall_at_k(
+    index: IVFIndex,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int = 8,
+    nprobe: Optional[int] = None,
+) -> float:
+    """
+    Mean recall@k of the index against the exact scan.
+    `vectors` and `queries` must be L2-normalized row matrices.
+    """
+    nprobe = ANN_NPROBE if nprobe is None else nprobe
+    k = min(k, vectors.shape[0])
+    if k <= 0 or len(queries) == 0:
+        return 1.0
+
+    total = 0.0
+    for q in queries:
+        exact = set(np.argpartition(-(vectors @ q), k - 1)[:k].tolist())
+        rows = index.candidates(q, nprobe)
+        scores = vectors[rows] @ q
+        kk = min(k, len(rows))
+        approx = set(rows[np.argpartition(-scores, kk - 1)[:kk]].tolist())
+        total += len(exact & approx) / k
+    return total / len(queries)
@@ -0,0 +1,217 @@
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+# ========= Streaming chunker =========
+# Same chunk boundaries as LangChain's RecursiveCharacterTextSplitter
+# (separators "\n\n", "\n", " ", "", kept at the start of each piece,
+# chunks whitespace-stripped), but computed page by page over the text
+# join_pages() would produce, without building that text or the list of
+# chunks. Each chunk is yielded as soon as it is complete, as a dict with
+# the fields stored on db.chunks:
+#   chunk_index, text,
+#   char_start / char_end -> [start, end) in the joined text
+#   page_start / page_end -> 1-based pages of its first / last character
+# Memory is bounded by the current paragraph, not the document.
+
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 150
+
+SEPARATORS = ("\n\n", "\n", " ", "")
+_PAGE_SEPARATOR = "\n\n"  # join_pages
+
+
+class _Merger:
+    """
+    Incremental TextSplitter._merge_splits: packs consecutive pieces into
+    chunks of at most `size` characters, carrying up to `overlap`
+    characters of pieces over into the next chunk.
+    """
+
+    def __init__(self, size: int, overlap: int):
+        self.size = size
+        self.overlap = overlap
+        self.current: Deque[Tuple[str, int]] = deque()
+        self.total = 0
+
+    def add(self, piece: str, start: int) -> Iterator[Tuple[str, int]]:
+        n = len(piece)
+        if self.total + n > self.size and self.current:
+            chunk = self._join()
+            if chunk is not None:
+                yield chunk
+            while self.total > self.overlap or (self.total + n > self.size and self.total > 0):
+                self.total -= len(self.current.popleft()[0])
+        self.current.append((piece, start))
+        self.total += n
+
+    def flush(self) -> Iterator[Tuple[str, int]]:
+        chunk = self._join()
+        self.current.clear()
+        self.total = 0
+        if chunk is not None:
+            yield chunk
+
+    def _join(self) -> Optional[Tuple[str, int]]:
+        if not self.current:
+            return None
+        text = "".join(piece for piece, _ in self.current)
+        stripped = text.strip()
+        if not stripped:
+            return None
+        return stripped, self.current[0][1] + len(text) - len(text.lstrip())
+
+
+def _pieces(text: str, start: int, separator: str) -> Iterator[Tuple[str, int]]:
+    """Split on `separator`, keeping it at the start of the following piece (empty pieces dropped)."""
+    if not separator:
+        for i, ch in enumerate(text):
+            yield ch, start + i
+        return
+    prev = 0
+    cut = text.find(separator)
+    while cut != -1:
+        if cut > prev:
+            yield text[prev:cut], start + prev
+        prev = cut
+        cut = text.find(separator, cut + len(separator))
+    if prev < len(text):
+        yield text[prev:], start + prev
+
+
+def _split(
+    text: str,
+    start: int,
+    separators: Sequence[str],
+    size: int,
+    overlap: int,
+) -> Iterator[Tuple[str, int]]:
+    """RecursiveCharacterTextSplitter._split_text, yielding (chunk, offset) pairs."""
+    separator, rest = separators[-1], ()
+    for i, candidate in enumerate(separators):
+        if not candidate:
+            separator = candidate
+            break
+        if candidate in text:
+            separator, rest = candidate, separators[i + 1 :]
+            break
+
+    merger = _Merger(size, overlap)
+    for piece, piece_start in _pieces(text, start, separator):
+        if len(piece) < size:
+            yield from merger.add(piece, piece_start)
+            continue
+        yield from merger.flush()
+        if rest:
+            yield from _split(piece, piece_start, rest, size, overlap)
+        else:
+            yield piece, piece_start
+    yield from merger.flush()
+
+
+def _split_pages(
+    pages: Iterator[Tuple[str, int]],
+    size: int,
+    overlap: int,
+) -> Iterator[Tuple[str, int]]:
+    """
+    Top level of the recursive split over the joined pages (which contain
+    "\n\n"): paragraphs are cut from a rolling buffer as their end arrives.
+    """
+    merger = _Merger(size, overlap)
+    buffer, buffer_start = "", 0
+    first = True
+    for page, page_start in pages:
+        if first:
+            buffer, buffer_start, first = page, page_start, False
+        else:
+            buffer += _PAGE_SEPARATOR + page
+
+        # Every complete paragraph (ends where the next "\n\n" starts)
+        pieces = list(_pieces(buffer, buffer_start, _PAGE_SEPARATOR))
+        tail = pieces.pop() if pieces else ("", buffer_start + len(buffer))
+        for piece, piece_start in pieces:
+            yield from _top_piece(piece, piece_start, merger, size, overlap)
+        buffer, buffer_start = tail
+
+    if buffer:
+        yield from _top_piece(buffer, buffer_start, merger, size, overlap)
+    yield from merger.flush()
+
+
+def _top_piece(piece: str, start: int, merger: _Merger, size: int, overlap: int) -> Iterator[Tuple[str, int]]:
+    if len(piece) < size:
+        yield from merger.add(piece, start)
+    else:
+        yield from merger.flush()
+        yield from _split(piece, start, SEPARATORS[1:], size, overlap)
+
+
+def iter_chunks(
+    pages: Iterable[str],
+    chunk_size: int = CHUNK_SIZE,
+    overlap: int = CHUNK_OVERLAP,
+) -> Iterator[Dict]:
+    """
+    Chunk extracted pages lazily (see above). Pages are consumed one at a
+    time; blank pages are skipped like in join_pages, so offsets refer to
+    the same joined text.
+    """
+    if overlap > chunk_size:
+        raise ValueError(f"overlap ({overlap}) is larger than chunk_size ({chunk_size})")
+
+    # (page number, start, end) of the pages chunks may still reach into
+    spans: Deque[Tuple[int, int, int]] = deque()
+
+    def located() -> Iterator[Tuple[str, int]]:
+        pos = 0
+        for number, page in enumerate(pages, start=1):
+            if not page.strip():
+                continue
+            if spans:
+                pos += len(_PAGE_SEPARATOR)
+            spans.append((number, pos, pos + len(page)))
+            yield page, pos
+            pos += len(page)
+
+    stream = located()
+    # The first separator is "\n\n" unless the joined text never contains
+    # one, i.e. a single page without blank lines: split that one directly
+    head: List[Tuple[str, int]] = []
+    for item in stream:
+        head.append(item)
+        if _PAGE_SEPARATOR in item[0] or len(head) == 2:
+            break
+    if not head:
+        return
+    if len(head) == 1 and _PAGE_SEPARATOR not in head[0][0]:
+        pairs = _split(head[0][0], 0, SEPARATORS, chunk_size, overlap)
+    else:
+        pairs = _split_pages(_chain(head, stream), chunk_size, overlap)
+
+    for chunk_index, (text, start) in enumerate(pairs):
+        end = start + len(text)
+        # Chunks come in start order: earlier pages are no longer needed
+        while len(spans) > 1 and spans[0][2] <= start:
+            spans.popleft()
+        yield {
+            "chunk_index": chunk_index,
+            "text": text,
+            "char_start": start,
+            "char_end": end,
+            "page_start": _page_at(spans, start),
+            "page_end": _page_at(spans, end - 1),
+        }
+
+
+def _chain(head: List, stream: Iterator) -> Iterator:
+    yield from head
+    yield from stream
+
+
+def _page_at(spans: Deque[Tuple[int, int, int]], pos: int) -> int:
+    """Page containing character `pos` (a page separator counts towards the page after it)."""
+    for number, _, end in spans:
+        if pos < end:
+            return number
+    return spans[-1][0]
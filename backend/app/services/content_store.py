@@ -0,0 +1,107 @@
+import datetime
+import hashlib
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from ..db import db, async_db
+
+
+# ========= Content-addressed deduplication =========
+# db.contents has one record per distinct upload (keyed by SHA-256 of the raw bytes):
+#   _id           -> content hash
+#   chunks_doc_id -> doc_id the chunks were indexed under (the first uploader)
+#   ref_count     -> number of live documents that use these chunks
+#   num_chunks, has_text
+# Documents that reuse content store `content_hash` and `chunks_doc_id`.
+
+
+def content_hash(raw_bytes: bytes) -> str:
+    return hashlib.sha256(raw_bytes).hexdigest()
+
+
+def content_hasher():
+    """Incremental hasher for streamed uploads; .hexdigest() matches content_hash."""
+    return hashlib.sha256()
+
+
+async def aacquire_content(hash_hex: str) -> Optional[Dict]:
+    """
+    If this content was indexed before and is still owned by a live document,
+    take a reference to it and return its record. Otherwise return None.
+    (Upload request path: on the async client.)
+
+    Records at ref_count 0 are being deleted and can no longer be acquired.
+    """
+    return await async_db.contents.find_one_and_update(
+        {"_id": hash_hex, "ref_count": {"$gt": 0}},
+        {"$inc": {"ref_count": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def register_content(hash_hex: str, doc_id: str, num_chunks: int, has_text: bool) -> bool:
+    """
+    Record freshly indexed content so later uploads can reuse it.
+    Returns False if another upload registered the same content first;
+    the caller's document then simply keeps its own chunks.
+    """
+    try:
+        db.contents.insert_one(
+            {
+                "_id": hash_hex,
+                "chunks_doc_id": doc_id,
+                "ref_count": 1,
+                "num_chunks": num_chunks,
+                "has_text": has_text,
+                "created_at": datetime.datetime.utcnow(),
+            }
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+def release_document(doc: Dict) -> Optional[str]:
+    """
+    Drop a document's reference to its content.
+    Returns the doc_id whose chunks should now be deleted, or None if
+    other documents still share them.
+    """
+    owners = release_documents([doc])
+    return owners[0] if owners else None
+
+
+def release_documents(docs: List[Dict]) -> List[str]:
+    """
+    Batch release_document: one refcount update per distinct content hash
+    (not per document). Returns the chunk owners (doc_ids) whose chunks
+    are no longer used by any document.
+    """
+    owners = []
+    by_hash: Dict[str, List[Dict]] = {}
+    for doc in docs:
+        hash_hex = doc.get("content_hash")
+        if hash_hex:
+            by_hash.setdefault(hash_hex, []).append(doc)
+        elif doc.get("doc_id"):
+            # Not deduplicated: the document owns its chunks outright
+            owners.append(doc["doc_id"])
+
+    for hash_hex, group in by_hash.items():
+        content = db.contents.find_one_and_update(
+            {"_id": hash_hex},
+            {"$inc": {"ref_count": -len(group)}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if content is None:
+            owners.extend(d.get("chunks_doc_id") or d["doc_id"] for d in group)
+            continue
+        if content.get("ref_count", 0) > 0:
+            continue
+        db.contents.delete_one({"_id": hash_hex, "ref_count": {"$lte": 0}})
+        owners.append(content.get("chunks_doc_id") or group[0]["doc_id"])
+
+    # Dedupe (several documents can point at the same owner)
+    return list(dict.fromkeys(owners))
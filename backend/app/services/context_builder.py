@@ -0,0 +1,209 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import (
+    CONTEXT_CANDIDATES,
+    CONTEXT_MMR_LAMBDA,
+    CONTEXT_DUPLICATE_SIM,
+)
+from .chunking import CHUNK_OVERLAP
+from .metrics import record_context
+from .vector_store import asearch_document, aget_chunk_vectors
+
+
+# ========= Prompt context assembly =========
+# The nodes used to join their top-k chunks as-is: neighbouring chunks
+# repeat up to CHUNK_OVERLAP characters of each other, and near-duplicate
+# chunks (repeated definitions, headers) cost prompt tokens for nothing.
+# build_context() instead, over the retrieved candidates:
+# - picks chunks by MMR: relevance (search score rescaled to 0..1) minus
+#   similarity to the chunks already picked (stored embeddings of the
+#   candidates only)
+# - drops candidates at least CONTEXT_DUPLICATE_SIM similar to a picked one
+# - merges picked chunks that are adjacent by chunk_index, without the
+#   overlapping text (char offsets, else the longest matching edge)
+# - fills the token budget: the first chunk that does not fit is cut to
+#   the space left, at a word boundary
+# Passages are put in document order, separated by blank lines.
+
+_SEPARATOR = "\n\n"
+# Shortest text edge accepted as overlap when chunks have no char offsets
+_MIN_TEXT_OVERLAP = 16
+# Don't bother with a cut chunk that would be shorter than this (characters)
+_MIN_CUT_CHARS = 80
+
+CONTEXT_FIELDS = ("chunk_index", "text", "char_start", "char_end")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def _budget_chars(tokens: int) -> int:
+    """Most characters whose estimate_tokens is still within `tokens`."""
+    return max(0, tokens * 4 - 1)
+
+
+def _overlap(first: Dict, second: Dict) -> int:
+    """Characters at the start of `second` that repeat the end of `first` (chunk_index order)."""
+    if second["chunk_index"] != first["chunk_index"] + 1:
+        return 0
+    a, b = first["text"], second["text"]
+    if first.get("char_end") is not None and second.get("char_start") is not None:
+        return max(0, min(first["char_end"] - second["char_start"], len(a), len(b)))
+    for size in range(min(len(a), len(b), CHUNK_OVERLAP), _MIN_TEXT_OVERLAP - 1, -1):
+        if a.endswith(b[:size]):
+            return size
+    return 0
+
+
+def _cost(chunk: Dict, picked: Dict[int, Dict]) -> int:
+    """Characters the context grows by when `chunk` joins the picked ones."""
+    prev = picked.get(chunk["chunk_index"] - 1)
+    nxt = picked.get(chunk["chunk_index"] + 1)
+    before = _overlap(prev, chunk) if prev else 0
+    after = _overlap(chunk, nxt) if nxt else 0
+    cost = len(chunk["text"]) - before - after
+    if before and after:
+        # Bridges two passages: one separator less
+        return cost - len(_SEPARATOR)
+    if before or after:
+        return cost
+    return cost + len(_SEPARATOR)
+
+
+def _cut(chunk: Dict, chars: int) -> Optional[Dict]:
+    """The chunk shortened to at most `chars` characters, ending at a word boundary."""
+    text = chunk["text"][:chars]
+    space = text.rfind(" ")
+    if space > chars // 2:
+        text = text[:space]
+    text = text.rstrip()
+    if len(text) < _MIN_CUT_CHARS:
+        return None
+    cut = {**chunk, "text": text}
+    if chunk.get("char_start") is not None:
+        cut["char_end"] = chunk["char_start"] + len(text)
+    return cut
+
+
+def _relevance(candidates: List[Dict]) -> np.ndarray:
+    scores = np.array([float(c.get("score") or 0.0) for c in candidates], dtype=np.float32)
+    low, high = float(scores.min()), float(scores.max())
+    if high - low <= 1e-12:
+        return np.ones(len(candidates), dtype=np.float32)
+    return (scores - low) / (high - low)
+
+
+def _join(picked: Dict[int, Dict]) -> Tuple[str, int, int]:
+    """(context, passages, overlapping characters left out)."""
+    passages: List[str] = []
+    saved = 0
+    prev = None
+    for index in sorted(picked):
+        chunk = picked[index]
+        overlap = _overlap(prev, chunk) if prev else 0
+        if overlap:
+            passages[-1] += chunk["text"][overlap:]
+            saved += overlap
+        else:
+            passages.append(chunk["text"])
+        prev = chunk
+    return _SEPARATOR.join(passages), len(passages), saved
+
+
+def build_context(
+    candidates: List[Dict],
+    vectors: Dict[int, np.ndarray],
+    budget: int,
+    mmr_lambda: float = CONTEXT_MMR_LAMBDA,
+    duplicate_sim: float = CONTEXT_DUPLICATE_SIM,
+) -> Tuple[str, Dict]:
+    """
+    Prompt context of at most `budget` tokens from search results
+    ({"chunk_index", "text", "score", [char_start, char_end]}, best first)
+    and their stored embeddings ({chunk_index: normalized vector}).
+    Returns (context, stats); stats report the tokens used and the tokens
+    saved by leaving out overlaps and near-duplicates.
+    """
+    candidates = [c for c in candidates if (c.get("text") or "").strip()]
+    stats = {
+        "budget_tokens": budget,
+        "candidates": len(candidates),
+        "chunks": 0,
+        "passages": 0,
+        "duplicates_dropped": 0,
+        "tokens": 0,
+        "tokens_saved": 0,
+    }
+    if not candidates:
+        return "", stats
+
+    relevance = _relevance(candidates)
+    dim = max((v.shape[0] for v in vectors.values()), default=0)
+    matrix = np.zeros((len(candidates), dim), dtype=np.float32)
+    for row, c in enumerate(candidates):
+        vec = vectors.get(c["chunk_index"])
+        if vec is not None:
+            matrix[row, : vec.shape[0]] = vec
+
+    # The first passage has no separator in front of it
+    left = _budget_chars(budget) + len(_SEPARATOR)
+    picked: Dict[int, Dict] = {}
+    # Highest similarity of each candidate to any picked chunk
+    redundancy = np.zeros(len(candidates), dtype=np.float32)
+    open_rows = np.ones(len(candidates), dtype=bool)
+    duplicate_chars = 0
+
+    while open_rows.any() and left > 0:
+        mmr = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        row = int(np.argmax(np.where(open_rows, mmr, -np.inf)))
+        open_rows[row] = False
+        chunk = candidates[row]
+        if chunk["chunk_index"] in picked:
+            continue
+        if picked and redundancy[row] >= duplicate_sim:
+            stats["duplicates_dropped"] += 1
+            duplicate_chars += len(chunk["text"])
+            continue
+
+        cost = _cost(chunk, picked)
+        if cost > left:
+            chunk = _cut(chunk, left - len(_SEPARATOR))
+            if chunk is None or _cost(chunk, picked) > left:
+                break
+            cost = _cost(chunk, picked)
+            open_rows[:] = False
+        picked[chunk["chunk_index"]] = chunk
+        left -= cost
+        redundancy = np.maximum(redundancy, matrix @ matrix[row])
+
+    context, passages, overlap_chars = _join(picked)
+    stats.update(
+        chunks=len(picked),
+        passages=passages,
+        tokens=estimate_tokens(context) if context else 0,
+        tokens_saved=(overlap_chars + duplicate_chars) // 4,
+    )
+    return context, stats
+
+
+async def abuild_context(
+    doc_id: str,
+    query: str,
+    budget: int,
+    mode: str = "vector",
+    candidates: int = CONTEXT_CANDIDATES,
+) -> Tuple[str, Dict]:
+    """
+    Retrieve `candidates` chunks for the query (asearch_document with
+    `mode`) and build_context() from them within `budget` tokens.
+    Records the token counts in the metrics.
+    """
+    results = await asearch_document(doc_id, query, n_results=candidates, fields=CONTEXT_FIELDS, mode=mode)
+    vectors = await aget_chunk_vectors(doc_id, [r["chunk_index"] for r in results]) if results else {}
+    context, stats = build_context(results, vectors, budget=budget)
+    record_context(stats["tokens"], stats["tokens_saved"])
+    return context, stats
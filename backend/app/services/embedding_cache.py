@@ -0,0 +1,86 @@
+import datetime
+import hashlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from ..resources import embeddings
+from ..db import db
+from .embedding_codec import encode_embedding, decode_embedding
+from .metrics import span
+
+
+# ========= Persistent chunk embedding cache =========
+# db.embedding_cache holds one record per (embedding model, chunk text):
+#   _id          -> "<model>:<sha256 of chunk text>"
+#   embedding    -> packed float32 (see embedding_codec)
+#   last_used_at -> refreshed on every hit; a TTL index on it evicts
+#                   entries unused for EMBEDDING_CACHE_TTL_DAYS (LRU by age);
+#                   it is created at startup (indexes.ensure_indexes)
+
+
+def _model_name() -> str:
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+def _cache_key(model: str, text: str) -> str:
+    return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+def embed_chunks(
+    chunks: List[str],
+    embed: Optional[Callable[[List[str]], List]] = None,
+) -> Tuple[List, Dict[str, int]]:
+    """
+    Embed chunk texts, reusing cached vectors for any text seen before.
+    - One bulk $in lookup for all chunk hashes
+    - Only the misses go to `embed` (default: embeddings.embed_documents;
+      the embedding pipeline passes its rate-limited, retrying call)
+    Returns (vectors in chunk order, {"hits": ..., "misses": ...}).
+    """
+    if not chunks:
+        return [], {"hits": 0, "misses": 0}
+
+    model = _model_name()
+    keys = [_cache_key(model, c) for c in chunks]
+    now = datetime.datetime.utcnow()
+
+    cached = {}
+    for entry in db.embedding_cache.find({"_id": {"$in": list(set(keys))}}):
+        cached[entry["_id"]] = decode_embedding(entry).tolist()
+
+    if cached:
+        db.embedding_cache.update_many(
+            {"_id": {"$in": list(cached)}},
+            {"$set": {"last_used_at": now}},
+        )
+
+    # Embed each distinct missing text once
+    missing = {}
+    for key, chunk in zip(keys, chunks):
+        if key not in cached and key not in missing:
+            missing[key] = chunk
+
+    if missing:
+        if embed is None:
+            with span("embed_documents"):
+                miss_vecs = embeddings.embed_documents(list(missing.values()))
+        else:
+            miss_vecs = embed(list(missing.values()))
+        ops = []
+        for key, vec in zip(missing, miss_vecs):
+            cached[key] = vec
+            ops.append(
+                UpdateOne(
+                    {"_id": key},
+                    {
+                        "$setOnInsert": {"model": model, **encode_embedding(vec, "float32")},
+                        "$set": {"last_used_at": now},
+                    },
+                    upsert=True,
+                )
+            )
+        db.embedding_cache.bulk_write(ops, ordered=False)
+
+    hits = sum(1 for key in keys if key not in missing)
+    return [cached[key] for key in keys], {"hits": hits, "misses": len(keys) - hits}
@@ -0,0 +1,58 @@
+from typing import Dict, Sequence
+
+import numpy as np
+from bson.binary import Binary
+
+
+# ========= Embedding storage formats =========
+# "float32": packed little-endian float32 bytes (4 bytes / dim)
+# "int8":    symmetric scalar quantization with a per-chunk scale (1 byte / dim)
+# Legacy chunks store a plain BSON array of doubles (~9+ bytes / dim).
+
+STORAGE_MODES = ("float32", "int8")
+
+
+def encode_embedding(vec: Sequence[float], mode: str = "float32") -> Dict:
+    """
+    Return the chunk fields that store `vec` in the given mode:
+    embedding (Binary), embedding_dtype and, for int8, embedding_scale.
+    """
+    arr = np.asarray(vec, dtype="<f4")
+
+    if mode == "int8":
+        peak = float(np.max(np.abs(arr))) if arr.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        quantized = np.clip(np.rint(arr / scale), -127, 127).astype(np.int8)
+        return {
+            "embedding": Binary(quantized.tobytes()),
+            "embedding_dtype": "int8",
+            "embedding_scale": scale,
+        }
+
+    if mode != "float32":
+        raise ValueError(f"Unknown embedding storage mode: {mode!r}")
+
+    return {
+        "embedding": Binary(arr.tobytes()),
+        "embedding_dtype": "float32",
+    }
+
+
+def decode_embedding(chunk: Dict) -> np.ndarray:
+    """
+    Read a chunk's embedding into a float32 vector, whatever format it was stored in.
+    Binary formats are decoded zero-copy with np.frombuffer.
+    """
+    raw = chunk.get("embedding")
+    if raw is None:
+        return np.zeros(0, dtype=np.float32)
+
+    if isinstance(raw, (bytes, bytearray)):
+        dtype = chunk.get("embedding_dtype", "float32")
+        if dtype == "int8":
+            quantized = np.frombuffer(raw, dtype=np.int8)
+            return quantized.astype(np.float32) * np.float32(chunk.get("embedding_scale", 1.0))
+        return np.frombuffer(raw, dtype="<f4")
+
+    # Legacy float array
+    return np.asarray(raw, dtype=np.float32)
@@ -0,0 +1,214 @@
+import functools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import Callable, Collection, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..config import (
+    EMBED_BATCH_SIZE,
+    EMBED_BATCH_MAX_CHARS,
+    EMBED_CONCURRENCY,
+    EMBED_REQUESTS_PER_MINUTE,
+    EMBED_MAX_RETRIES,
+    EMBED_RETRY_BASE_S,
+)
+from ..resources import embeddings
+from .embedding_cache import embed_chunks
+from .metrics import span
+
+
+# ========= Batched embedding pipeline =========
+# Large documents are embedded batch by batch instead of in one call:
+# - batches of at most EMBED_BATCH_SIZE chunks / EMBED_BATCH_MAX_CHARS chars
+# - EMBED_CONCURRENCY batches embedding at once per document, batches cut
+#   from the chunk stream (chunking.iter_chunks) as workers free up
+# - every provider call takes a token from one process-wide bucket
+#   (EMBED_REQUESTS_PER_MINUTE) and is retried with exponential backoff
+#   when the error is transient (rate limit, 5xx, timeout, connection);
+#   anything else (bad key, invalid input, a bug) fails the batch at once
+# - each batch is handed to `store` as soon as it is embedded, so only
+#   the in-flight batches are held in memory
+
+logger = logging.getLogger(__name__)
+
+_RETRY_MAX_DELAY_S = 30.0
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a token is available and take it (no-op if rate <= 0)."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Shared by every ingestion job: the provider's limit is per API key
+_bucket = TokenBucket(
+    rate=EMBED_REQUESTS_PER_MINUTE / 60,
+    capacity=max(1, EMBED_CONCURRENCY),
+)
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    """HTTP status of a provider error, if it carries one."""
+    for source in (exc, getattr(exc, "response", None)):
+        code = getattr(source, "status_code", None)
+        if isinstance(code, int):
+            return code
+    # The Nomic client raises Exception((status_code, response_text))
+    if exc.args and isinstance(exc.args[0], tuple) and exc.args[0] and isinstance(exc.args[0][0], int):
+        return exc.args[0][0]
+    return None
+
+
+@functools.lru_cache(maxsize=1)
+def _transport_errors() -> Tuple[type, ...]:
+    """Timeout / connection error types of the HTTP clients the providers use."""
+    errors: List[type] = [TimeoutError, ConnectionError]
+    try:
+        import requests
+
+        errors += [requests.ConnectionError, requests.Timeout]
+    except ImportError:
+        pass
+    try:
+        import httpx
+
+        errors += [httpx.TransportError]
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+def _is_retriable(exc: Exception) -> bool:
+    """Rate limits, server errors, timeouts and connection failures."""
+    code = _status_code(exc)
+    if code is not None:
+        return code in (408, 429) or code >= 500
+    return isinstance(exc, _transport_errors())
+
+
+def _embed_with_retry(texts: List[str]) -> List:
+    """embeddings.embed_documents under the rate limit, with backoff on transient errors."""
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        _bucket.acquire()
+        try:
+            with span("embed_documents"):
+                return embeddings.embed_documents(texts)
+        except Exception as exc:
+            if attempt == EMBED_MAX_RETRIES or not _is_retriable(exc):
+                raise
+            # Full jitter so concurrent batches do not retry in lockstep
+            delay = min(_RETRY_MAX_DELAY_S, EMBED_RETRY_BASE_S * 2**attempt) * random.uniform(0.5, 1.0)
+            logger.warning(
+                "embedding batch of %d failed (attempt %d/%d, retrying in %.1fs): %s",
+                len(texts),
+                attempt + 1,
+                EMBED_MAX_RETRIES + 1,
+                delay,
+                exc,
+            )
+            time.sleep(delay)
+
+
+def iter_batches(
+    chunks: Iterable[Dict],
+    max_chunks: int = EMBED_BATCH_SIZE,
+    max_chars: int = EMBED_BATCH_MAX_CHARS,
+) -> Iterator[List[Dict]]:
+    """
+    Group a stream of chunks ({"chunk_index", "text", ...}) into consecutive
+    batches of at most `max_chunks` chunks and `max_chars` characters (a
+    single oversized chunk gets a batch of its own).
+    """
+    batch: List[Dict] = []
+    chars = 0
+    for chunk in chunks:
+        size = len(chunk["text"])
+        if batch and (len(batch) >= max_chunks or chars + size > max_chars):
+            yield batch
+            batch, chars = [], 0
+        batch.append(chunk)
+        chars += size
+    if batch:
+        yield batch
+
+
+def embed_in_batches(
+    chunks: Iterable[Dict],
+    store: Callable[[List[Dict], List], None],
+    done: Collection[int] = (),
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, int]:
+    """
+    Embed a stream of chunks (cache first, then the provider) and call
+    store(chunks, vectors) once per batch, from a worker thread.
+    - The stream is read as batches are submitted, with at most
+      2 x EMBED_CONCURRENCY batches in flight, so it is never held in full
+    - Chunks whose chunk_index is in `done` are skipped (already stored: resume)
+    - on_progress(stored, read) after every batch: chunks stored so far
+      and chunks read from the stream so far
+    - The first batch that still fails after its retries cancels the rest
+      and is raised; batches stored until then stay stored
+    Returns {"chunks": ..., "hits": ..., "misses": ..., "batches": ...}.
+    """
+    done = set(done)
+    totals = {"chunks": 0, "hits": 0, "misses": 0, "batches": 0}
+    stored = 0
+    workers = max(1, EMBED_CONCURRENCY)
+
+    def run(batch: List[Dict]) -> Dict[str, int]:
+        vecs, stats = embed_chunks([c["text"] for c in batch], embed=_embed_with_retry)
+        store(batch, vecs)
+        return {**stats, "count": len(batch)}
+
+    def collect(finished) -> None:
+        nonlocal stored
+        for future in finished:
+            stats = future.result()
+            totals["hits"] += stats["hits"]
+            totals["misses"] += stats["misses"]
+            stored += stats["count"]
+            if on_progress:
+                on_progress(stored, totals["chunks"])
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as pool:
+        in_flight = set()
+        try:
+            for batch in iter_batches(chunks):
+                totals["chunks"] += len(batch)
+                todo = [c for c in batch if c["chunk_index"] not in done]
+                stored += len(batch) - len(todo)
+                if not todo:
+                    continue
+                totals["batches"] += 1
+                if len(in_flight) >= 2 * workers:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                in_flight.add(pool.submit(run, todo))
+            collect(as_completed(in_flight))
+        except BaseException:
+            for future in in_flight:
+                future.cancel()
+            raise
+    return totals
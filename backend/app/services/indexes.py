@@ -0,0 +1,134 @@
+import datetime
+import logging
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+from ..config import RETENTION_DAYS, EMBEDDING_CACHE_TTL_DAYS
+from ..db import db
+from .retention import expired_filter, EXPIRED_FIELDS
+
+
+# ========= MongoDB index provisioning =========
+# Created once at startup (see main.lifespan); create_index is a no-op
+# when the index already exists.
+#
+# documents.created_at is a plain index, NOT a TTL: only the retention
+# cleanup may delete document records, because it releases their content
+# references and deletes their chunks, caches and search indexes with them.
+# A TTL would drop the records alone and orphan all of that for good.
+# Deployments that still have the old TTL index get it dropped here.
+#
+# The cache collections' TTL indexes live here too, so the cache read /
+# write paths (several of them async) never issue create_index themselves.
+
+logger = logging.getLogger(__name__)
+
+INDEXES = {
+    "chunks": [
+        {"keys": [("doc_id", ASCENDING), ("chunk_index", ASCENDING)]},
+    ],
+    "documents": [
+        {"keys": [("doc_id", ASCENDING)], "unique": True},
+        {"keys": [("created_at", ASCENDING)]},
+    ],
+    "section_summaries": [
+        {"keys": [("doc_id", ASCENDING)]},
+    ],
+    "llm_results": [
+        {"keys": [("doc_id", ASCENDING)]},
+        {"keys": [("created_at", ASCENDING)], "expireAfterSeconds": RETENTION_DAYS * 24 * 3600},
+    ],
+    "query_embeddings": [
+        {"keys": [("last_used_at", ASCENDING)], "expireAfterSeconds": EMBEDDING_CACHE_TTL_DAYS * 24 * 3600},
+    ],
+    "embedding_cache": [
+        {"keys": [("last_used_at", ASCENDING)], "expireAfterSeconds": EMBEDDING_CACHE_TTL_DAYS * 24 * 3600},
+    ],
+}
+
+# (collection, index name) that used to be TTL indexes
+_FORMER_TTL_INDEXES = [("documents", "created_at_1")]
+
+
+def _drop_former_ttl_indexes() -> None:
+    for collection, name in _FORMER_TTL_INDEXES:
+        try:
+            info = db[collection].index_information().get(name)
+            if info and "expireAfterSeconds" in info:
+                db[collection].drop_index(name)
+                logger.info("dropped TTL index %s on %s", name, collection)
+        except PyMongoError as exc:
+            logger.warning("could not drop TTL index %s on %s: %s", name, collection, exc)
+
+
+def ensure_indexes() -> Dict[str, List[str]]:
+    """
+    Create the indexes the hot queries rely on.
+    Failures (e.g. duplicate doc_ids in old data) are logged, not raised,
+    so the app still starts; returns {collection: [created index names]}.
+    """
+    _drop_former_ttl_indexes()
+    created = {}
+    for collection, specs in INDEXES.items():
+        names = []
+        for spec in specs:
+            options = {k: v for k, v in spec.items() if k != "keys"}
+            try:
+                names.append(db[collection].create_index(spec["keys"], **options))
+            except PyMongoError as exc:
+                logger.warning("could not create index on %s %s: %s", collection, spec["keys"], exc)
+        created[collection] = names
+    return created
+
+
+# ========= Query plan checks =========
+# The queries on the request / cleanup path, as
+# (collection, filter, projection, sort). check_query_plans() explains
+# each one and reports full collection scans.
+
+
+def _hot_queries(doc_id: str) -> Dict[str, tuple]:
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=RETENTION_DAYS)
+    return {
+        "chunks_by_document": ("chunks", {"doc_id": doc_id}, None, {"chunk_index": 1}),
+        "document_by_id": ("documents", {"doc_id": doc_id}, None, None),
+        "expired_documents": ("documents", expired_filter(cutoff), EXPIRED_FIELDS, None),
+        "section_summaries_by_document": ("section_summaries", {"doc_id": doc_id}, None, None),
+        "llm_results_by_document": ("llm_results", {"doc_id": doc_id}, None, None),
+    }
+
+
+def _plan_stages(plan: Dict) -> List[str]:
+    """Every stage name in an explain() plan tree (classic or SBE layout)."""
+    stages = []
+    if "stage" in plan:
+        stages.append(plan["stage"])
+    for key in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(key), dict):
+            stages += _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+
+def check_query_plans(doc_id: Optional[str] = None) -> Dict[str, Dict]:
+    """
+    Explain the hot queries and return {name: {"stages", "ok"}}.
+    ok is False for a collection scan or an in-memory sort.
+    """
+    results = {}
+    for name, (collection, query, projection, sort) in _hot_queries(doc_id or "plan-check").items():
+        command = {"find": collection, "filter": query}
+        if projection:
+            command["projection"] = projection
+        if sort:
+            command["sort"] = sort
+        explained = db.command("explain", command, verbosity="queryPlanner")
+        stages = _plan_stages(explained["queryPlanner"]["winningPlan"])
+        results[name] = {
+            "stages": stages,
+            "ok": "COLLSCAN" not in stages and "SORT" not in stages,
+        }
+    return results
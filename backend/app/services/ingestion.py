@@ -0,0 +1,387 @@
+import asyncio
+import datetime
+import glob
+import logging
+import os
+import resource
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import (
+    INGEST_HEARTBEAT_SECONDS,
+    INGEST_WORKERS,
+    INGEST_QUEUE_SIZE,
+    INGEST_INDEX_ATTEMPTS,
+    INGEST_STALE_MINUTES,
+    UPLOAD_TMP_DIR,
+)
+from ..db import db
+from .content_store import register_content
+from .vector_store import index_document
+
+
+# ========= Background ingestion pipeline =========
+# Uploads are processed off the event loop by a bounded worker pool:
+#   queued -> extracting -> chunking -> embedding -> [indexing] -> done | failed
+# Chunks are produced lazily while "embedding" (chunking is only the
+# resume check); the progress advances with every stored batch.
+# Progress is written to the document record so any API worker can report it,
+# with updated_at as the job's heartbeat (see recover_interrupted_jobs); a
+# background task also refreshes it for jobs still waiting in the queue.
+
+STAGE_PROGRESS = {
+    "queued": 0.0,
+    "extracting": 0.05,
+    "chunking": 0.4,
+    "embedding": 0.5,
+    "indexing": 0.95,
+    "done": 1.0,
+}
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+
+# Queued + running jobs; uploads are rejected once INGEST_QUEUE_SIZE is reached
+_pending = 0
+_pending_lock = threading.Lock()
+# doc_ids of this process's queued + running jobs (for the heartbeat)
+_jobs: set = set()
+
+
+def _rss_mb() -> float:
+    """Current resident set size of this process in MB (peak RSS if /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        # ru_maxrss is KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _StageTracker:
+    """
+    Records the current stage, per-stage timings and memory on the document:
+    - rss_start_mb / rss_peak_mb: the API process, sampled at stage
+      boundaries (process-wide, so concurrent jobs share it)
+    - worker_rss_peak_mb: peak of the extraction pool jobs run for this
+      upload (PDF / DOCX / OCR), which the API process's RSS does not include
+    """
+
+    def __init__(self, doc_id: str):
+        self.doc_id = doc_id
+        self.stage: Optional[str] = None
+        self.stage_started = 0.0
+        self.job_started = time.perf_counter()
+        self.rss_start = _rss_mb()
+        self.rss_peak = self.rss_start
+        self.worker_rss_peak = 0.0
+
+    def _close_stage(self) -> dict:
+        self.rss_peak = max(self.rss_peak, _rss_mb())
+        if self.stage is None:
+            return {}
+        elapsed = time.perf_counter() - self.stage_started
+        return {f"timings.{self.stage}": round(elapsed, 3)}
+
+    def _memory(self) -> dict:
+        memory = {
+            "memory.rss_start_mb": round(self.rss_start, 1),
+            "memory.rss_peak_mb": round(self.rss_peak, 1),
+        }
+        if self.worker_rss_peak:
+            memory["memory.worker_rss_peak_mb"] = round(self.worker_rss_peak, 1)
+        return memory
+
+    def worker_rss(self, peak_mb: float) -> None:
+        """Peak RSS reported by one extraction pool job."""
+        self.worker_rss_peak = max(self.worker_rss_peak, peak_mb)
+
+    def start(self, stage: str) -> None:
+        update = self._close_stage()
+        update.update(
+            {
+                "status": stage,
+                "progress": STAGE_PROGRESS.get(stage, 0.0),
+                "updated_at": datetime.datetime.utcnow(),
+            }
+        )
+        db.documents.update_one({"doc_id": self.doc_id}, {"$set": update})
+        self.stage = stage
+        self.stage_started = time.perf_counter()
+
+    def progress(self, stored: int, total: int) -> None:
+        """Chunks embedded + stored so far (within the "embedding" stage)."""
+        start, end = STAGE_PROGRESS["embedding"], STAGE_PROGRESS["indexing"]
+        db.documents.update_one(
+            {"doc_id": self.doc_id},
+            {
+                "$set": {
+                    "progress": round(start + (end - start) * stored / max(total, 1), 3),
+                    "chunks_stored": stored,
+                    "chunks_total": total,
+                    "updated_at": datetime.datetime.utcnow(),
+                }
+            },
+        )
+
+    def finish(self, **fields) -> None:
+        update = self._close_stage()
+        update.update(
+            {
+                "status": "done",
+                "progress": 1.0,
+                "timings.total": round(time.perf_counter() - self.job_started, 3),
+                "finished_at": datetime.datetime.utcnow(),
+                **self._memory(),
+                **fields,
+            }
+        )
+        db.documents.update_one({"doc_id": self.doc_id}, {"$set": update})
+        logger.info(
+            "ingested doc_id=%s total=%.3fs rss_start=%.1fMB rss_peak=%.1fMB worker_rss_peak=%.1fMB",
+            self.doc_id,
+            update["timings.total"],
+            self.rss_start,
+            self.rss_peak,
+            self.worker_rss_peak,
+        )
+        self.stage = None
+
+    def fail(self, error: str) -> None:
+        update = self._close_stage()
+        update.update(
+            {
+                "status": "failed",
+                "error": error,
+                "failed_stage": self.stage,
+                "timings.total": round(time.perf_counter() - self.job_started, 3),
+                "finished_at": datetime.datetime.utcnow(),
+                **self._memory(),
+            }
+        )
+        db.documents.update_one({"doc_id": self.doc_id}, {"$set": update})
+        logger.warning("ingestion failed doc_id=%s stage=%s: %s", self.doc_id, update["failed_stage"], error)
+        self.stage = None
+
+
+def _index_with_resume(doc_id: str, pages: List[str], tracker: _StageTracker) -> dict:
+    """
+    index_document, retried up to INGEST_INDEX_ATTEMPTS times; each retry
+    resumes after the batches the failed attempt already stored.
+    """
+    attempts = max(1, INGEST_INDEX_ATTEMPTS)
+    for attempt in range(1, attempts + 1):
+        try:
+            return index_document(doc_id, pages, on_stage=tracker.start, on_progress=tracker.progress)
+        except Exception as exc:
+            if attempt == attempts:
+                raise
+            logger.warning("indexing doc_id=%s failed (attempt %d), resuming: %s", doc_id, attempt, exc)
+
+
+def _run_ingestion(
+    doc_id: str,
+    path: str,
+    filename: Optional[str],
+    content_type: Optional[str],
+    hash_hex: str,
+) -> None:
+    # Imported here: the PDF / OCR / DOCX libraries are slow to import and
+    # only needed once an upload is processed (warm_up() preloads them)
+    from .text_extraction import extract_pages_from_path
+
+    tracker = _StageTracker(doc_id)
+    try:
+        tracker.start("extracting")
+        # On the process pool: this thread only waits, so other jobs'
+        # embedding / MongoDB I/O overlaps with the extraction
+        pages = extract_pages_from_path(
+            path,
+            filename=filename,
+            content_type=content_type,
+            offload=True,
+            on_worker_rss=tracker.worker_rss,
+        )
+        # Chunked page by page: the pages are never joined into one string
+        pages_with_text = sum(1 for page in pages if page.strip())
+        has_text = pages_with_text > 0
+
+        stats = {"chunks": 0, "cache_hits": 0, "cache_misses": 0}
+        if has_text:
+            stats = _index_with_resume(doc_id, pages, tracker)
+
+        result = {
+            "has_text": has_text,
+            "num_pages": len(pages),
+            "pages_with_text": pages_with_text,
+            "chunks_indexed": stats["chunks"],
+            "embedding_cache_hits": stats["cache_hits"],
+            "embedding_cache_misses": stats["cache_misses"],
+        }
+
+        # Make this content reusable; if a concurrent upload of the same bytes
+        # won the race, this document just keeps its own chunks.
+        if register_content(hash_hex, doc_id, stats["chunks"], has_text):
+            result.update({"content_hash": hash_hex, "chunks_doc_id": doc_id})
+
+        tracker.finish(**result)
+    except Exception as exc:
+        tracker.fail(str(exc) or type(exc).__name__)
+    finally:
+        _remove_upload(path)
+
+
+def _remove_upload(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def submit_ingestion(
+    doc_id: str,
+    path: str,
+    filename: Optional[str],
+    content_type: Optional[str],
+    hash_hex: str,
+    max_pending: int = INGEST_QUEUE_SIZE,
+) -> bool:
+    """
+    Queue a spooled upload (temp file at `path`) for extraction + indexing.
+    The job deletes the file when it finishes.
+    Returns False (and queues nothing) if `max_pending` jobs are pending
+    (INGEST_QUEUE_SIZE; batch uploads pass INGEST_BATCH_QUEUE_SIZE);
+    the caller still owns the file then.
+    The document record must already exist with status "queued".
+    """
+    global _pending
+    with _pending_lock:
+        if _pending >= max_pending:
+            return False
+        _pending += 1
+        _jobs.add(doc_id)
+
+    try:
+        future = _executor.submit(
+            _run_ingestion, doc_id, path, filename, content_type, hash_hex
+        )
+    except RuntimeError:
+        # Executor shut down (server stopping)
+        _job_done(doc_id)
+        return False
+
+    future.add_done_callback(lambda _: _job_done(doc_id))
+    return True
+
+
+def _job_done(doc_id: str) -> None:
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+        _jobs.discard(doc_id)
+
+
+def queue_depth() -> int:
+    """Number of jobs currently queued or running."""
+    return _pending
+
+
+# ========= Startup recovery =========
+# A restart (deploy, crash, OOM kill) loses the in-memory queue: its
+# documents would report "queued" / "embedding" forever and their spooled
+# uploads would stay on disk. recover_interrupted_jobs() runs at startup
+# and only touches jobs without a heartbeat for INGEST_STALE_MINUTES.
+# Every API worker refreshes the heartbeat of all its jobs (queued ones
+# too) every INGEST_HEARTBEAT_SECONDS, so the live jobs of other workers
+# are left alone however long their queue is, and so are their uploads
+# (the document records the temp file as upload_path).
+
+_ACTIVE_STAGES = [stage for stage in STAGE_PROGRESS if stage != "done"]
+
+
+def heartbeat_jobs() -> int:
+    """Refresh updated_at on this process's queued / running jobs; returns how many."""
+    with _pending_lock:
+        doc_ids = list(_jobs)
+    if not doc_ids:
+        return 0
+    result = db.documents.update_many(
+        {"doc_id": {"$in": doc_ids}, "status": {"$in": _ACTIVE_STAGES}},
+        {"$set": {"updated_at": datetime.datetime.utcnow()}},
+    )
+    return result.modified_count
+
+
+async def run_ingest_heartbeat() -> None:
+    """Background task (started from the app lifespan): heartbeat_jobs() every INGEST_HEARTBEAT_SECONDS."""
+    if INGEST_HEARTBEAT_SECONDS <= 0:
+        return
+    while True:
+        await asyncio.sleep(INGEST_HEARTBEAT_SECONDS)
+        try:
+            await run_in_threadpool(heartbeat_jobs)
+        except Exception:
+            logger.exception("ingestion heartbeat failed")
+
+
+def recover_interrupted_jobs(stale_minutes: int = INGEST_STALE_MINUTES) -> Dict[str, int]:
+    """
+    Mark stale non-terminal documents failed (at the stage they stopped in)
+    and delete upload temp files older than `stale_minutes` that no live
+    job still owns.
+    Returns {"jobs_failed": ..., "files_removed": ...}.
+    """
+    recovered = {"jobs_failed": 0, "files_removed": 0}
+    if stale_minutes <= 0:
+        return recovered
+
+    now = datetime.datetime.utcnow()
+    cutoff = now - datetime.timedelta(minutes=stale_minutes)
+    stale = {
+        "status": {"$in": _ACTIVE_STAGES},
+        "$or": [
+            {"updated_at": {"$lt": cutoff}},
+            {"updated_at": {"$exists": False}, "created_at": {"$lt": cutoff}},
+        ],
+    }
+    for doc in db.documents.find(stale, {"_id": 0, "doc_id": 1, "status": 1}):
+        result = db.documents.update_one(
+            {"doc_id": doc["doc_id"], **stale},
+            {
+                "$set": {
+                    "status": "failed",
+                    "failed_stage": doc["status"],
+                    "error": "Ingestion was interrupted by a server restart. Please upload the file again.",
+                    "finished_at": now,
+                }
+            },
+        )
+        recovered["jobs_failed"] += result.modified_count
+
+    # Uploads of jobs still queued / running (here or on another worker)
+    live = set(db.documents.distinct("upload_path", {"status": {"$in": _ACTIVE_STAGES}}))
+    oldest = time.time() - stale_minutes * 60
+    for path in glob.glob(os.path.join(UPLOAD_TMP_DIR or tempfile.gettempdir(), "upload-*")):
+        if path in live:
+            continue
+        try:
+            if os.path.getmtime(path) < oldest:
+                os.remove(path)
+                recovered["files_removed"] += 1
+        except OSError:
+            pass
+
+    if recovered["jobs_failed"] or recovered["files_removed"]:
+        logger.warning(
+            "recovered interrupted ingestion: %d jobs failed, %d upload files removed",
+            recovered["jobs_failed"],
+            recovered["files_removed"],
+        )
+    return recovered
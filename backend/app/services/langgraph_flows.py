@@ -1,10 +1,26 @@
-from typing import TypedDict, List, Literal, Optional
-from langgraph.graph import StateGraph, END
-
-from ..config import llm
-from .vector_store import search_document
-
-import json
+from typing import AsyncIterator, Dict, TypedDict, List, Literal, Optional, Tuple
+
+from ..config import (
+    SUMMARY_SECTION_TOKENS,
+    SUMMARY_MAX_CONCURRENCY,
+    TOPIC_SEARCH_MODE,
+    CONTEXT_TOKENS_MCQ,
+    CONTEXT_TOKENS_SUMMARY,
+    CONTEXT_TOKENS_TOPIC,
+)
+from ..db import async_db
+from ..resources import llm
+from .vector_store import aget_document_chunks, achunks_owner
+from .context_builder import abuild_context, estimate_tokens
+from .result_cache import result_key, aget_result, aput_result
+from .single_flight import llm_requests
+from .section_summaries import section_key, load_section_summaries, save_section_summaries
+from .metrics import span, timed, record_tokens, record_mcq_parse
+from .mcq_parsing import MCQStream, parse_mcqs
+from .query_cache import MCQ_QUERY, OVERVIEW_QUERY
+
+import asyncio
+import time
 
 
 # ========= State Types =========
@@ -16,55 +32,100 @@ class QuestionState(TypedDict, total=False):
     mode: Literal["questions"]
     questions: List[str]
     answers: List[str]
+    # Prompt context token stats (context_builder)
+    context_stats: Dict
+    # Set by nodes when the result came from the LLM (safe to cache)
+    cacheable: bool
 
 
 class SummaryState(TypedDict, total=False):
     doc_id: str
-    mode: Literal["full_summary", "topic_summary"]
+    mode: Literal["full_summary", "topic_summary", "map_reduce_summary"]
     topic: Optional[str]
     summary: str
+    summary_stats: Dict
+    # Set by nodes when the result came from the LLM (safe to cache)
+    cacheable: bool
 
 
 # ========= Helpers =========
 
+MCQ_FIX_TAG = "mcq_json_fix"
+
+# Bump when the section prompt changes so stored section summaries are not reused
+SECTION_PROMPT_VERSION = "v1"
+
+# Bump when any summary / MCQ prompt changes so cached results are not reused
+PROMPT_VERSION = "v1"
+
 
-def _extract_json_array(text: str) -> str:
+def _model_name() -> str:
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+
+
+async def _call_llm(prompt: str, **kwargs):
     """
-    Try to pull out the JSON array from a model response.
-    Handles cases where the JSON is wrapped in markdown code fences
-    or has some explanation text around it.
+    llm.ainvoke timed as the "llm" stage, counting prompt / completion
+    tokens (from the response's usage metadata, else estimated).
     """
-    text = text.strip()
-
-    # If there are markdown code fences, keep only the inside
-    if "```" in text:
-        parts = text.split("```")
-        # typically: ['', 'json', '[ ... ]', '']
-        for part in parts:
-            part = part.strip()
-            if part.startswith("[") and part.endswith("]"):
-                return part
+    with span("llm"):
+        resp = await llm.ainvoke(prompt, **kwargs)
+    usage = getattr(resp, "usage_metadata", None) or {}
+    record_tokens(
+        usage.get("input_tokens") or estimate_tokens(prompt),
+        usage.get("output_tokens") or estimate_tokens(str(getattr(resp, "content", ""))),
+    )
+    return resp
 
-    # Fallback: take from first '[' to last ']'
-    start = text.find("[")
-    end = text.rfind("]")
-    if start != -1 and end != -1 and end > start:
-        return text[start : end + 1]
 
-    return text
+def _group_by_budget(texts: List[str], budget: int) -> List[Tuple[int, int]]:
+    """
+    Split consecutive texts into [start, end) groups of at most ~budget tokens
+    (a single oversized text still gets its own group).
+    """
+    groups = []
+    start = 0
+    used = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if i > start and used + tokens > budget:
+            groups.append((start, i))
+            start, used = i, 0
+        used += tokens
+    if start < len(texts):
+        groups.append((start, len(texts)))
+    return groups
+
+
+def _format_mcq(item: Dict) -> Tuple[str, str]:
+    """Turn one MCQ object into the (question block, answer line) the frontend shows."""
+    q_text = item.get("question", "").strip()
+    opts = item.get("options") or []
+    ans = item.get("answer", "").strip()
+    expl = item.get("explanation", "").strip()
+
+    # Build question block
+    q_block = q_text + "\n"
+    for i, opt in enumerate(opts):
+        q_block += f"  {chr(65 + i)}. {opt}\n"
+
+    # Build answer block
+    return q_block, f"Correct: {ans} - {expl}"
 
 
 # ========= Nodes =========
 
 
-def generate_mcqs_node(state: QuestionState) -> QuestionState:
+@timed("node.generate_mcqs")
+async def generate_mcqs_node(state: QuestionState) -> QuestionState:
     """
-    Use semantic search to pull the most important chunks, then ask the LLM
-    (Groq) to generate MCQs in JSON form, then post-process into
-    plain-text Q&A lists for the frontend.
+    Use semantic search to pull the most important chunks (packed into a
+    token-budgeted context, see context_builder), then ask the LLM (Groq)
+    to generate MCQs in JSON form, then post-process into plain-text Q&A
+    lists for the frontend.
     """
-    chunks = search_document(state["doc_id"], "important key points", n_results=10)
-    context = "\n\n".join(c["text"] for c in chunks)
+    context, context_stats = await abuild_context(state["doc_id"], MCQ_QUERY, CONTEXT_TOKENS_MCQ)
+    state["context_stats"] = context_stats
 
     if not context.strip():
         # No text available for this document
@@ -91,15 +152,13 @@ Return ONLY a JSON array with this exact structure, no extra text:
 ]
 """
 
-    resp = llm.invoke(prompt)
+    resp = await _call_llm(prompt)
     content = getattr(resp, "content", str(resp))
 
-    data = []
-    try:
-        json_str = _extract_json_array(content)
-        data = json.loads(json_str)
-    except Exception:
-        # As a last-ditch attempt, ask the model to fix it
+    # Recover every valid MCQ locally (trailing commas, smart quotes,
+    # truncated arrays, ...); only ask the model when nothing is usable
+    data, path = parse_mcqs(content)
+    if not data:
         fix_prompt = f"""You previously tried to return MCQs but the JSON was invalid.
 
 Now return ONLY a valid JSON array of MCQs in this format, no explanation text outside the JSON:
@@ -117,43 +176,34 @@ Here is your previous output, fix it to valid JSON:
 ```text
 {content}
 ```"""
-        fixed = llm.invoke(fix_prompt)
-        try:
-            fixed_content = getattr(fixed, "content", str(fixed))
-            json_str = _extract_json_array(fixed_content)
-            data = json.loads(json_str)
-        except Exception:
-            data = []
+        # Tagged so streaming callers can ignore the repair output
+        fixed = await _call_llm(fix_prompt, config={"tags": [MCQ_FIX_TAG]})
+        data, _ = parse_mcqs(getattr(fixed, "content", str(fixed)))
+        path = "llm_fix" if data else "failed"
+    record_mcq_parse(path)
 
     questions: List[str] = []
     answers: List[str] = []
 
     for item in data:
-        q_text = item.get("question", "").strip()
-        opts = item.get("options") or []
-        ans = item.get("answer", "").strip()
-        expl = item.get("explanation", "").strip()
-
-        # Build question block
-        q_block = q_text + "\n"
-        for i, opt in enumerate(opts):
-            q_block += f"  {chr(65 + i)}. {opt}\n"
+        q_block, answer = _format_mcq(item)
         questions.append(q_block)
-
-        # Build answer block
-        answers.append(f"Correct: {ans} - {expl}")
+        answers.append(answer)
 
     state["questions"] = questions
     state["answers"] = answers
+    state["cacheable"] = bool(questions)
     return state
 
 
-def full_summary_node(state: SummaryState) -> SummaryState:
+@timed("node.full_summary")
+async def full_summary_node(state: SummaryState) -> SummaryState:
     """
-    Summarize the entire document using the most relevant chunks.
+    Summarize the entire document using the most relevant chunks
+    (packed into a token-budgeted context, see context_builder).
     """
-    chunks = search_document(state["doc_id"], "overall content of document", n_results=15)
-    context = "\n\n".join(c["text"] for c in chunks)
+    context, context_stats = await abuild_context(state["doc_id"], OVERVIEW_QUERY, CONTEXT_TOKENS_SUMMARY)
+    state["summary_stats"] = {"context": context_stats}
 
     if not context.strip():
         state["summary"] = (
@@ -168,18 +218,145 @@ Focus on the main ideas, important definitions, and any key formulas.
 Text:
 """ + context
 
-    resp = llm.invoke(prompt)
+    resp = await _call_llm(prompt)
     state["summary"] = getattr(resp, "content", str(resp))
+    state["cacheable"] = True
     return state
 
 
-def topic_summary_node(state: SummaryState) -> SummaryState:
+async def _summarize_all(prompts: List[str]) -> Tuple[List[str], float]:
+    """
+    Run the prompts through the LLM concurrently (at most
+    SUMMARY_MAX_CONCURRENCY in flight). Returns the outputs in order and
+    the summed per-call latency, i.e. what a sequential loop would take.
+    """
+    semaphore = asyncio.Semaphore(SUMMARY_MAX_CONCURRENCY)
+    latencies = []
+
+    async def one(prompt: str) -> str:
+        async with semaphore:
+            started = time.perf_counter()
+            resp = await _call_llm(prompt)
+            latencies.append(time.perf_counter() - started)
+            return getattr(resp, "content", str(resp))
+
+    outputs = await asyncio.gather(*(one(p) for p in prompts))
+    return list(outputs), sum(latencies)
+
+
+def _section_prompt(text: str) -> str:
+    return """Summarize this section of a longer document for a student.
+Keep the main ideas, important definitions and any key formulas. Be concise.
+
+Section:
+""" + text
+
+
+def _reduce_prompt(summaries: List[str]) -> str:
+    joined = "\n\n".join(f"Part {i + 1}:\n{s}" for i, s in enumerate(summaries))
+    return """These are summaries of consecutive parts of one document.
+Combine them into a single clear, concise summary for a student.
+Focus on the main ideas, important definitions, and any key formulas.
+
+""" + joined
+
+
+@timed("node.map_reduce_summary")
+async def map_reduce_summary_node(state: SummaryState) -> SummaryState:
+    """
+    Summarize the WHOLE document, not just the top matching chunks:
+    - Map: group all chunks into ~SUMMARY_SECTION_TOKENS sections and
+      summarize them concurrently (bounded); stored section summaries are
+      reused instead of calling Groq again
+    - Reduce: merge partial summaries, in rounds if they do not fit one prompt
+    """
+    started = time.perf_counter()
+    chunks = await aget_document_chunks(state["doc_id"])
+    if not chunks:
+        state["summary"] = (
+            "There is no text to summarize for this document. "
+            "It may be an image-only or empty file."
+        )
+        return state
+
+    owner = chunks[0]["doc_id"]
+    model = _model_name()
+    texts = [c["text"] for c in chunks]
+
+    sections = []
+    for number, (start, end) in enumerate(_group_by_budget(texts, SUMMARY_SECTION_TOKENS)):
+        text = "\n\n".join(texts[start:end])
+        sections.append(
+            {
+                "key": section_key(owner, model, SECTION_PROMPT_VERSION, text),
+                "section": number,
+                "chunk_start": chunks[start]["chunk_index"],
+                "chunk_end": chunks[end - 1]["chunk_index"],
+                "text": text,
+            }
+        )
+
+    # ---- Map ----
+    stored = await load_section_summaries([s["key"] for s in sections])
+    missing = [s for s in sections if s["key"] not in stored]
+    llm_started = time.perf_counter()
+    outputs, sequential_s = await _summarize_all([_section_prompt(s["text"]) for s in missing])
+    llm_wall_s = time.perf_counter() - llm_started
+    for section, summary in zip(missing, outputs):
+        section["summary"] = summary
+        stored[section["key"]] = summary
+    await save_section_summaries(owner, missing)
+    llm_calls = len(missing)
+
+    # ---- Reduce (hierarchical) ----
+    partials = [stored[s["key"]] for s in sections]
+    while len(partials) > 1 and sum(estimate_tokens(p) for p in partials) > SUMMARY_SECTION_TOKENS:
+        groups = _group_by_budget(partials, SUMMARY_SECTION_TOKENS)
+        if len(groups) == len(partials):
+            # Every partial is already at the budget; merge pairwise to make progress
+            groups = [(i, min(i + 2, len(partials))) for i in range(0, len(partials), 2)]
+        llm_started = time.perf_counter()
+        outputs, elapsed = await _summarize_all([_reduce_prompt(partials[a:b]) for a, b in groups])
+        llm_wall_s += time.perf_counter() - llm_started
+        partials = outputs
+        sequential_s += elapsed
+        llm_calls += len(groups)
+
+    if len(partials) == 1:
+        # A single section summary or reduce output is already the final summary
+        summary = partials[0]
+    else:
+        llm_started = time.perf_counter()
+        resp = await _call_llm(_reduce_prompt(partials))
+        elapsed = time.perf_counter() - llm_started
+        llm_wall_s += elapsed
+        sequential_s += elapsed
+        summary = getattr(resp, "content", str(resp))
+        llm_calls += 1
+
+    wall_s = time.perf_counter() - started
+    state["summary"] = summary
+    state["cacheable"] = True
+    state["summary_stats"] = {
+        "sections": len(sections),
+        "cached_sections": len(sections) - len(missing),
+        "llm_calls": llm_calls,
+        "wall_clock_s": round(wall_s, 3),
+        # Same work with the LLM calls made one after another
+        "sequential_estimate_s": round(wall_s - llm_wall_s + sequential_s, 3),
+    }
+    return state
+
+
+@timed("node.topic_summary")
+async def topic_summary_node(state: SummaryState) -> SummaryState:
     """
     Summarize only the parts of the document related to a specific topic.
     """
     topic = state.get("topic") or ""
-    chunks = search_document(state["doc_id"], topic, n_results=8)
-    context = "\n\n".join(c["text"] for c in chunks)
+    # Hybrid by default: topics are often exact terms (formulas, acronyms)
+    context, context_stats = await abuild_context(state["doc_id"], topic, CONTEXT_TOKENS_TOPIC, mode=TOPIC_SEARCH_MODE)
+    state["summary_stats"] = {"context": context_stats}
 
     if not context.strip():
         state["summary"] = (
@@ -194,8 +371,9 @@ Text:
 {context}
 """
 
-    resp = llm.invoke(prompt)
+    resp = await _call_llm(prompt)
     state["summary"] = getattr(resp, "content", str(resp))
+    state["cacheable"] = True
     return state
 
 
@@ -203,6 +381,8 @@ Text:
 
 
 def build_question_graph():
+    from langgraph.graph import StateGraph, END
+
     graph = StateGraph(QuestionState)
     graph.add_node("generate_mcqs", generate_mcqs_node)
     graph.set_entry_point("generate_mcqs")
@@ -211,20 +391,262 @@ def build_question_graph():
 
 
 def build_summary_graph():
+    from langgraph.graph import StateGraph, END
+
     graph = StateGraph(SummaryState)
     graph.add_node("full_summary", full_summary_node)
     graph.add_node("topic_summary", topic_summary_node)
+    graph.add_node("map_reduce_summary", map_reduce_summary_node)
 
     def router(state: SummaryState):
-        return "topic_summary" if state.get("mode") == "topic_summary" else "full_summary"
+        mode = state.get("mode")
+        if mode in ("topic_summary", "map_reduce_summary"):
+            return mode
+        return "full_summary"
 
     graph.set_conditional_entry_point(router)
     graph.add_edge("full_summary", END)
     graph.add_edge("topic_summary", END)
+    graph.add_edge("map_reduce_summary", END)
     return graph.compile()
 
 
 # ========= Compiled Graphs =========
+# Compiled on first use (or by the startup warm-up), not at import time.
 
-question_graph = build_question_graph()
-summary_graph = build_summary_graph()
+_graphs: Dict[str, object] = {}
+
+
+def get_question_graph():
+    if "questions" not in _graphs:
+        _graphs["questions"] = build_question_graph()
+    return _graphs["questions"]
+
+
+def get_summary_graph():
+    if "summaries" not in _graphs:
+        _graphs["summaries"] = build_summary_graph()
+    return _graphs["summaries"]
+
+
+# ========= Cached entry points =========
+# Identical requests against unchanged content reuse the stored result
+# (see result_cache); refresh=True forces a new generation.
+# Only results generated after the document finished ingesting are stored;
+# index_document drops the results of a chunk owner when it (re)indexes.
+
+
+async def _cache_key(state: Dict) -> Tuple[str, str]:
+    """(result cache key, chunk owner) for a graph input state."""
+    owner = await achunks_owner(state["doc_id"])
+    mode = state.get("mode", "")
+    if mode == "questions":
+        params = {"num_questions": state.get("num_questions", 5)}
+    elif mode == "topic_summary":
+        params = {"topic": " ".join((state.get("topic") or "").lower().split())}
+    else:
+        params = {}
+    return result_key(owner, mode, params, _model_name(), PROMPT_VERSION), owner
+
+
+async def _document_ready(doc_id: str) -> bool:
+    """
+    Whether the document is fully indexed. Results generated while it is
+    still being ingested come from a partial document and are not cached.
+    """
+    doc = await async_db.documents.find_one({"doc_id": doc_id}, {"_id": 0, "status": 1})
+    # Documents uploaded before the ingestion queue existed are complete
+    return doc is not None and doc.get("status", "done") == "done"
+
+
+async def _store_summary(key: str, owner: str, result: Dict, ready: bool) -> Dict:
+    value = {"summary": result.get("summary", "")}
+    if result.get("summary_stats"):
+        value["stats"] = result["summary_stats"]
+    if result.get("cacheable") and ready:
+        await aput_result(key, owner, value)
+    return value
+
+
+async def _store_questions(key: str, owner: str, result: Dict, ready: bool) -> Dict:
+    value = {
+        "questions": result.get("questions", []),
+        "answers": result.get("answers", []),
+    }
+    if result.get("context_stats"):
+        value["stats"] = {"context": result["context_stats"]}
+    if result.get("cacheable") and ready:
+        await aput_result(key, owner, value)
+    return value
+
+
+async def run_summary(state: SummaryState, refresh: bool = False) -> Dict:
+    """
+    Summary for the routers: cached result, or run the summary graph.
+    Concurrent identical requests share one graph run (single-flight).
+    """
+    key, owner = await _cache_key(state)
+    if not refresh:
+        cached = await aget_result(key)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+    async def compute() -> Dict:
+        # Checked before generating: ingestion may finish in the meantime
+        ready = await _document_ready(state["doc_id"])
+        result = await get_summary_graph().ainvoke(state)
+        return await _store_summary(key, owner, result, ready)
+
+    value, coalesced = await llm_requests.run(key, compute)
+    return {**value, "cached": False, "coalesced": coalesced}
+
+
+async def run_questions(state: QuestionState, refresh: bool = False) -> Dict:
+    """
+    MCQs for the routers: cached result, or run the question graph.
+    Concurrent identical requests share one graph run (single-flight).
+    """
+    key, owner = await _cache_key(state)
+    if not refresh:
+        cached = await aget_result(key)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+    async def compute() -> Dict:
+        # Checked before generating: ingestion may finish in the meantime
+        ready = await _document_ready(state["doc_id"])
+        result = await get_question_graph().ainvoke(state)
+        return await _store_questions(key, owner, result, ready)
+
+    value, coalesced = await llm_requests.run(key, compute)
+    return {**value, "cached": False, "coalesced": coalesced}
+
+
+# ========= Streaming =========
+# Run the same graphs with astream(stream_mode="messages") so the chat
+# model's tokens are surfaced as they are generated (_call_llm inside
+# the nodes streams through LangGraph's callbacks).
+
+
+def _chunk_text(chunk) -> str:
+    content = getattr(chunk, "content", "")
+    if isinstance(content, str):
+        return content
+    # Some chat models return a list of content blocks
+    return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+
+async def stream_summary(state: SummaryState, refresh: bool = False) -> AsyncIterator[Tuple[str, Dict]]:
+    """
+    Yield ("token", {"text"}) events while the summary is generated,
+    then ("done", {"summary"}) with the full text.
+    A cached result is sent as a single token (unless refresh=True).
+    """
+    key, owner = await _cache_key(state)
+    cached = None if refresh else await aget_result(key)
+    if cached is not None:
+        yield "token", {"text": cached.get("summary", "")}
+        yield "done", {**cached, "cached": True}
+        return
+
+    future, leader = llm_requests.join(key)
+    if not leader:
+        # An identical request is already generating: wait and replay its result
+        value = await asyncio.wrap_future(future)
+        yield "token", {"text": value.get("summary", "")}
+        yield "done", {**value, "cached": False, "coalesced": True}
+        return
+
+    async def generate() -> AsyncIterator[Tuple[str, Dict]]:
+        ready = await _document_ready(state["doc_id"])
+        if state.get("mode") == "map_reduce_summary":
+            # Many concurrent map calls: send the final summary in one piece
+            value = await _store_summary(key, owner, await get_summary_graph().ainvoke(state), ready)
+            llm_requests.finish(key, value)
+            yield "token", {"text": value["summary"]}
+            yield "done", {**value, "cached": False}
+            return
+
+        final = state
+        streamed = False
+        async for mode, payload in get_summary_graph().astream(state, stream_mode=["messages", "values"]):
+            if mode == "messages":
+                text = _chunk_text(payload[0])
+                if text:
+                    streamed = True
+                    yield "token", {"text": text}
+            else:
+                final = payload
+
+        value = await _store_summary(key, owner, final, ready)
+        llm_requests.finish(key, value)
+        if not streamed and value["summary"]:
+            # No LLM call (e.g. no text to summarize): send the message in one piece
+            yield "token", {"text": value["summary"]}
+        yield "done", {**value, "cached": False}
+
+    # Keeps generating for the followers if this client disconnects
+    async for event in llm_requests.stream(key, generate()):
+        yield event
+
+
+async def stream_questions(state: QuestionState, refresh: bool = False) -> AsyncIterator[Tuple[str, Dict]]:
+    """
+    Yield ("question", {"index", "question", "answer"}) as soon as each MCQ
+    object in the model's JSON array is complete, then ("done", {"count"}).
+    If the JSON had to be repaired, the remaining questions come from the
+    repaired result once the graph finishes.
+    Cached questions are replayed immediately (unless refresh=True).
+    """
+    key, owner = await _cache_key(state)
+    cached = None if refresh else await aget_result(key)
+    if cached is not None:
+        pairs = list(zip(cached.get("questions", []), cached.get("answers", [])))
+        for index, (question, answer) in enumerate(pairs):
+            yield "question", {"index": index, "question": question, "answer": answer}
+        yield "done", {"count": len(pairs), "cached": True}
+        return
+
+    future, leader = llm_requests.join(key)
+    if not leader:
+        # An identical request is already generating: wait and replay its result
+        value = await asyncio.wrap_future(future)
+        pairs = list(zip(value.get("questions", []), value.get("answers", [])))
+        for index, (question, answer) in enumerate(pairs):
+            yield "question", {"index": index, "question": question, "answer": answer}
+        yield "done", {"count": len(pairs), "cached": False, "coalesced": True}
+        return
+
+    async def generate() -> AsyncIterator[Tuple[str, Dict]]:
+        ready = await _document_ready(state["doc_id"])
+        parser = MCQStream()
+        emitted = 0
+        final = state
+        async for mode, payload in get_question_graph().astream(state, stream_mode=["messages", "values"]):
+            if mode == "messages":
+                chunk, metadata = payload
+                if MCQ_FIX_TAG in (metadata.get("tags") or []):
+                    continue
+                for item in parser.feed(_chunk_text(chunk)):
+                    question, answer = _format_mcq(item)
+                    yield "question", {"index": emitted, "question": question, "answer": answer}
+                    emitted += 1
+            else:
+                final = payload
+
+        questions = final.get("questions", [])
+        answers = final.get("answers", [])
+        for question, answer in list(zip(questions, answers))[emitted:]:
+            yield "question", {"index": emitted, "question": question, "answer": answer}
+            emitted += 1
+
+        value = await _store_questions(key, owner, final, ready)
+        llm_requests.finish(key, value)
+        done = {"count": emitted, "cached": False}
+        if value.get("stats"):
+            done["stats"] = value["stats"]
+        yield "done", done
+
+    # Keeps generating for the followers if this client disconnects
+    async for event in llm_requests.stream(key, generate()):
+        yield event
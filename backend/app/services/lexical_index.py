@@ -0,0 +1,241 @@
+import logging
+import math
+import re
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from bson.binary import Binary
+
+from ..db import db, async_db
+
+
+# ========= BM25 index =========
+# Dense retrieval misses exact terms (formula names, identifiers, acronyms)
+# and needs an embedding call; BM25 over an inverted index does neither.
+# One index per chunk owner, built by index_document and stored in
+# db.lexical_index as packed arrays (one record per document):
+#   terms    -> "\n"-joined sorted vocabulary
+#   offsets  -> uint32, postings of term i are [offsets[i], offsets[i+1])
+#   postings -> uint32 chunk positions (chunk_index), tfs -> uint16 counts
+#   lengths  -> uint32 tokens per chunk
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were what which with".split()
+)
+
+# Stay clear of MongoDB's 16 MB document limit; bigger indexes are only
+# kept in memory (and rebuilt from the chunk texts after a restart)
+_MAX_STORED_BYTES = 12 * 1024 * 1024
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens (letters, digits, underscores) without stopwords."""
+    return [t for t in _TOKEN.findall((text or "").casefold()) if t not in _STOPWORDS]
+
+
+class LexicalIndex:
+    """Inverted index + BM25 scoring over a document's chunks (positions = chunk_index)."""
+
+    def __init__(
+        self,
+        terms: List[str],
+        offsets: np.ndarray,
+        postings: np.ndarray,
+        tfs: np.ndarray,
+        lengths: np.ndarray,
+    ):
+        self.terms = terms
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.postings = postings
+        self.tfs = tfs
+        self.lengths = lengths
+        avg_len = float(lengths.mean()) if lengths.size else 0.0
+        # Per-chunk part of the BM25 denominator
+        self._norm = (BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(avg_len, 1.0))).astype(np.float32)
+
+    @property
+    def n_chunks(self) -> int:
+        return int(self.lengths.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            sum(len(t) + 1 for t in self.terms)
+            + self.offsets.nbytes
+            + self.postings.nbytes
+            + self.tfs.nbytes
+            + self.lengths.nbytes
+        )
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "LexicalIndex":
+        builder = IndexBuilder()
+        for text in texts:
+            builder.add(text)
+        return builder.finish()
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk for the query (0.0 where no term matches)."""
+        scores = np.zeros(self.n_chunks, dtype=np.float32)
+        n = self.n_chunks
+        for term in set(tokenize(query)):
+            i = self.vocab.get(term)
+            if i is None:
+                continue
+            start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+            rows = self.postings[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            df = end - start
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            # Each chunk appears once per term, so fancy-index += is safe
+            scores[rows] += idf * tf * (BM25_K1 + 1) / (tf + self._norm[rows])
+        return scores
+
+    # ---- persistence ----
+
+    def to_record(self, doc_id: str) -> Dict:
+        return {
+            "doc_id": doc_id,
+            "n_chunks": self.n_chunks,
+            "terms": "\n".join(self.terms),
+            "offsets": Binary(self.offsets.astype("<u4").tobytes()),
+            "postings": Binary(self.postings.astype("<u4").tobytes()),
+            "tfs": Binary(self.tfs.astype("<u2").tobytes()),
+            "lengths": Binary(self.lengths.astype("<u4").tobytes()),
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict) -> "LexicalIndex":
+        terms = record["terms"].split("\n") if record["terms"] else []
+        return cls(
+            terms,
+            np.frombuffer(record["offsets"], dtype="<u4"),
+            np.frombuffer(record["postings"], dtype="<u4"),
+            np.frombuffer(record["tfs"], dtype="<u2"),
+            np.frombuffer(record["lengths"], dtype="<u4"),
+        )
+
+
+class IndexBuilder:
+    """
+    Builds a LexicalIndex one chunk at a time (chunk_index order), so the
+    chunk texts do not have to be kept around. Postings are collected in
+    compact arrays per term rather than lists of tuples.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, array] = {}
+        self._tfs: Dict[str, array] = {}
+        self._lengths = array("I")
+
+    def add(self, text: str) -> None:
+        position = len(self._lengths)
+        tokens = tokenize(text)
+        self._lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = array("I")
+                self._tfs[term] = array("H")
+            postings.append(position)
+            self._tfs[term].append(min(tf, 65535))
+
+    def finish(self) -> LexicalIndex:
+        terms = sorted(self._postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.uint32)
+        offsets[1:] = np.cumsum([len(self._postings[t]) for t in terms], dtype=np.uint64)
+        if terms:
+            postings = np.concatenate([np.frombuffer(self._postings[t], dtype=np.uint32) for t in terms])
+            tfs = np.concatenate([np.frombuffer(self._tfs[t], dtype=np.uint16) for t in terms])
+        else:
+            postings = np.zeros(0, dtype=np.uint32)
+            tfs = np.zeros(0, dtype=np.uint16)
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32).copy()
+        return LexicalIndex(terms, offsets, postings, tfs, lengths)
+
+
+# ========= Storage (MongoDB + in-memory cache) =========
+
+_MAX_LOADED = 128
+_loaded: "OrderedDict[str, LexicalIndex]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _remember(doc_id: str, index: LexicalIndex) -> None:
+    with _lock:
+        _loaded[doc_id] = index
+        _loaded.move_to_end(doc_id)
+        while len(_loaded) > _MAX_LOADED:
+            _loaded.popitem(last=False)
+
+
+def _memory_get(doc_id: str) -> Optional[LexicalIndex]:
+    with _lock:
+        index = _loaded.get(doc_id)
+        if index is not None:
+            _loaded.move_to_end(doc_id)
+        return index
+
+
+def build_index(doc_id: str, texts: Iterable[str]) -> LexicalIndex:
+    """Build the BM25 index for a document's chunk texts (chunk_index order) and store it."""
+    return save_index(doc_id, LexicalIndex.build(texts))
+
+
+def save_index(doc_id: str, index: LexicalIndex) -> LexicalIndex:
+    """Store a built index (MongoDB if small enough, always in memory)."""
+    if index.nbytes <= _MAX_STORED_BYTES:
+        db.lexical_index.replace_one({"_id": doc_id}, index.to_record(doc_id), upsert=True)
+    else:
+        logger.info("lexical index of %s is %d bytes; kept in memory only", doc_id, index.nbytes)
+    _remember(doc_id, index)
+    return index
+
+
+def get_index(doc_id: str) -> Optional[LexicalIndex]:
+    """The document's index from memory or MongoDB; None if it has none stored."""
+    index = _memory_get(doc_id)
+    if index is None:
+        record = db.lexical_index.find_one({"_id": doc_id})
+        if record is None:
+            return None
+        index = LexicalIndex.from_record(record)
+        _remember(doc_id, index)
+    return index
+
+
+async def aget_index(doc_id: str) -> Optional[LexicalIndex]:
+    """Async get_index."""
+    index = _memory_get(doc_id)
+    if index is None:
+        record = await async_db.lexical_index.find_one({"_id": doc_id})
+        if record is None:
+            return None
+        index = LexicalIndex.from_record(record)
+        _remember(doc_id, index)
+    return index
+
+
+def forget_index(doc_id: str) -> None:
+    """Drop the in-memory copy (the stored index is kept)."""
+    with _lock:
+        _loaded.pop(doc_id, None)
+
+
+def delete_indexes_many(doc_ids: List[str]) -> None:
+    """Remove the indexes of several documents from memory and MongoDB."""
+    if not doc_ids:
+        return
+    db.lexical_index.delete_many({"_id": {"$in": doc_ids}})
+    for doc_id in doc_ids:
+        forget_index(doc_id)
@@ -0,0 +1,229 @@
+import ast
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+# ========= MCQ parsing =========
+# The model is asked for a JSON array of
+#   {"question": str, "options": [str, ...], "answer": "B", "explanation": str}
+# but often returns almost-JSON: trailing commas, smart quotes, a truncated
+# array, Python-style quoting. parse_mcqs() recovers every complete MCQ
+# object locally, so the LLM fix-up round trip is only needed when nothing
+# at all could be salvaged. Paths (for the metrics):
+#   "direct"   -> the array parsed as-is
+#   "repaired" -> recovered object by object after local repair
+#   "failed"   -> nothing usable (generate_mcqs_node then asks the model
+#                 to fix its JSON: "llm_fix" if that answer parses)
+
+# Curly quote -> the ASCII quote it stands for when used as a delimiter
+_SMART_QUOTES = {"“": '"', "”": '"', "„": '"', "‘": "'", "’": "'"}
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+# "B", "b)", "(B)", "Option B", "B. Photosynthesis", "B: ..."; the letter
+# must stand alone or be followed by ")", "." or ":" ("a cell wall" is not A)
+_ANSWER_LETTER = re.compile(r"^(?:option\s*)?\(?([A-Za-z])(?:[.):]|$)", re.IGNORECASE)
+# "A. text", "B) text" option prefixes (the frontend adds its own letters)
+_OPTION_PREFIX = re.compile(r"^\(?([A-Za-z])[.)]\s+")
+
+MIN_OPTIONS = 2
+MAX_OPTIONS = 8
+
+
+def extract_json_array(text: str) -> str:
+    """
+    Try to pull out the JSON array from a model response.
+    Handles cases where the JSON is wrapped in markdown code fences
+    or has some explanation text around it.
+    """
+    text = text.strip()
+
+    # If there are markdown code fences, keep only the inside
+    if "```" in text:
+        parts = text.split("```")
+        # typically: ['', 'json', '[ ... ]', '']
+        for part in parts:
+            part = part.strip()
+            if part.startswith("[") and part.endswith("]"):
+                return part
+
+    # Fallback: take from first '[' to last ']'
+    start = text.find("[")
+    end = text.rfind("]")
+    if start != -1 and end != -1 and end > start:
+        return text[start : end + 1]
+
+    return text
+
+
+def _straighten_quotes(text: str) -> str:
+    """
+    Replace curly quotes used as string delimiters with ASCII quotes.
+    Curly quotes inside a string are text ("the “cell” wall") and stay as
+    they are: a string opened with a curly quote is closed by one only
+    when it is followed by ':', ',', '}', ']' or the end.
+    """
+    out = []
+    opened = None  # the quote that opened the current string
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if opened is None:
+            if ch in _SMART_QUOTES or ch in "\"'":
+                opened = ch
+                ch = _SMART_QUOTES.get(ch, ch)
+        elif ch == "\\" and i + 1 < n:
+            out.append(text[i : i + 2])
+            i += 2
+            continue
+        else:
+            quote = _SMART_QUOTES.get(opened, opened)
+            if ch == quote:
+                opened = None
+            elif opened in _SMART_QUOTES and _SMART_QUOTES.get(ch) == quote:
+                rest = text[i + 1 :].lstrip()
+                if not rest or rest[0] in ":,}]":
+                    opened = None
+                    ch = quote
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _load_object(text: str) -> Optional[Dict]:
+    """One {...} object: strict JSON, then after local repair, then as a Python literal."""
+    try:
+        obj = json.loads(text)
+    except ValueError:
+        repaired = _TRAILING_COMMA.sub(r"\1", _straighten_quotes(text))
+        try:
+            # strict=False: raw newlines / tabs inside strings
+            obj = json.loads(repaired, strict=False)
+        except ValueError:
+            try:
+                obj = ast.literal_eval(repaired)
+            except (ValueError, SyntaxError, MemoryError, RecursionError):
+                return None
+    return obj if isinstance(obj, dict) else None
+
+
+def _options(raw) -> Optional[List[str]]:
+    if isinstance(raw, dict):
+        # {"A": "...", "B": "..."}
+        raw = [raw[k] for k in sorted(raw)]
+    if not isinstance(raw, list) or not (MIN_OPTIONS <= len(raw) <= MAX_OPTIONS):
+        return None
+    options = [str(o).strip() for o in raw if isinstance(o, (str, int, float))]
+    if len(options) != len(raw) or not all(options):
+        return None
+
+    # Drop "A. " / "B) " prefixes only when every option has its own letter
+    prefixes = [_OPTION_PREFIX.match(o) for o in options]
+    if all(m and m.group(1).upper() == chr(65 + i) for i, m in enumerate(prefixes)):
+        options = [o[m.end():].strip() for o, m in zip(options, prefixes)]
+    return options
+
+
+def _answer_letter(raw, options: List[str]) -> Optional[str]:
+    if isinstance(raw, int) and 0 <= raw < len(options):
+        return chr(65 + raw)
+    answer = str(raw or "").strip()
+    if not answer:
+        return None
+    # The answer given as the option's text
+    lowered = answer.lower()
+    for i, option in enumerate(options):
+        if option.lower() == lowered:
+            return chr(65 + i)
+    match = _ANSWER_LETTER.match(answer)
+    if match and ord(match.group(1).upper()) - 65 < len(options):
+        return match.group(1).upper()
+    return None
+
+
+def normalize_mcq(item) -> Optional[Dict]:
+    """
+    Validate one MCQ object against the schema and normalize it
+    (answer as a letter, options without letter prefixes, explanation
+    defaults to ""). Returns None if it is unusable.
+    """
+    if not isinstance(item, dict):
+        return None
+    question = item.get("question")
+    if not isinstance(question, str) or not question.strip():
+        return None
+    options = _options(item.get("options"))
+    if options is None:
+        return None
+    answer = _answer_letter(item.get("answer"), options)
+    if answer is None:
+        return None
+    explanation = item.get("explanation")
+    return {
+        "question": question.strip(),
+        "options": options,
+        "answer": answer,
+        "explanation": explanation.strip() if isinstance(explanation, str) else "",
+    }
+
+
+class MCQStream:
+    """
+    Incrementally scan (streamed) model output for complete top-level JSON
+    objects (the MCQs inside the array), so each one can be emitted as soon
+    as its closing brace arrives. Braces inside strings are ignored.
+    feed() returns the newly completed objects that are valid MCQs.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.obj_start = -1
+
+    def feed(self, text: str) -> List[Dict]:
+        self.buffer += text
+        found = []
+        while self.pos < len(self.buffer):
+            ch = self.buffer[self.pos]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"' and self.depth > 0:
+                self.in_string = True
+            elif ch == "{":
+                if self.depth == 0:
+                    self.obj_start = self.pos
+                self.depth += 1
+            elif ch == "}" and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    mcq = normalize_mcq(_load_object(self.buffer[self.obj_start : self.pos + 1]))
+                    if mcq is not None:
+                        found.append(mcq)
+            self.pos += 1
+        return found
+
+
+def parse_mcqs(text: str) -> Tuple[List[Dict], str]:
+    """
+    All valid MCQs in a model response, and the path that produced them
+    ("direct", "repaired" or "failed"). Objects cut off by a truncated
+    response are dropped; the complete ones before them are kept.
+    """
+    try:
+        data = json.loads(extract_json_array(text))
+    except ValueError:
+        data = None
+    if isinstance(data, list):
+        mcqs = [m for m in map(normalize_mcq, data) if m is not None]
+        if mcqs:
+            return mcqs, "direct"
+
+    mcqs = MCQStream().feed(text)
+    return mcqs, ("repaired" if mcqs else "failed")
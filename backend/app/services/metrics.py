@@ -0,0 +1,226 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ..config import METRICS_ENABLED
+
+
+# ========= Latency metrics (Prometheus text format) =========
+# - span("stage") times a block: stage histogram + the current request's
+#   per-stage timing log. @timed("stage") does the same for a function,
+#   record_stage() for a total measured by the caller.
+# - observe_request() feeds the per-route histogram (see main.py middleware)
+# - record_tokens() counts LLM prompt / completion tokens
+# - record_mcq_parse() counts how MCQ responses were parsed (mcq_parsing.py)
+# With METRICS_ENABLED off, span() returns a shared no-op context and
+# @timed returns the function unchanged, so instrumented code pays ~nothing.
+#
+# Metrics are per process; scrape every worker (or run one worker per pod).
+
+PREFIX = "luminote"
+
+# Seconds; LLM calls and big uploads need the long tail
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class _Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...], buckets=_BUCKETS):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # per-bucket counts (+Inf last), sum, count
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(k, list(v[0]), v[1], v[2]) for k, v in self._series.items()]
+        for labels, counts, total, count in sorted(snapshot):
+            base = _labels(self.labelnames, labels)
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{base} {total}")
+            lines.append(f"{self.name}_count{base} {count}")
+        return lines
+
+
+class _Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...]):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for labels, value in snapshot:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+STAGE_SECONDS = _Histogram("stage_seconds", "Time spent per pipeline stage.", ("stage",))
+REQUEST_SECONDS = _Histogram("request_seconds", "HTTP request latency per route.", ("method", "route", "status"))
+LLM_TOKENS = _Counter("llm_tokens_total", "LLM tokens by kind (prompt / completion).", ("kind",))
+MCQ_PARSE = _Counter(
+    "mcq_parse_total", "MCQ responses by parsing path (direct / repaired / llm_fix / failed).", ("path",)
+)
+CONTEXT_TOKENS = _Counter(
+    "context_tokens_total", "Prompt context tokens (used / saved by overlap merging and deduplication).", ("kind",)
+)
+
+
+# ========= Spans =========
+
+# Stage timings of the request being served: {stage: seconds}
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+_NOOP = nullcontext()
+
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record_stage(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def _record_stage(name: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def span(name: str):
+    """Time a block as pipeline stage `name` (no-op when metrics are off)."""
+    return _Span(name) if METRICS_ENABLED else _NOOP
+
+
+def record_stage(name: str, seconds: float) -> None:
+    """
+    Record `seconds` measured elsewhere as one observation of stage `name`
+    (for work interleaved with other stages, e.g. a lazily consumed stream).
+    """
+    if METRICS_ENABLED:
+        _record_stage(name, seconds)
+
+
+def timed(name: str) -> Callable:
+    """Decorator form of span() for sync and async functions."""
+
+    def decorate(fn):
+        if not METRICS_ENABLED:
+            return fn
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with _Span(name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def record_tokens(prompt_tokens: int, completion_tokens: int) -> None:
+    if METRICS_ENABLED:
+        LLM_TOKENS.inc(prompt_tokens, "prompt")
+        LLM_TOKENS.inc(completion_tokens, "completion")
+
+
+def record_mcq_parse(path: str) -> None:
+    if METRICS_ENABLED:
+        MCQ_PARSE.inc(1, path)
+
+
+def record_context(used_tokens: int, saved_tokens: int) -> None:
+    if METRICS_ENABLED:
+        CONTEXT_TOKENS.inc(used_tokens, "used")
+        CONTEXT_TOKENS.inc(saved_tokens, "saved")
+
+
+# ========= Requests =========
+
+
+def begin_request() -> Tuple[contextvars.Token, Dict[str, float]]:
+    """Start collecting stage timings for the current request."""
+    timings: Dict[str, float] = {}
+    return _request_timings.set(timings), timings
+
+
+def end_request(token: contextvars.Token) -> None:
+    _request_timings.reset(token)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    REQUEST_SECONDS.observe(seconds, method, route, str(status))
+
+
+def render(gauges: Optional[Dict[str, float]] = None) -> str:
+    """All metrics in Prometheus text exposition format (plus point-in-time gauges)."""
+    lines = (
+        STAGE_SECONDS.render()
+        + REQUEST_SECONDS.render()
+        + LLM_TOKENS.render()
+        + MCQ_PARSE.render()
+        + CONTEXT_TOKENS.render()
+    )
+    for name, value in (gauges or {}).items():
+        lines += [f"# TYPE {PREFIX}_{name} gauge", f"{PREFIX}_{name} {value}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,122 @@
+import datetime
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from ..config import QUERY_CACHE_SIZE
+from ..db import db, async_db
+from ..resources import embeddings
+from .embedding_codec import encode_embedding, decode_embedding
+from .metrics import span
+
+
+# ========= Query embedding cache =========
+# Search queries repeat (the graphs' fixed queries, popular topics), and
+# each embed_query is a round trip to the embeddings API. Vectors are cached
+# by (embedding model, normalized query text) in two tiers:
+# - in-process LRU of QUERY_CACHE_SIZE entries; the ANCHOR_QUERIES are
+#   pinned outside it, pre-embedded at startup (resources.warm_up)
+# - db.query_embeddings, expired EMBEDDING_CACHE_TTL_DAYS after last use
+#   (TTL index created at startup, see indexes.ensure_indexes)
+
+# Fixed queries of the summary / MCQ graphs and the search default
+KEY_POINTS_QUERY = "key points"
+MCQ_QUERY = "important key points"
+OVERVIEW_QUERY = "overall content of document"
+ANCHOR_QUERIES = (KEY_POINTS_QUERY, MCQ_QUERY, OVERVIEW_QUERY)
+
+_memory: "OrderedDict[str, List[float]]" = OrderedDict()
+_anchors: Dict[str, List[float]] = {}
+_lock = threading.Lock()
+
+
+def normalize_query(text: str) -> str:
+    """
+    Whitespace-insensitive form of a query, used for the cache key only
+    (the caller's text is what gets embedded). Case is kept: "DNA" and
+    "dna" can embed differently.
+    """
+    return " ".join((text or "").split())
+
+
+def _cache_key(text: str) -> str:
+    model = getattr(embeddings, "model", None) or type(embeddings).__name__
+    return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+def _memory_get(key: str) -> Optional[List[float]]:
+    with _lock:
+        vec = _anchors.get(key)
+        if vec is None:
+            vec = _memory.get(key)
+            if vec is not None:
+                _memory.move_to_end(key)
+        return vec
+
+
+def _remember(key: str, vec: List[float]) -> None:
+    with _lock:
+        _memory[key] = vec
+        _memory.move_to_end(key)
+        while len(_memory) > QUERY_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+
+def _stored_update(vec: List[float], now: datetime.datetime) -> Dict:
+    return {
+        "$setOnInsert": encode_embedding(vec, "float32"),
+        "$set": {"last_used_at": now},
+    }
+
+
+def embed_query(text: str) -> List[float]:
+    """embeddings.embed_query through the cache (memory, then MongoDB, then the API)."""
+    key = _cache_key(normalize_query(text))
+    vec = _memory_get(key)
+    if vec is not None:
+        return vec
+
+    now = datetime.datetime.utcnow()
+    stored = db.query_embeddings.find_one_and_update({"_id": key}, {"$set": {"last_used_at": now}})
+    if stored is not None:
+        vec = decode_embedding(stored).tolist()
+    else:
+        with span("embed_query"):
+            vec = embeddings.embed_query(text)
+        db.query_embeddings.update_one({"_id": key}, _stored_update(vec, now), upsert=True)
+    _remember(key, vec)
+    return vec
+
+
+async def aembed_query(text: str) -> List[float]:
+    """Async embed_query (the MongoDB tier and the API call are awaited)."""
+    key = _cache_key(normalize_query(text))
+    vec = _memory_get(key)
+    if vec is not None:
+        return vec
+
+    now = datetime.datetime.utcnow()
+    stored = await async_db.query_embeddings.find_one_and_update({"_id": key}, {"$set": {"last_used_at": now}})
+    if stored is not None:
+        vec = decode_embedding(stored).tolist()
+    else:
+        with span("embed_query"):
+            vec = await embeddings.aembed_query(text)
+        await async_db.query_embeddings.update_one({"_id": key}, _stored_update(vec, now), upsert=True)
+    _remember(key, vec)
+    return vec
+
+
+def warm_anchor_queries() -> int:
+    """Embed (or load) the ANCHOR_QUERIES and pin them in memory. Returns how many."""
+    for text in ANCHOR_QUERIES:
+        vec = embed_query(text)
+        with _lock:
+            _anchors[_cache_key(normalize_query(text))] = vec
+    return len(ANCHOR_QUERIES)
+
+
+def query_cache_stats() -> Dict[str, int]:
+    with _lock:
+        return {"entries": len(_memory), "anchors": len(_anchors), "capacity": QUERY_CACHE_SIZE}
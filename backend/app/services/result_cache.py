@@ -0,0 +1,117 @@
+import datetime
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from ..config import RETENTION_DAYS, RESULT_CACHE_SIZE
+from ..db import db, async_db
+
+
+# ========= LLM result cache =========
+# Generated summaries / questions, keyed by everything that affects them:
+# chunk owner (content), mode, topic or num_questions, model, prompt version.
+#
+# Two tiers:
+# - in-process LRU (RESULT_CACHE_SIZE entries) for millisecond hits
+# - db.llm_results, expired by a TTL index after RETENTION_DAYS, i.e. no
+#   longer than the documents they were generated from (the index is
+#   created at startup, see indexes.ensure_indexes)
+
+_TTL_SECONDS = RETENTION_DAYS * 24 * 3600
+
+_memory: "OrderedDict[str, tuple]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def result_key(doc_id: str, mode: str, params: Dict, model: str, prompt_version: str) -> str:
+    payload = json.dumps(
+        {"doc": doc_id, "mode": mode, "params": params, "model": model, "prompt": prompt_version},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _remember(key: str, doc_id: str, value: Dict, created_at: datetime.datetime) -> None:
+    with _lock:
+        _memory[key] = (doc_id, value, created_at)
+        _memory.move_to_end(key)
+        while len(_memory) > RESULT_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+
+def _memory_get(key: str) -> Optional[Dict]:
+    now = datetime.datetime.utcnow()
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            _doc_id, value, created_at = entry
+            if (now - created_at).total_seconds() < _TTL_SECONDS:
+                _memory.move_to_end(key)
+                return value
+            del _memory[key]
+    return None
+
+
+def get_result(key: str) -> Optional[Dict]:
+    value = _memory_get(key)
+    if value is not None:
+        return value
+
+    stored = db.llm_results.find_one({"_id": key})
+    if stored is None:
+        return None
+    _remember(key, stored["doc_id"], stored["value"], stored["created_at"])
+    return stored["value"]
+
+
+async def aget_result(key: str) -> Optional[Dict]:
+    """Async get_result (the MongoDB tier is awaited)."""
+    value = _memory_get(key)
+    if value is not None:
+        return value
+
+    stored = await async_db.llm_results.find_one({"_id": key})
+    if stored is None:
+        return None
+    _remember(key, stored["doc_id"], stored["value"], stored["created_at"])
+    return stored["value"]
+
+
+def put_result(key: str, doc_id: str, value: Dict) -> None:
+    now = datetime.datetime.utcnow()
+    db.llm_results.replace_one(
+        {"_id": key},
+        {"doc_id": doc_id, "value": value, "created_at": now},
+        upsert=True,
+    )
+    _remember(key, doc_id, value, now)
+
+
+async def aput_result(key: str, doc_id: str, value: Dict) -> None:
+    """Async put_result."""
+    now = datetime.datetime.utcnow()
+    await async_db.llm_results.replace_one(
+        {"_id": key},
+        {"doc_id": doc_id, "value": value, "created_at": now},
+        upsert=True,
+    )
+    _remember(key, doc_id, value, now)
+
+
+def delete_results(doc_id: Optional[str]) -> None:
+    """Forget every cached result generated from this chunk owner's content."""
+    if doc_id:
+        delete_results_many([doc_id])
+
+
+def delete_results_many(doc_ids: List[str]) -> None:
+    """delete_results for several chunk owners in one MongoDB query."""
+    if not doc_ids:
+        return
+    db.llm_results.delete_many({"doc_id": {"$in": doc_ids}})
+    owners = set(doc_ids)
+    with _lock:
+        for key in [k for k, v in _memory.items() if v[0] in owners]:
+            del _memory[key]
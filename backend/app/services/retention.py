@@ -0,0 +1,165 @@
+import asyncio
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from pymongo.errors import DuplicateKeyError
+
+from ..config import (
+    RETENTION_DAYS,
+    CLEANUP_INTERVAL_MINUTES,
+    CLEANUP_BATCH_SIZE,
+    CLEANUP_BATCH_PAUSE_MS,
+)
+from ..db import db
+from .ann_index import delete_index
+from .lexical_index import delete_indexes_many
+from .content_store import release_documents
+from .result_cache import delete_results_many
+from .section_summaries import delete_section_summaries_many
+from .vector_store import forget_document_cache, forget_chunks_owner
+
+
+# ========= Retention cleanup =========
+# Documents older than RETENTION_DAYS are deleted by a periodic background
+# task (not on the upload path), in batches of CLEANUP_BATCH_SIZE:
+#   1 find (expired doc_ids) -> delete the document records ->
+#   content refcounts per distinct hash -> 1 delete_many per collection with $in
+# A lease in db.locks makes sure only one API worker cleans at a time
+# (two passes over the same documents would release their content twice).
+
+logger = logging.getLogger(__name__)
+
+_LEASE_ID = "retention_cleanup"
+_LEASE_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+_stats_lock = threading.Lock()
+_stats = {
+    "passes": 0,
+    "documents_removed": 0,
+    "chunks_removed": 0,
+    "last_pass": None,
+}
+
+
+def _acquire_lease(seconds: float) -> bool:
+    now = datetime.datetime.utcnow()
+    try:
+        db.locks.find_one_and_update(
+            {"_id": _LEASE_ID, "$or": [{"expires_at": {"$lt": now}}, {"owner": _LEASE_OWNER}]},
+            {"$set": {"owner": _LEASE_OWNER, "expires_at": now + datetime.timedelta(seconds=seconds)}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        # Held by another worker (the upsert collided with the live lease)
+        return False
+
+
+def _release_lease() -> None:
+    db.locks.delete_one({"_id": _LEASE_ID, "owner": _LEASE_OWNER})
+
+
+# The batch query (also explained by indexes.check_query_plans)
+EXPIRED_FIELDS = {"_id": 0, "doc_id": 1, "content_hash": 1, "chunks_doc_id": 1}
+
+
+def expired_filter(cutoff: datetime.datetime) -> Dict:
+    return {"created_at": {"$lt": cutoff}, "doc_id": {"$exists": True}}
+
+
+def _delete_batch(docs) -> Dict[str, int]:
+    doc_ids = [d["doc_id"] for d in docs]
+
+    # Document records first: if the pass dies before the release below,
+    # the next pass does not find these documents again and release their
+    # content twice (a leaked refcount only keeps shared chunks around)
+    removed = db.documents.delete_many({"doc_id": {"$in": doc_ids}}).deleted_count
+    for doc_id in doc_ids:
+        forget_chunks_owner(doc_id)
+
+    # Chunks go only when no other (deduplicated) upload still shares them
+    owners = release_documents(docs)
+    chunks_removed = 0
+    if owners:
+        chunks_removed = db.chunks.delete_many({"doc_id": {"$in": owners}}).deleted_count
+        delete_section_summaries_many(owners)
+        delete_results_many(owners)
+        delete_indexes_many(owners)
+        for owner in owners:
+            forget_document_cache(owner)
+            delete_index(owner)
+    return {"documents": removed, "chunks": chunks_removed}
+
+
+def cleanup_expired_documents(
+    batch_size: int = CLEANUP_BATCH_SIZE,
+    pause_ms: int = CLEANUP_BATCH_PAUSE_MS,
+) -> Optional[Dict]:
+    """
+    Delete documents (and their chunks, summaries, cached results and
+    ANN indexes) older than RETENTION_DAYS, batch by batch.
+    Returns the pass stats, or None if another worker is already cleaning.
+    """
+    if not _acquire_lease(seconds=max(600, CLEANUP_INTERVAL_MINUTES * 60)):
+        return None
+
+    started = time.perf_counter()
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=RETENTION_DAYS)
+    totals = {"documents": 0, "chunks": 0, "batches": 0}
+    try:
+        while True:
+            docs = list(db.documents.find(expired_filter(cutoff), EXPIRED_FIELDS).limit(batch_size))
+            if not docs:
+                break
+            removed = _delete_batch(docs)
+            totals["documents"] += removed["documents"]
+            totals["chunks"] += removed["chunks"]
+            totals["batches"] += 1
+            if len(docs) < batch_size:
+                break
+            # Let uploads / queries get at the database between batches
+            time.sleep(pause_ms / 1000)
+    finally:
+        _release_lease()
+
+    result = {
+        "finished_at": datetime.datetime.utcnow().isoformat() + "Z",
+        "documents_removed": totals["documents"],
+        "chunks_removed": totals["chunks"],
+        "batches": totals["batches"],
+        "duration_s": round(time.perf_counter() - started, 3),
+    }
+    with _stats_lock:
+        _stats["passes"] += 1
+        _stats["documents_removed"] += totals["documents"]
+        _stats["chunks_removed"] += totals["chunks"]
+        _stats["last_pass"] = result
+    if totals["documents"]:
+        logger.info("retention cleanup: %s", result)
+    return result
+
+
+def cleanup_stats() -> Dict:
+    """Totals since startup plus the last pass run by this worker."""
+    with _stats_lock:
+        return {**_stats, "interval_minutes": CLEANUP_INTERVAL_MINUTES}
+
+
+async def run_periodic_cleanup() -> None:
+    """
+    Background task (started from the app lifespan): a cleanup pass right
+    away, then every CLEANUP_INTERVAL_MINUTES. The deletes run in a worker
+    thread, so the event loop keeps serving requests.
+    """
+    while True:
+        try:
+            await run_in_threadpool(cleanup_expired_documents)
+        except Exception:
+            logger.exception("retention cleanup failed")
+        await asyncio.sleep(CLEANUP_INTERVAL_MINUTES * 60)
@@ -0,0 +1,69 @@
+import datetime
+import hashlib
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from ..db import db, async_db
+
+
+# ========= Persisted section summaries (map-reduce) =========
+# db.section_summaries keeps the "map" output of map-reduce summaries:
+#   _id     -> "<chunks doc_id>:<model>:<prompt version>:<sha256 of section text>"
+#   doc_id  -> doc_id that owns the chunks (deleted together with them)
+#   section, chunk_start, chunk_end, summary, created_at
+# Keying on the section text means a cached summary is only reused for
+# exactly the same input.
+# Only map-reduce summaries read them; the retrieval-based full and topic
+# summaries summarize their top chunks directly.
+
+
+def section_key(doc_id: str, model: str, prompt_version: str, text: str) -> str:
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{doc_id}:{model}:{prompt_version}:{digest}"
+
+
+async def load_section_summaries(keys: List[str]) -> Dict[str, str]:
+    """Return {key: summary} for the keys that are already stored."""
+    if not keys:
+        return {}
+    found = async_db.section_summaries.find({"_id": {"$in": keys}}, {"summary": 1})
+    return {d["_id"]: d["summary"] async for d in found}
+
+
+async def save_section_summaries(doc_id: str, sections: List[Dict]) -> None:
+    """
+    Store freshly generated section summaries.
+    Each item needs: key, section, chunk_start, chunk_end, summary.
+    """
+    if not sections:
+        return
+    now = datetime.datetime.utcnow()
+    ops = [
+        UpdateOne(
+            {"_id": s["key"]},
+            {
+                "$set": {
+                    "doc_id": doc_id,
+                    "section": s["section"],
+                    "chunk_start": s["chunk_start"],
+                    "chunk_end": s["chunk_end"],
+                    "summary": s["summary"],
+                    "created_at": now,
+                }
+            },
+            upsert=True,
+        )
+        for s in sections
+    ]
+    await async_db.section_summaries.bulk_write(ops, ordered=False)
+
+
+def delete_section_summaries(doc_id: Optional[str]) -> None:
+    if doc_id:
+        delete_section_summaries_many([doc_id])
+
+
+def delete_section_summaries_many(doc_ids: List[str]) -> None:
+    if doc_ids:
+        db.section_summaries.delete_many({"doc_id": {"$in": doc_ids}})
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Set, Tuple
+
+
+# ========= Single-flight request coalescing =========
+# Concurrent callers with the same key share ONE in-flight computation:
+# the first caller (the leader) runs it, everyone else waits for its
+# result. Errors are propagated to every waiter. Works for async callers
+# (event loop) and sync callers (threadpool, e.g. SSE generators) alike.
+#
+# Async leaders run the computation in a task of its own: when the leading
+# client goes away (its request / SSE generator is cancelled or closed),
+# the computation carries on and still finishes the flight, so followers
+# get the result instead of an error. Only an Exception raised by the
+# computation itself fails the flight.
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+        # Detached leader tasks (referenced until done so they are not collected)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def join(self, key: str) -> Tuple[Future, bool]:
+        """
+        Return (future, is_leader). The leader must call finish() or fail();
+        followers just wait on the future.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            self.executed += 1
+            return future, True
+
+    def finish(self, key: str, value: Any) -> None:
+        with self._lock:
+            future = self._inflight.pop(key, None)
+        if future is not None:
+            future.set_result(value)
+
+    def fail(self, key: str, exc: BaseException) -> None:
+        with self._lock:
+            future = self._inflight.pop(key, None)
+        if future is not None:
+            if not isinstance(exc, Exception):
+                # Cancellation / generator close: don't re-raise that in other requests
+                exc = RuntimeError("The shared request was cancelled before it finished.")
+            future.set_exception(exc)
+
+    def _detach(self, coro) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Await fn() once per key across concurrent callers. Returns (value, was_coalesced)."""
+        future, leader = self.join(key)
+        if not leader:
+            return await asyncio.wrap_future(future), True
+
+        def settle(task: asyncio.Task) -> None:
+            if task.cancelled():
+                self.fail(key, asyncio.CancelledError())
+            elif task.exception() is not None:
+                self.fail(key, task.exception())
+            else:
+                self.finish(key, task.result())
+
+        task = self._detach(fn())
+        task.add_done_callback(settle)
+        # Cancelling this caller leaves the task running for the followers
+        return await asyncio.shield(task), False
+
+    async def stream(self, key: str, events: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        """
+        Relay the leader's `events` (an async generator that calls finish()
+        itself), driven by a detached task: closing this relay (client
+        disconnect) does not stop the generation. An Exception raised by
+        `events` fails the flight and is re-raised here.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        async def drive() -> None:
+            try:
+                async for event in events:
+                    queue.put_nowait((True, event))
+            except Exception as exc:
+                self.fail(key, exc)
+                queue.put_nowait((False, exc))
+            except BaseException as exc:
+                # The task itself was cancelled (server shutdown)
+                self.fail(key, exc)
+                raise
+            finally:
+                queue.put_nowait((True, done))
+
+        self._detach(drive())
+        while True:
+            ok, event = await queue.get()
+            if not ok:
+                raise event
+            if event is done:
+                return
+            yield event
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._inflight),
+            }
+
+
+# Shared by the summary and question entry points (keys are result cache keys)
+llm_requests = SingleFlight()
@@ -0,0 +1,51 @@
+import json
+import logging
+import time
+from typing import AsyncIterator, Dict, Tuple
+
+from fastapi.responses import StreamingResponse
+
+
+logger = logging.getLogger(__name__)
+
+
+def _format_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _timed_events(events: AsyncIterator[Tuple[str, Dict]], route: str) -> AsyncIterator[str]:
+    """
+    Serialize (event, data) pairs as server-sent events and log the time to
+    first byte. The final "done" event also carries ttfb_ms and total_ms.
+    Errors are reported as an "error" event, since the 200 status is already sent.
+    """
+    started = time.perf_counter()
+    ttfb_ms = None
+    try:
+        async for event, data in events:
+            if ttfb_ms is None:
+                ttfb_ms = (time.perf_counter() - started) * 1000
+                logger.info("%s ttfb_ms=%.1f", route, ttfb_ms)
+            if event == "done":
+                data = {
+                    **data,
+                    "ttfb_ms": round(ttfb_ms, 1),
+                    "total_ms": round((time.perf_counter() - started) * 1000, 1),
+                }
+            yield _format_event(event, data)
+    except Exception as exc:
+        logger.exception("%s stream failed", route)
+        yield _format_event("error", {"detail": str(exc) or type(exc).__name__})
+
+
+def sse_response(events: AsyncIterator[Tuple[str, Dict]], route: str) -> StreamingResponse:
+    """
+    Wrap an async event generator in an SSE response.
+    The graph/LLM calls behind `events` are awaited on the event loop,
+    so a slow generation never holds a threadpool thread.
+    """
+    return StreamingResponse(
+        _timed_events(events, route),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -4,14 +4,23 @@ from __future__ import annotations
 
 import io
 import os
+import math
+import mmap
 import mimetypes
-from typing import Optional
+import resource
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Tuple
 
 from PIL import Image
 import pytesseract
 import pdfplumber
 from docx import Document
 
+from .metrics import span, timed
+
 # --------------------------------------------------------------------
 # Tesseract configuration
 # --------------------------------------------------------------------
@@ -25,40 +34,54 @@ if os.name == "nt":
 # On Render (Linux), OCR will be disabled automatically.
 OCR_ENABLED = os.getenv("ENABLE_OCR", "1" if os.name == "nt" else "0") == "1"
 
+# Resolution used when rasterizing a scanned page for OCR
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+
+# --------------------------------------------------------------------
+# Parallel PDF extraction
+# --------------------------------------------------------------------
+
+# PDFs with at least this many pages are split into page ranges and
+# extracted on a process pool; smaller ones are cheaper to do inline.
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+
+# Pool jobs report the worker's peak RSS (MB) to this kind of callback
+RssCallback = Callable[[float], None]
+
 
 # --------------------------------------------------------------------
 # Helper functions
 # --------------------------------------------------------------------
 
-def _safe_decode_text(raw: bytes) -> str:
-    """Try a few encodings to decode plain text / code files."""
+def _safe_decode_text(raw) -> str:
+    """Try a few encodings to decode plain text / code files (bytes or mmap)."""
     for enc in ("utf-8", "latin-1", "windows-1252"):
         try:
-            return raw.decode(enc)
+            return str(raw, enc)
         except UnicodeDecodeError:
             continue
     return ""
 
 
-def _extract_from_pdf(raw: bytes) -> str:
-    """Extract text from a PDF using its text layer (no OCR)."""
-    text_parts = []
-    with pdfplumber.open(io.BytesIO(raw)) as pdf:
-        for page in pdf.pages:
-            txt = page.extract_text() or ""
-            txt = txt.strip()
-            if txt:
-                text_parts.append(txt)
-    return "\n\n".join(text_parts)
+def _open_source(source):
+    """A file path is passed through as-is; raw bytes are wrapped in BytesIO."""
+    return source if isinstance(source, str) else io.BytesIO(source)
 
 
-def _ocr_image_bytes(raw: bytes) -> str:
-    """Run OCR on an image (only if OCR_ENABLED and Tesseract is available)."""
+def _ocr_image(source) -> str:
+    """
+    Run OCR on an image, given as a file path or raw bytes
+    (only if OCR_ENABLED and Tesseract is available).
+    """
     if not OCR_ENABLED:
         return ""
 
     try:
-        img = Image.open(io.BytesIO(raw))
+        img = Image.open(_open_source(source))
         img = img.convert("L")  # grayscale
         text = pytesseract.image_to_string(img, config="--psm 6")
         return text or ""
@@ -69,45 +92,153 @@ def _ocr_image_bytes(raw: bytes) -> str:
         return ""
 
 
-def _ocr_pdf_pages(raw: bytes) -> str:
+def _ocr_pdf_page(source, page_number: int) -> str:
     """
-    Convert each PDF page to an image and OCR it.
+    Rasterize ONE page (1-based) at OCR_DPI and OCR it.
+    `source` is a file path or the raw PDF bytes.
     NOTE: This is disabled on Render (Linux) by OCR_ENABLED flag.
     """
     if not OCR_ENABLED:
         return ""
 
     try:
-        from pdf2image import convert_from_bytes
+        from pdf2image import convert_from_bytes, convert_from_path
     except ImportError:
         # pdf2image not installed
         return ""
 
     try:
-        pages = convert_from_bytes(raw)
+        convert = convert_from_path if isinstance(source, str) else convert_from_bytes
+        images = convert(source, dpi=OCR_DPI, first_page=page_number, last_page=page_number)
     except Exception:
         return ""
 
     texts = []
-    for page in pages:
+    for image in images:
         try:
-            page = page.convert("L")
-            txt = pytesseract.image_to_string(page, config="--psm 6")
+            image = image.convert("L")
+            txt = pytesseract.image_to_string(image, config="--psm 6")
             if txt.strip():
-                texts.append(txt)
+                texts.append(txt.strip())
         except pytesseract.TesseractNotFoundError:
             return ""
         except Exception:
             continue
-
     return "\n\n".join(texts)
 
 
-def _extract_from_docx(raw: bytes) -> str:
-    """Extract text from a DOCX file."""
+def _extract_pdf_page_range(source, start: int, end: int) -> List[str]:
+    """
+    Extract pages [start, end) (0-based) from a PDF path or bytes.
+    Pages without a text layer are OCR'd one at a time (if OCR_ENABLED).
+    Runs inside the process pool for large PDFs, so it must stay top-level.
+    """
+    texts = []
+    with pdfplumber.open(_open_source(source)) as pdf:
+        for page in pdf.pages[start:end]:
+            txt = (page.extract_text() or "").strip()
+            if not txt:
+                txt = _ocr_pdf_page(source, page.page_number).strip()
+            texts.append(txt)
+            # pdfplumber caches parsed objects per page; free them as we go
+            page.flush_cache()
+    return texts
+
+
+def _reset_peak_rss() -> None:
+    """Restart this process's peak RSS (VmHWM) count, so a pool job measures only itself (Linux)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_mb() -> float:
+    """Peak RSS of this process in MB (since the last _reset_peak_rss where supported)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    # ru_maxrss is KB on Linux (lifetime peak)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _extract_pdf_range_in_worker(path: str, start: int, end: int) -> Tuple[List[str], float]:
+    """Process-pool entry point for one page range: (pages, worker peak RSS in MB)."""
+    _reset_peak_rss()
+    pages = _extract_pdf_page_range(path, start, end)
+    return pages, _peak_rss_mb()
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """Process pool for PDF page ranges and (offload=True) whole-file extraction."""
+    global _pdf_pool
+    if _pdf_pool is None:
+        # "spawn" avoids forking a process that is running other threads
+        _pdf_pool = ProcessPoolExecutor(
+            max_workers=PDF_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pdf_pool
+
+
+def _extract_pdf_pages(source, on_worker_rss: Optional[RssCallback] = None) -> List[str]:
+    """
+    Extract every page of a PDF (file path or bytes), in page order
+    (one string per page).
+    - Text layer first; OCR only for pages whose text layer is empty
+    - Large PDFs are split into page ranges across a process pool
+      (each range's worker peak RSS goes to `on_worker_rss`)
+    """
+    with pdfplumber.open(_open_source(source)) as pdf:
+        num_pages = len(pdf.pages)
+
+    if num_pages < PDF_PARALLEL_MIN_PAGES or PDF_WORKERS <= 1:
+        return _extract_pdf_page_range(source, 0, num_pages)
+
+    global _pdf_pool
+    temp_path = None
+    if isinstance(source, str):
+        path = source
+    else:
+        # Workers read the PDF from a temp file instead of each receiving a copy of the bytes
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+            tmp.write(source)
+            path = temp_path = tmp.name
+
+    try:
+        per_task = max(PDF_PAGES_PER_TASK, math.ceil(num_pages / (PDF_WORKERS * 4)))
+        ranges = [(s, min(s + per_task, num_pages)) for s in range(0, num_pages, per_task)]
+        pool = _get_pdf_pool()
+        futures = [pool.submit(_extract_pdf_range_in_worker, path, s, e) for s, e in ranges]
+
+        pages: List[str] = []
+        for future in futures:
+            range_pages, peak_mb = future.result()
+            pages.extend(range_pages)
+            if on_worker_rss is not None:
+                on_worker_rss(peak_mb)
+        return pages
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM); reset the pool and do it inline
+        _pdf_pool = None
+        return _extract_pdf_page_range(path, 0, num_pages)
+    finally:
+        if temp_path:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+
+def _extract_from_docx(source) -> str:
+    """Extract text from a DOCX file (path or bytes)."""
     try:
-        file_like = io.BytesIO(raw)
-        doc = Document(file_like)
+        doc = Document(_open_source(source))
         paras = [p.text.strip() for p in doc.paragraphs if p.text.strip()]
         return "\n\n".join(paras)
     except Exception:
@@ -125,50 +256,164 @@ def _guess_mime(filename: Optional[str], content_type: Optional[str]) -> str:
 
 
 # --------------------------------------------------------------------
-# Public function used by documents.py
+# Public functions used by the ingestion pipeline
 # --------------------------------------------------------------------
 
-def extract_text_from_bytes(
-    raw_bytes: bytes,
-    filename: Optional[str] = None,
-    content_type: Optional[str] = None,
-) -> str:
+def join_pages(pages: List[str]) -> Tuple[str, List[Dict[str, int]]]:
     """
-    Unified text extractor:
-    - PDFs (text layer; OCR fallback only when OCR_ENABLED)
-    - Images (OCR when OCR_ENABLED)
-    - DOCX
-    - Text / code files
+    Join page texts with blank lines (skipping empty pages).
+    Returns the text and, for each non-empty page, its 1-based number and
+    [start, end) character offsets in the joined text.
     """
-    if not raw_bytes:
-        return ""
-
+    parts = []
+    offsets = []
+    pos = 0
+    for number, page_text in enumerate(pages, start=1):
+        if not page_text.strip():
+            continue
+        if parts:
+            pos += 2  # "\n\n" separator
+        parts.append(page_text)
+        offsets.append({"page": number, "start": pos, "end": pos + len(page_text)})
+        pos += len(page_text)
+    return "\n\n".join(parts), offsets
+
+
+@timed("extract")
+def _extract_pages(
+    source,
+    filename: Optional[str],
+    content_type: Optional[str],
+    on_worker_rss: Optional[RssCallback] = None,
+) -> List[str]:
     mime = _guess_mime(filename, content_type)
     fname_lower = (filename or "").lower()
 
     # ---- PDF ----
     if mime == "application/pdf" or fname_lower.endswith(".pdf"):
-        text = _extract_from_pdf(raw_bytes)
-        if text.strip():
-            return text
-
-        # Fallback to OCR ONLY on local (Windows) where OCR_ENABLED = True
-        ocr_text = _ocr_pdf_pages(raw_bytes)
-        return ocr_text or text
+        # Text layer per page; OCR only for pages that lack one (OCR_ENABLED)
+        return _extract_pdf_pages(source, on_worker_rss)
 
     # ---- Images (PNG, JPG, etc.) ----
     if mime.startswith("image/") or fname_lower.endswith(
         (".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".gif")
     ):
-        return _ocr_image_bytes(raw_bytes)
+        with span("ocr"):
+            return [_ocr_image(source)]
 
     # ---- DOCX ----
     if fname_lower.endswith(".docx") or mime == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-        txt = _extract_from_docx(raw_bytes)
+        txt = _extract_from_docx(source)
         if txt.strip():
-            return txt
+            return [txt]
 
     # ---- Default: treat as plain text / code ----
-    txt = _safe_decode_text(raw_bytes)
-    return txt
+    if not isinstance(source, str):
+        return [_safe_decode_text(source)]
+
+    # Decode straight from a read-only mmap: no intermediate bytes copy
+    with open(source, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return [""]
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return [_safe_decode_text(mapped)]
+
 
+def extract_pages_from_bytes(
+    raw_bytes: bytes,
+    filename: Optional[str] = None,
+    content_type: Optional[str] = None,
+) -> List[str]:
+    """
+    Like extract_text_from_bytes, but keeps page structure:
+    PDFs return one string per page in page order; other formats
+    return a single "page".
+    """
+    if not raw_bytes:
+        return []
+    return _extract_pages(raw_bytes, filename, content_type)
+
+
+def _extract_file_in_worker(
+    path: str,
+    filename: Optional[str],
+    content_type: Optional[str],
+) -> Tuple[List[str], float]:
+    """
+    Process-pool entry point for one whole file; PDF pages are read inline
+    (no nested pool). Returns (pages, worker peak RSS in MB).
+    """
+    global PDF_WORKERS
+    PDF_WORKERS = 1
+    _reset_peak_rss()
+    pages = _extract_pages(path, filename, content_type)
+    return pages, _peak_rss_mb()
+
+
+def _should_offload(path: str, filename: Optional[str], content_type: Optional[str]) -> bool:
+    """CPU-bound formats that are not already split into page ranges across the pool."""
+    mime = _guess_mime(filename, content_type)
+    fname_lower = (filename or "").lower()
+    if mime == "application/pdf" or fname_lower.endswith(".pdf"):
+        try:
+            with pdfplumber.open(path) as pdf:
+                return len(pdf.pages) < PDF_PARALLEL_MIN_PAGES
+        except Exception:
+            return False
+    return (
+        mime.startswith("image/")
+        or fname_lower.endswith((".docx", ".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".gif"))
+    )
+
+
+def extract_pages_from_path(
+    path: str,
+    filename: Optional[str] = None,
+    content_type: Optional[str] = None,
+    offload: bool = False,
+    on_worker_rss: Optional[RssCallback] = None,
+) -> List[str]:
+    """
+    Same as extract_pages_from_bytes, but reads from a file on disk so the
+    upload never has to be held in memory (PDF/DOCX/images are opened by
+    path, text files are decoded from an mmap).
+    offload=True (ingestion) extracts small PDFs, DOCX and images on the
+    process pool too, so concurrent uploads use every core instead of
+    sharing the calling process's GIL.
+    `on_worker_rss` gets the peak RSS (MB) of every pool job run for the
+    file; that memory is not part of the calling process's RSS.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return []
+
+    global _pdf_pool
+    if offload and PDF_WORKERS > 1 and _should_offload(path, filename, content_type):
+        try:
+            with span("extract"):
+                pages, peak_mb = _get_pdf_pool().submit(_extract_file_in_worker, path, filename, content_type).result()
+            if on_worker_rss is not None:
+                on_worker_rss(peak_mb)
+            return pages
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); reset the pool and do it inline
+            _pdf_pool = None
+    return _extract_pages(path, filename, content_type, on_worker_rss)
+
+
+def extract_text_from_bytes(
+    raw_bytes: bytes,
+    filename: Optional[str] = None,
+    content_type: Optional[str] = None,
+) -> str:
+    """
+    Unified text extractor:
+    - PDFs (text layer; OCR fallback per empty page only when OCR_ENABLED)
+    - Images (OCR when OCR_ENABLED)
+    - DOCX
+    - Text / code files
+    """
+    pages = extract_pages_from_bytes(raw_bytes, filename=filename, content_type=content_type)
+    if len(pages) == 1:
+        return pages[0]
+    text, _ = join_pages(pages)
+    return text
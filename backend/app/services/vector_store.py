@@ -1,88 +1,804 @@
-from typing import List
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from ..config import embeddings
-from ..db import db
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from pymongo import UpdateOne
+from ..config import (
+    VECTOR_CACHE_MAX_MB,
+    ANN_MIN_CHUNKS,
+    ANN_NPROBE,
+    EMBEDDING_STORAGE,
+)
+from ..db import db, async_db
+from . import ann_index, lexical_index
+from .chunking import CHUNK_SIZE, CHUNK_OVERLAP, iter_chunks
+from .embedding_codec import encode_embedding, decode_embedding
+from .embedding_pipeline import embed_in_batches
+from .result_cache import delete_results
+from .metrics import record_stage, span, timed
+from .query_cache import KEY_POINTS_QUERY, embed_query, aembed_query
 
-def chunk_text(text: str, chunk_size: int = 800, overlap: int = 150) -> List[str]:
+
+@timed("chunk")
+def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
     """
     Split raw text into overlapping chunks for embedding & retrieval.
+    (index_document streams the same chunks with page metadata instead.)
+    """
+    return [chunk["text"] for chunk in iter_chunks([text or ""], chunk_size, overlap)]
+
+
+def index_document(
+    doc_id: str,
+    pages: Union[str, Sequence[str]],
+    on_stage: Optional[Callable[[str], None]] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, int]:
+    """
+    - Chunk the document page by page (chunking.iter_chunks: chunk_index,
+      character offsets and page numbers), never joining the whole text
+    - Embed the chunks batch by batch as they are produced with the
+      configured embeddings model (Nomic), reusing cached embeddings for
+      chunks seen before (embedding_pipeline)
+    - Store each batch in MongoDB (collection: chunks) as soon as it is
+      embedded, packed as binary in the EMBEDDING_STORAGE format
+    `pages` are the extracted page texts (or one string for the whole text).
+    Resumable: chunks a previous (failed) call already stored for this
+    doc_id are not embedded or inserted again.
+    Returns {"chunks": ..., "cache_hits": ..., "cache_misses": ..., "resumed_chunks": ...}.
+    `on_stage` is called with "chunking", "embedding" and (large documents)
+    "indexing"; `on_progress(stored, total)` after every batch (`total` is
+    estimated from the characters chunked so far until the last page).
     """
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=overlap,
+    stage = on_stage or (lambda _: None)
+    if isinstance(pages, str):
+        pages = [pages]
+
+    stage("chunking")
+    stored = {c["chunk_index"] for c in db.chunks.find({"doc_id": doc_id}, {"_id": 0, "chunk_index": 1})}
+    lexical = lexical_index.IndexBuilder()
+    # Length of the joined text (join_pages), for the progress estimate
+    non_empty = [len(p) for p in pages if p.strip()]
+    total_chars = sum(non_empty) + 2 * max(len(non_empty) - 1, 0)
+    read = {"chunks": 0, "end": 0, "finished": False}
+
+    def stream():
+        # Chunks pass through here on the way to the embedding batches,
+        # in chunk_index order: the BM25 index is built along the way.
+        # The embedder pulls them lazily, so the "chunk" stage is the time
+        # spent in here (summed, recorded once) rather than a span around it.
+        chunks = iter_chunks(pages)
+        elapsed = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    lexical.add(chunk["text"])
+                elapsed += time.perf_counter() - started
+                if chunk is None:
+                    break
+                read["chunks"] += 1
+                read["end"] = chunk["char_end"]
+                yield chunk
+            read["finished"] = True
+        finally:
+            record_stage("chunk", elapsed)
+
+    def store(chunks: List[Dict], vecs: List) -> None:
+        docs = [
+            {"doc_id": doc_id, **chunk, **encode_embedding(emb, EMBEDDING_STORAGE)}
+            for chunk, emb in zip(chunks, vecs)
+        ]
+        with span("mongo_insert"):
+            db.chunks.insert_many(docs)
+
+    def progress(stored_count: int, _read: int) -> None:
+        if on_progress is None:
+            return
+        total = read["chunks"]
+        if not read["finished"] and read["end"]:
+            remaining = max(total_chars - read["end"], 0)
+            total += round(remaining * read["chunks"] / read["end"])
+        on_progress(stored_count, max(total, stored_count))
+
+    # embeddings: NomicEmbeddings from config.py (only for cache misses)
+    stage("embedding")
+    cache_stats = embed_in_batches(stream(), store, done=stored, on_progress=progress)
+    if not cache_stats["chunks"]:
+        return {"chunks": 0, "cache_hits": 0, "cache_misses": 0, "resumed_chunks": 0}
+
+    # Any cached matrix for this doc is now stale, and so are summaries /
+    # questions generated from the chunks stored so far
+    invalidate_document_cache(doc_id)
+    delete_results(doc_id)
+
+    # BM25 index for lexical / hybrid search
+    lexical_index.save_index(doc_id, lexical.finish())
+
+    # Large documents get an ANN index so searches skip the full scan
+    # (built from the stored rows, which also warms the matrix cache)
+    if cache_stats["chunks"] > ANN_MIN_CHUNKS:
+        stage("indexing")
+        matrix, _ = _load_document_matrix(doc_id)
+        ann_index.build_index(doc_id, matrix)
+
+    return {
+        "chunks": cache_stats["chunks"],
+        "cache_hits": cache_stats["hits"],
+        "cache_misses": cache_stats["misses"],
+        "resumed_chunks": len(stored),
+    }
+
+
+def migrate_embeddings(mode: str = EMBEDDING_STORAGE, batch_size: int = 500) -> int:
+    """
+    Convert chunks that still store embeddings as BSON float arrays
+    into the binary `mode` format. Safe to re-run; returns chunks converted.
+    Run it with: python -m benchmarks.migrate_embeddings
+    """
+    converted = 0
+    ops = []
+    touched = set()
+
+    legacy = db.chunks.find(
+        {"embedding": {"$type": "array"}},
+        {"_id": 1, "doc_id": 1, "embedding": 1},
     )
-    return splitter.split_text(text or "")
+    for c in legacy:
+        ops.append(UpdateOne({"_id": c["_id"]}, {"$set": encode_embedding(c["embedding"], mode)}))
+        touched.add(c.get("doc_id"))
+        if len(ops) >= batch_size:
+            converted += db.chunks.bulk_write(ops, ordered=False).modified_count
+            ops = []
+
+    if ops:
+        converted += db.chunks.bulk_write(ops, ordered=False).modified_count
+
+    for doc_id in touched:
+        invalidate_document_cache(doc_id)
 
+    return converted
 
-def index_document(doc_id: str, text: str) -> int:
+
+# ========= In-memory matrix cache =========
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
     """
-    - Split the document text into chunks
-    - Embed each chunk with the configured embeddings model (Nomic)
-    - Store chunks + embeddings in MongoDB (collection: chunks)
+    L2-normalize each row so cosine similarity becomes a plain dot product.
+    Zero rows stay zero (they score 0.0, like the old per-element loop).
     """
-    chunks = chunk_text(text)
-    if not chunks:
-        return 0
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
 
-    # embeddings: NomicEmbeddings from config.py
-    vecs = embeddings.embed_documents(chunks)
 
-    docs = []
-    for i, (chunk, emb) in enumerate(zip(chunks, vecs)):
-        docs.append(
-            {
-                "doc_id": doc_id,
-                "chunk_index": i,
-                "text": chunk,
-                "embedding": emb,
-            }
-        )
+class _DocMatrixCache:
+    """
+    LRU cache of per-document search data, bounded by total byte size:
+    doc_id -> (normalized float32 embedding matrix, chunk records without embeddings)
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._sizes = {}
+        self._total = 0
+        # Generation of every document invalidated since it was last evicted
+        # or deleted (values come from one counter, so they only grow).
+        # Documents without an entry are at _floor: the highest generation
+        # pruned so far, so a load that started before a prune is not cached.
+        self._generations = {}
+        self._counter = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def generation(self, doc_id: str) -> int:
+        """Bumped on every invalidation, so stale loads are never cached."""
+        with self._lock:
+            return self._generations.get(doc_id, self._floor)
+
+    def get(self, doc_id: str):
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry is not None:
+                self._entries.move_to_end(doc_id)
+            return entry
+
+    def put(self, doc_id: str, matrix: np.ndarray, records: list, generation: int) -> None:
+        size = matrix.nbytes + sum(len(r.get("text", "")) for r in records)
+        with self._lock:
+            if self._generations.get(doc_id, self._floor) != generation:
+                # Chunks changed while we were loading them
+                return
+            self._drop(doc_id)
+            if size > self.max_bytes:
+                # Too large to cache at all; callers still get a correct result
+                return
+            self._entries[doc_id] = (matrix, records)
+            self._sizes[doc_id] = size
+            self._total += size
+            while self._total > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._prune(oldest)
+
+    def invalidate(self, doc_id: str) -> None:
+        with self._lock:
+            self._counter += 1
+            self._generations[doc_id] = self._counter
+            self._drop(doc_id)
+
+    def forget(self, doc_id: str) -> None:
+        """Invalidate a deleted document without keeping its generation."""
+        with self._lock:
+            self._counter += 1
+            self._generations[doc_id] = self._counter
+            self._drop(doc_id)
+            self._prune(doc_id)
+
+    def _prune(self, doc_id: str) -> None:
+        pruned = self._generations.pop(doc_id, None)
+        if pruned is not None:
+            self._floor = max(self._floor, pruned)
+
+    def _drop(self, doc_id: str) -> None:
+        if doc_id in self._entries:
+            del self._entries[doc_id]
+            self._total -= self._sizes.pop(doc_id)
+
+
+_matrix_cache = _DocMatrixCache(VECTOR_CACHE_MAX_MB * 1024 * 1024)
+
+
+def invalidate_document_cache(doc_id: str) -> None:
+    """
+    Forget the cached search matrix for a document.
+    Call this whenever its chunks are inserted or deleted.
+    """
+    _matrix_cache.invalidate(doc_id)
+    ann_index.forget_index(doc_id)
+    lexical_index.forget_index(doc_id)
+
 
-    if docs:
-        db.chunks.insert_many(docs)
+def forget_document_cache(doc_id: str) -> None:
+    """invalidate_document_cache for a document whose chunks were deleted for good."""
+    _matrix_cache.forget(doc_id)
+    ann_index.forget_index(doc_id)
+    lexical_index.forget_index(doc_id)
 
-    return len(docs)
 
+def _matrix_from_chunks(doc_id: str, chunks: List[Dict], generation: int):
+    """Decode chunk embeddings into a normalized matrix and cache it with the records."""
+    records = []
+    vectors = []
+    for c in chunks:
+        vectors.append(decode_embedding(c))
+        for field in ("embedding", "embedding_dtype", "embedding_scale"):
+            c.pop(field, None)
+        records.append(c)
 
-def _cosine_similarity(a, b) -> float:
+    if not records:
+        return None, []
+
+    width = max(v.shape[0] for v in vectors)
+    matrix = np.zeros((len(vectors), width), dtype=np.float32)
+    for i, v in enumerate(vectors):
+        matrix[i, : v.shape[0]] = v
+
+    matrix = _normalize_rows(matrix)
+    _matrix_cache.put(doc_id, matrix, records, generation)
+    return matrix, records
+
+
+# Only what search needs: the embedding + what results expose
+_MATRIX_FIELDS = {
+    "_id": 0,
+    "doc_id": 1,
+    "chunk_index": 1,
+    "text": 1,
+    "char_start": 1,
+    "char_end": 1,
+    "page_start": 1,
+    "page_end": 1,
+    "embedding": 1,
+    "embedding_dtype": 1,
+    "embedding_scale": 1,
+}
+
+
+def _load_document_matrix(doc_id: str):
+    """
+    Return (normalized matrix, chunk records) for a document,
+    reading the chunks from MongoDB only on a cache miss.
+    Rows are in chunk_index order (the order the ANN index refers to).
+    """
+    cached = _matrix_cache.get(doc_id)
+    if cached is not None:
+        return cached
+
+    generation = _matrix_cache.generation(doc_id)
+    with span("load_matrix"):
+        chunks = list(db.chunks.find({"doc_id": doc_id}, _MATRIX_FIELDS).sort("chunk_index", 1))
+    return _matrix_from_chunks(doc_id, chunks, generation)
+
+
+async def _aload_document_matrix(doc_id: str):
+    """Async _load_document_matrix: the cache-miss read does not block the event loop."""
+    cached = _matrix_cache.get(doc_id)
+    if cached is not None:
+        return cached
+
+    generation = _matrix_cache.generation(doc_id)
+    with span("load_matrix"):
+        cursor = async_db.chunks.find({"doc_id": doc_id}, _MATRIX_FIELDS).sort("chunk_index", 1)
+        chunks = await cursor.to_list(None)
+    return _matrix_from_chunks(doc_id, chunks, generation)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first.
+    Ties keep their original chunk order, like the old stable sort.
+    """
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
+
+
+# ========= Shared (deduplicated) chunks =========
+
+# doc_id -> doc_id its chunks are stored under; fixed for a document's lifetime
+_OWNER_CACHE_SIZE = 10000
+_chunk_owners: "OrderedDict[str, str]" = OrderedDict()
+_owners_lock = threading.Lock()
+
+
+def _cached_owner(doc_id: str) -> Optional[str]:
+    with _owners_lock:
+        owner = _chunk_owners.get(doc_id)
+        if owner is not None:
+            _chunk_owners.move_to_end(doc_id)
+        return owner
+
+
+def _remember_owner(doc_id: str, doc: Optional[Dict]) -> str:
+    owner = (doc or {}).get("chunks_doc_id") or doc_id
+    if doc is not None:
+        with _owners_lock:
+            _chunk_owners[doc_id] = owner
+            while len(_chunk_owners) > _OWNER_CACHE_SIZE:
+                _chunk_owners.popitem(last=False)
+    return owner
+
+
+def chunks_owner(doc_id: str) -> str:
     """
-    Simple cosine similarity between two embedding vectors.
+    Resolve the doc_id that holds a document's chunks.
+    Deduplicated uploads point at the first upload of the same content.
     """
-    import math
+    owner = _cached_owner(doc_id)
+    if owner is not None:
+        return owner
+    doc = db.documents.find_one({"doc_id": doc_id}, {"chunks_doc_id": 1})
+    return _remember_owner(doc_id, doc)
+
+
+async def achunks_owner(doc_id: str) -> str:
+    """Async chunks_owner."""
+    owner = _cached_owner(doc_id)
+    if owner is not None:
+        return owner
+    doc = await async_db.documents.find_one({"doc_id": doc_id}, {"chunks_doc_id": 1})
+    return _remember_owner(doc_id, doc)
+
+
+CHUNK_FIELDS = ("doc_id", "chunk_index", "text")
+
+
+def _projection(fields: Sequence[str]) -> Dict[str, int]:
+    return {"_id": 0, **{field: 1 for field in fields}}
+
+
+def get_document_chunks(doc_id: str, fields: Sequence[str] = CHUNK_FIELDS) -> List[Dict]:
+    """
+    All chunks of a document in chunk_index order, without embeddings.
+    Only `fields` are read from MongoDB (default: doc_id of the chunk
+    owner, chunk_index, text).
+    """
+    owner = chunks_owner(doc_id)
+    cursor = db.chunks.find({"doc_id": owner}, _projection(fields)).sort("chunk_index", 1)
+    return list(cursor)
+
+
+async def aget_document_chunks(doc_id: str, fields: Sequence[str] = CHUNK_FIELDS) -> List[Dict]:
+    """Async get_document_chunks."""
+    owner = await achunks_owner(doc_id)
+    cursor = async_db.chunks.find({"doc_id": owner}, _projection(fields)).sort("chunk_index", 1)
+    return await cursor.to_list(None)
+
+
+def _rows_by_index(matrix, records, chunk_indexes: Sequence[int]) -> Dict[int, np.ndarray]:
+    wanted = set(chunk_indexes)
+    if not wanted or not records:
+        return {}
+    return {r["chunk_index"]: matrix[row] for row, r in enumerate(records) if r["chunk_index"] in wanted}
+
+
+_VECTOR_FIELDS = {"_id": 0, "chunk_index": 1, "embedding": 1, "embedding_dtype": 1, "embedding_scale": 1}
+
 
-    length = min(len(a), len(b))
-    dot = 0.0
-    na = 0.0
-    nb = 0.0
-    for i in range(length):
-        dot += a[i] * b[i]
-        na += a[i] * a[i]
-        nb += b[i] * b[i]
-    if na == 0 or nb == 0:
-        return 0.0
-    return dot / (math.sqrt(na) * math.sqrt(nb))
+def _normalized_by_index(chunks: List[Dict]) -> Dict[int, np.ndarray]:
+    vectors = {}
+    for c in chunks:
+        vec = decode_embedding(c).astype(np.float32)
+        norm = np.linalg.norm(vec)
+        vectors[c["chunk_index"]] = vec / norm if norm else vec
+    return vectors
 
 
-def search_document(doc_id: str, query: str, n_results: int = 8):
+def get_chunk_vectors(doc_id: str, chunk_indexes: Sequence[int]) -> Dict[int, np.ndarray]:
+    """
+    Stored embeddings (L2-normalized) of some of a document's chunks:
+    {chunk_index: vector}. From the matrix cache when the document is in
+    it, else only those chunks' embeddings are read (lexical searches never
+    load the whole matrix). No embedding call is made.
+    """
+    owner = chunks_owner(doc_id)
+    cached = _matrix_cache.get(owner)
+    if cached is not None:
+        return _rows_by_index(*cached, chunk_indexes)
+    if not chunk_indexes:
+        return {}
+    chunks = db.chunks.find({"doc_id": owner, "chunk_index": {"$in": list(chunk_indexes)}}, _VECTOR_FIELDS)
+    return _normalized_by_index(list(chunks))
+
+
+async def aget_chunk_vectors(doc_id: str, chunk_indexes: Sequence[int]) -> Dict[int, np.ndarray]:
+    """Async get_chunk_vectors."""
+    owner = await achunks_owner(doc_id)
+    cached = _matrix_cache.get(owner)
+    if cached is not None:
+        return _rows_by_index(*cached, chunk_indexes)
+    if not chunk_indexes:
+        return {}
+    cursor = async_db.chunks.find({"doc_id": owner, "chunk_index": {"$in": list(chunk_indexes)}}, _VECTOR_FIELDS)
+    return _normalized_by_index(await cursor.to_list(None))
+
+
+def forget_chunks_owner(doc_id: str) -> None:
+    with _owners_lock:
+        _chunk_owners.pop(doc_id, None)
+
+
+def _query_vector(query_emb, width: int) -> Optional[np.ndarray]:
+    """
+    Fit the query embedding to the matrix width and normalize it.
+    Returns None for an all-zero query (every chunk scores 0.0).
+    """
+    q = np.zeros(width, dtype=np.float32)
+    n = min(len(query_emb), width)
+    q[:n] = query_emb[:n]
+    q_norm = np.linalg.norm(q)
+    if q_norm == 0:
+        return None
+    return q / q_norm
+
+
+def _vector_scores(doc_id: str, matrix, query_emb, nprobe: Optional[int] = None):
+    """(row positions, cosine scores): ANN candidates above ANN_MIN_CHUNKS, else every row."""
+    q = _query_vector(query_emb, matrix.shape[1])
+    if q is None:
+        return np.arange(matrix.shape[0]), np.zeros(matrix.shape[0], dtype=np.float32)
+    if matrix.shape[0] > ANN_MIN_CHUNKS:
+        index = ann_index.get_index(doc_id, matrix)
+        rows = index.candidates(q, ANN_NPROBE if nprobe is None else nprobe)
+        return rows, matrix[rows] @ q
+    return np.arange(matrix.shape[0]), matrix @ q
+
+
+def _result(record: Dict, fields: Optional[Sequence[str]], score: float) -> Dict:
+    if fields is None:
+        chunk = dict(record)
+    else:
+        chunk = {field: record.get(field) for field in fields}
+    chunk["score"] = float(score)
+    return chunk
+
+
+def _rank_matrix(
+    doc_id: str,
+    matrix,
+    records,
+    query_emb,
+    n_results: int,
+    nprobe: Optional[int] = None,
+    fields: Optional[Sequence[str]] = None,
+) -> list:
+    if not records:
+        return []
+
+    rows, scores = _vector_scores(doc_id, matrix, query_emb, nprobe)
+    return [_result(records[rows[i]], fields, scores[i]) for i in _top_k(scores, n_results)]
+
+
+# ========= Lexical / hybrid search =========
+# mode="vector"  -> embeddings only (default)
+# mode="hybrid"  -> BM25 and vector rankings fused by reciprocal rank
+#                   (exact terms: formula names, identifiers, acronyms)
+# mode="lexical" -> BM25 only: no embedding call, and only the top chunks
+#                   are read when the search matrix is not cached
+
+SEARCH_MODES = ("vector", "hybrid", "lexical")
+
+# Reciprocal-rank fusion: score = sum of 1 / (_RRF_K + rank) over the rankings
+_RRF_K = 60
+
+
+def _check_mode(mode: str) -> None:
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode!r} (expected one of {SEARCH_MODES})")
+
+
+def _lexical_for_records(doc_id: str, index, records) -> "lexical_index.LexicalIndex":
+    """The document's BM25 index, rebuilt from the chunk texts if missing or stale."""
+    if index is None or index.n_chunks != len(records):
+        # e.g. documents indexed before BM25 existed
+        index = lexical_index.build_index(doc_id, [r.get("text", "") for r in records])
+    return index
+
+
+async def _alexical_for_records(doc_id: str, index, records) -> "lexical_index.LexicalIndex":
+    """Async _lexical_for_records: a rebuild (tokenizing + MongoDB write) runs off the event loop."""
+    if index is None or index.n_chunks != len(records):
+        index = await run_in_threadpool(_lexical_for_records, doc_id, index, records)
+    return index
+
+
+async def _aensure_ann_index(doc_id: str, matrix) -> None:
+    """
+    Load (or rebuild: k-means) a large document's ANN index off the event
+    loop, so _vector_scores finds it in memory.
+    """
+    if matrix.shape[0] > ANN_MIN_CHUNKS:
+        await run_in_threadpool(ann_index.get_index, doc_id, matrix)
+
+
+def _rank_hybrid(
+    doc_id: str,
+    matrix,
+    records,
+    query_emb,
+    query: str,
+    lexical,
+    n_results: int,
+    fields: Optional[Sequence[str]] = None,
+) -> list:
+    depth = max(4 * n_results, 50)
+    rows, scores = _vector_scores(doc_id, matrix, query_emb)
+    vector_ranked = rows[_top_k(scores, depth)]
+    lexical_scores = lexical.scores(query)
+    lexical_ranked = [i for i in _top_k(lexical_scores, depth) if lexical_scores[i] > 0]
+
+    fused: Dict[int, float] = {}
+    for ranked in (vector_ranked, lexical_ranked):
+        for rank, row in enumerate(ranked, start=1):
+            fused[int(row)] = fused.get(int(row), 0.0) + 1.0 / (_RRF_K + rank)
+    best = sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:n_results]
+    return [_result(records[row], fields, score) for row, score in best]
+
+
+def _lexical_top(lexical, query: str, n_results: int) -> List[Tuple[int, float]]:
+    """(chunk_index, BM25 score) of the best chunks that match any query term."""
+    scores = lexical.scores(query)
+    return [(int(i), float(scores[i])) for i in _top_k(scores, n_results) if scores[i] > 0]
+
+
+def _lexical_results(top, chunks: List[Dict], fields: Optional[Sequence[str]]) -> list:
+    by_index = {c["chunk_index"]: c for c in chunks}
+    return [_result(by_index[i], fields, score) for i, score in top if i in by_index]
+
+
+def _search_lexical(owner: str, query: str, n_results: int, fields: Optional[Sequence[str]]) -> list:
+    cached = _matrix_cache.get(owner)
+    records = cached[1] if cached is not None else None
+    index = lexical_index.get_index(owner)
+    if index is None or (records is not None and index.n_chunks != len(records)):
+        if records is None:
+            records = list(db.chunks.find({"doc_id": owner}, _projection(CHUNK_FIELDS)).sort("chunk_index", 1))
+        index = _lexical_for_records(owner, index, records)
+
+    top = _lexical_top(index, query, n_results)
+    if not top:
+        return []
+    if records is None:
+        records = list(
+            db.chunks.find({"doc_id": owner, "chunk_index": {"$in": [i for i, _ in top]}}, _projection(CHUNK_FIELDS))
+        )
+    return _lexical_results(top, records, fields)
+
+
+async def _asearch_lexical(owner: str, query: str, n_results: int, fields: Optional[Sequence[str]]) -> list:
+    """Async _search_lexical."""
+    cached = _matrix_cache.get(owner)
+    records = cached[1] if cached is not None else None
+    index = await lexical_index.aget_index(owner)
+    if index is None or (records is not None and index.n_chunks != len(records)):
+        if records is None:
+            cursor = async_db.chunks.find({"doc_id": owner}, _projection(CHUNK_FIELDS)).sort("chunk_index", 1)
+            records = await cursor.to_list(None)
+        index = await _alexical_for_records(owner, index, records)
+
+    top = _lexical_top(index, query, n_results)
+    if not top:
+        return []
+    if records is None:
+        cursor = async_db.chunks.find(
+            {"doc_id": owner, "chunk_index": {"$in": [i for i, _ in top]}}, _projection(CHUNK_FIELDS)
+        )
+        records = await cursor.to_list(None)
+    return _lexical_results(top, records, fields)
+
+
+def _rank_document(doc_id: str, query_emb, n_results: int, nprobe: Optional[int] = None) -> list:
+    """
+    Top-N chunks of one document for an already-embedded query.
+    Uses the ANN index above ANN_MIN_CHUNKS, the exact scan otherwise.
+    """
+    matrix, records = _load_document_matrix(doc_id)
+    return _rank_matrix(doc_id, matrix, records, query_emb, n_results, nprobe)
+
+
+def search_document(
+    doc_id: str,
+    query: str,
+    n_results: int = 8,
+    fields: Optional[Sequence[str]] = None,
+    mode: str = "vector",
+):
     """
     Semantic search:
-    - Embed the query
-    - Compute cosine similarity with all chunks for this doc_id
-    - Return top-N chunks sorted by relevance
+    - Embed the query (query_cache: repeated queries skip the API call)
+    - Score the chunks for this doc_id with one matrix-vector product
+      (cached, pre-normalized embedding matrix; ANN candidates for large docs)
+    - Return top-N chunks sorted by relevance, each with its "score";
+      `fields` limits each result to those chunk fields (default: all of
+      doc_id, chunk_index, text)
+    `mode` "hybrid" fuses in BM25, "lexical" uses BM25 alone (see SEARCH_MODES).
+    """
+    _check_mode(mode)
+    if not query:
+        query = KEY_POINTS_QUERY
+
+    if mode == "lexical":
+        with span("search_lexical"):
+            return _search_lexical(chunks_owner(doc_id), query, n_results, fields)
+
+    query_emb = embed_query(query)
+    owner = chunks_owner(doc_id)
+    matrix, records = _load_document_matrix(owner)
+    if not records:
+        return []
+    if mode == "hybrid":
+        lexical = _lexical_for_records(owner, lexical_index.get_index(owner), records)
+        with span("search_score"):
+            return _rank_hybrid(owner, matrix, records, query_emb, query, lexical, n_results, fields)
+    with span("search_score"):
+        return _rank_matrix(owner, matrix, records, query_emb, n_results, fields=fields)
+
+
+async def asearch_document(
+    doc_id: str,
+    query: str,
+    n_results: int = 8,
+    fields: Optional[Sequence[str]] = None,
+    mode: str = "vector",
+):
+    """
+    Async search_document for the request path: the query embedding and
+    the MongoDB reads are awaited, so other requests keep being served.
     """
+    _check_mode(mode)
     if not query:
-        query = "key points"
+        query = KEY_POINTS_QUERY
 
-    query_emb = embeddings.embed_query(query)
+    if mode == "lexical":
+        with span("search_lexical"):
+            return await _asearch_lexical(await achunks_owner(doc_id), query, n_results, fields)
 
-    all_chunks = list(db.chunks.find({"doc_id": doc_id}))
-    if not all_chunks:
+    query_emb = await aembed_query(query)
+    owner = await achunks_owner(doc_id)
+    matrix, records = await _aload_document_matrix(owner)
+    if not records:
         return []
+    await _aensure_ann_index(owner, matrix)
+    if mode == "hybrid":
+        lexical = await _alexical_for_records(owner, await lexical_index.aget_index(owner), records)
+        with span("search_score"):
+            return _rank_hybrid(owner, matrix, records, query_emb, query, lexical, n_results, fields)
+    with span("search_score"):
+        return _rank_matrix(owner, matrix, records, query_emb, n_results, fields=fields)
+
+
+def search_documents(doc_ids: List[str], query: str, n_results: int = 8):
+    """
+    Cross-document semantic search:
+    - Embed the query once
+    - Take the top-N chunks of each document
+    - Merge them into one top-N list (each chunk keeps its doc_id)
+    """
+    if not query:
+        query = KEY_POINTS_QUERY
+
+    query_emb = embed_query(query)
+
+    owners = {}
+    for doc_id in doc_ids:
+        owners.setdefault(chunks_owner(doc_id), doc_id)
+
+    merged = []
+    for owner, doc_id in owners.items():
+        for chunk in _rank_document(owner, query_emb, n_results):
+            # Report the requested doc_id, not the shared chunk owner
+            chunk["doc_id"] = doc_id
+            merged.append(chunk)
+
+    merged.sort(key=lambda x: x.get("score", 0), reverse=True)
+    return merged[:n_results]
+
+
+async def asearch_documents(
+    doc_ids: List[str],
+    query: str,
+    n_results: int = 8,
+):
+    """Async search_documents for the request path (POST /api/documents/search)."""
+    if not query:
+        query = KEY_POINTS_QUERY
+
+    query_emb = await aembed_query(query)
+
+    owners = {}
+    for doc_id in doc_ids:
+        owners.setdefault(await achunks_owner(doc_id), doc_id)
+
+    merged = []
+    for owner, doc_id in owners.items():
+        matrix, records = await _aload_document_matrix(owner)
+        if not records:
+            continue
+        await _aensure_ann_index(owner, matrix)
+        for chunk in _rank_matrix(owner, matrix, records, query_emb, n_results):
+            # Report the requested doc_id, not the shared chunk owner
+            chunk["doc_id"] = doc_id
+            merged.append(chunk)
+
+    merged.sort(key=lambda x: x.get("score", 0), reverse=True)
+    return merged[:n_results]
+
+
+def ann_recall_at_k(doc_id: str, queries: List[str], k: int = 8, nprobe: Optional[int] = None) -> float:
+    """
+    Recall@k of the document's ANN index against the exact scan,
+    for tuning ANN_NLIST / ANN_NPROBE on real queries.
+    """
+    doc_id = chunks_owner(doc_id)
+    matrix, records = _load_document_matrix(doc_id)
+    if not records or not queries:
+        return 1.0
 
-    for c in all_chunks:
-        c["score"] = _cosine_similarity(query_emb, c.get("embedding", []))
+    vecs = [_query_vector(embed_query(q), matrix.shape[1]) for q in queries]
+    vecs = np.array([v for v in vecs if v is not None], dtype=np.float32).reshape(-1, matrix.shape[1])
 
-    all_chunks.sort(key=lambda x: x.get("score", 0), reverse=True)
-    top = all_chunks[:n_results]
-    return top
+    index = ann_index.get_index(doc_id, matrix)
+    return ann_index.recall_at_k(index, matrix, vecs, k=k, nprobe=nprobe)
@@ -0,0 +1,134 @@
+"""
+Recall@k and latency of the IVF (ANN) index per nprobe, for tuning
+ANN_NLIST / ANN_NPROBE.
+
+Indexes a generated document above ANN_MIN_CHUNKS (so it gets an IVF
+index), then for each nprobe reports:
+- recall@k of the ANN candidates against the exact scan
+- search latency (query embedding cached, matrix cached)
+The exact scan's latency is reported alongside for comparison.
+
+Offline by default (local stand-ins, see stand_ins.py). The stand-in
+embeddings are hash-based, i.e. close to uniformly random vectors, which
+is the hardest case for IVF: offline recall is a floor. --live runs
+against the configured MongoDB + Nomic instead.
+
+    cd backend
+    python -m benchmarks.bench_ann_recall
+    python -m benchmarks.bench_ann_recall --live --chunks 5000 --nprobe 4 8 16
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from . import stand_ins
+
+
+def _queries(num_queries: int, seed: int = 5) -> List[str]:
+    """Query-like strings: a few words taken from the sample vocabulary."""
+    rng = np.random.default_rng(seed)
+    words = stand_ins.sample_text(2000, seed=seed).split()
+    return [" ".join(rng.choice(words, size=4)) for _ in range(num_queries)]
+
+
+def _p50_ms(timings: List[float]) -> float:
+    return round(float(np.percentile(timings, 50)) * 1000, 3)
+
+
+def run(num_chunks: int, k: int, nprobes: List[int], num_queries: int) -> Dict:
+    from app.config import ANN_MIN_CHUNKS
+    from app.services import ann_index
+    from app.services.chunking import CHUNK_SIZE, CHUNK_OVERLAP
+    from app.services.vector_store import (
+        index_document,
+        ann_recall_at_k,
+        _load_document_matrix,
+        _query_vector,
+        _rank_document,
+        _top_k,
+    )
+
+    doc_id = f"bench-ann-{num_chunks}"
+    chars_per_word = len(stand_ins.sample_text(1000, seed=3)) / 1000
+    text = stand_ins.sample_text(int(num_chunks * (CHUNK_SIZE - CHUNK_OVERLAP) / chars_per_word), seed=3)
+    started = time.perf_counter()
+    stats = index_document(doc_id, text)
+    index_s = time.perf_counter() - started
+
+    matrix, records = _load_document_matrix(doc_id)
+    index = ann_index.get_index(doc_id, matrix)
+    results = {
+        "chunks": stats["chunks"],
+        "ann_min_chunks": ANN_MIN_CHUNKS,
+        "uses_ann": stats["chunks"] > ANN_MIN_CHUNKS,
+        "nlist": index.nlist,
+        "index_s": round(index_s, 3),
+        "k": k,
+        "queries": num_queries,
+    }
+    queries = _queries(num_queries)
+
+    try:
+        from app.services.query_cache import embed_query
+
+        query_embs = [embed_query(q) for q in queries]
+        exact = []
+        for emb in query_embs:
+            started = time.perf_counter()
+            _top_k(matrix @ _query_vector(emb, matrix.shape[1]), k)
+            exact.append(time.perf_counter() - started)
+        results["exact_p50_ms"] = _p50_ms(exact)
+
+        per_nprobe = {}
+        for nprobe in nprobes:
+            timings = []
+            for emb in query_embs:
+                started = time.perf_counter()
+                _rank_document(doc_id, emb, k, nprobe=nprobe)
+                timings.append(time.perf_counter() - started)
+            per_nprobe[str(nprobe)] = {
+                f"recall_at_{k}": round(ann_recall_at_k(doc_id, queries, k=k, nprobe=nprobe), 3),
+                "search_p50_ms": _p50_ms(timings),
+            }
+        results["nprobe"] = per_nprobe
+    finally:
+        _drop_document(doc_id)
+    return results
+
+
+def _drop_document(doc_id: str) -> None:
+    """Remove the benchmark document's chunks and indexes (matters with --live)."""
+    from app.db import db
+    from app.services.ann_index import delete_index
+    from app.services.lexical_index import delete_indexes_many
+    from app.services.vector_store import invalidate_document_cache
+
+    db.chunks.delete_many({"doc_id": doc_id})
+    delete_indexes_many([doc_id])
+    delete_index(doc_id)
+    invalidate_document_cache(doc_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=3000, help="approximate document size in chunks")
+    parser.add_argument("-k", type=int, default=8)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--live", action="store_true", help="use the configured MongoDB + embeddings")
+    args = parser.parse_args()
+
+    if not args.live:
+        os.environ.setdefault("ANN_INDEX_DIR", tempfile.mkdtemp(prefix="bench-ann-"))
+        os.environ.setdefault("EMBED_REQUESTS_PER_MINUTE", "0")
+        stand_ins.install(embed_latency_ms=0)
+
+    report = run(args.chunks, args.k, args.nprobe, args.queries)
+    report["store"] = "configured MongoDB" if args.live else "mongomock (in-process)"
+    print(json.dumps(report, indent=2))
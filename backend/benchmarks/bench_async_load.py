@@ -0,0 +1,84 @@
+"""
+Throughput of the summary / question endpoints under concurrent load.
+
+Fires --requests requests at a running backend, --concurrency at a time,
+and reports throughput and latency percentiles. Every request uses its own
+topic and ?refresh=true, so nothing is served from the result cache or
+coalesced with another request: each one does retrieval + a Groq call.
+
+Run it once against the old (blocking) build and once against this one,
+with the same document and a single uvicorn worker:
+
+    cd backend
+    uvicorn app.main:app --workers 1 &
+    python -m benchmarks.bench_async_load --doc-id <doc_id> --concurrency 50
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+import numpy as np
+
+
+def _request(endpoint: str, doc_id: str, i: int):
+    if endpoint == "questions":
+        return "/api/questions/", {"doc_id": doc_id, "num_questions": 1 + i % 5}
+    if endpoint == "full":
+        return "/api/summaries/full", {"doc_id": doc_id}
+    return "/api/summaries/topic", {"doc_id": doc_id, "topic": f"key idea {i}"}
+
+
+async def run(url: str, doc_id: str, endpoint: str, total: int, concurrency: int, timeout: float) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+
+        async def one(i: int) -> None:
+            nonlocal errors
+            path, body = _request(endpoint, doc_id, i)
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    resp = await client.post(path, params={"refresh": "true"}, json=body)
+                    resp.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    return
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        wall_s = time.perf_counter() - started
+
+    ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "endpoint": endpoint,
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(len(latencies) / wall_s, 2) if wall_s else 0.0,
+        "latency_ms_p50": round(float(np.percentile(ms, 50)), 1),
+        "latency_ms_p95": round(float(np.percentile(ms, 95)), 1),
+        "latency_ms_max": round(float(ms.max()), 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--doc-id", required=True)
+    parser.add_argument("--endpoint", choices=("topic", "full", "questions"), default="topic")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    result = asyncio.run(
+        run(args.url, args.doc_id, args.endpoint, args.requests, args.concurrency, args.timeout)
+    )
+    print(json.dumps(result, indent=2))
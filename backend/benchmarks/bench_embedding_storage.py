@@ -0,0 +1,64 @@
+"""
+Storage size and read latency of chunk embeddings per storage format.
+
+Runs offline: encodes synthetic 768-dim chunks to BSON exactly as MongoDB
+stores them, then times BSON decoding + conversion to a NumPy matrix
+(the work search_document does on a cache miss).
+
+    cd backend
+    python -m benchmarks.bench_embedding_storage --chunks 2000
+"""
+
+import argparse
+import json
+import time
+
+import bson
+import numpy as np
+
+from app.services.embedding_codec import encode_embedding, decode_embedding
+
+
+def _chunk(i: int, fields: dict) -> dict:
+    return {"doc_id": "bench", "chunk_index": i, "text": "x" * 800, **fields}
+
+
+def run(num_chunks: int, dim: int, repeats: int) -> dict:
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((num_chunks, dim)).astype(np.float32)
+
+    formats = {
+        "legacy_array": lambda v: {"embedding": v.tolist()},
+        "float32": lambda v: encode_embedding(v, "float32"),
+        "int8": lambda v: encode_embedding(v, "int8"),
+    }
+
+    results = {}
+    for name, encode in formats.items():
+        raw_docs = [bson.encode(_chunk(i, encode(v))) for i, v in enumerate(vectors)]
+        total_bytes = sum(len(d) for d in raw_docs)
+        text_only = len(bson.encode(_chunk(0, {})))
+
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            decoded = [decode_embedding(bson.decode(d)) for d in raw_docs]
+            np.stack(decoded)
+            timings.append(time.perf_counter() - start)
+
+        results[name] = {
+            "total_bytes": total_bytes,
+            "embedding_bytes_per_chunk": total_bytes / num_chunks - text_only,
+            "read_ms_median": 1000 * float(np.median(timings)),
+        }
+
+    return {"chunks": num_chunks, "dim": dim, "formats": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.chunks, args.dim, args.repeats), indent=2))
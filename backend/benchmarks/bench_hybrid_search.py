@@ -0,0 +1,164 @@
+"""
+Vector vs. hybrid (BM25 + vectors, RRF) vs. lexical-only search.
+
+Plants "needle" chunks with exact terms (identifiers, acronyms, formula
+names) in a generated document and queries for them, reporting per mode:
+- recall@k / MRR of the needle chunk
+- latency with the query embedding not cached (embedding call included)
+  and cached (retrieval only)
+- embedding calls made
+
+Offline by default (local stand-ins, see stand_ins.py). The stand-in
+embeddings are hash-based, not semantic, so offline vector quality is a
+floor; --live runs against the configured MongoDB + Nomic instead.
+
+    cd backend
+    python -m benchmarks.bench_hybrid_search
+    python -m benchmarks.bench_hybrid_search --live --chunks 2000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from . import stand_ins
+
+MODES = ("vector", "hybrid", "lexical")
+
+_NEEDLE_TERMS = [
+    "calc_rubisco_rate",
+    "NADPH_OXIDASE_7",
+    "michaelis_menten_km",
+    "PSII_D1",
+    "thylakoid_ph_gradient",
+    "CAM_C4_switch",
+    "FBPase_inhibitor",
+    "quantum_yield_phi",
+    "chl_a_b_ratio",
+    "RuBP_regeneration",
+    "Kok_cycle_S4",
+    "Z_scheme_p680",
+]
+
+
+def _document(num_chunks: int, seed: int = 11):
+    """Background text of ~num_chunks chunks with one needle sentence per term."""
+    from app.services.vector_store import chunk_text
+
+    paragraphs = stand_ins.sample_text(num_chunks * 115, seed=seed).split("\n\n")
+    rng = np.random.default_rng(seed)
+    slots = rng.choice(len(paragraphs), size=len(_NEEDLE_TERMS), replace=False)
+    for term, slot in zip(_NEEDLE_TERMS, slots):
+        paragraphs[slot] += f"\nThe value of {term} is defined in this section."
+    chunks = chunk_text("\n\n".join(paragraphs))
+    needles = {term: {i for i, c in enumerate(chunks) if term in c} for term in _NEEDLE_TERMS}
+    return "\n\n".join(paragraphs), needles
+
+
+def _forget_queries(queries: List[str]) -> None:
+    """Drop these queries from both tiers of the query embedding cache."""
+    from app.db import db
+    from app.services import query_cache
+
+    keys = [query_cache._cache_key(query_cache.normalize_query(q)) for q in queries]
+    with query_cache._lock:
+        for key in keys:
+            query_cache._memory.pop(key, None)
+    db.query_embeddings.delete_many({"_id": {"$in": keys}})
+
+
+def _count_embed_calls():
+    from app.resources import get_embeddings
+
+    embeddings = get_embeddings()
+    counter = {"calls": 0}
+    original = embeddings.embed_query
+
+    def counted(text):
+        counter["calls"] += 1
+        return original(text)
+
+    object.__setattr__(embeddings, "embed_query", counted)
+    return counter, lambda: object.__setattr__(embeddings, "embed_query", original)
+
+
+def run(num_chunks: int, k: int) -> Dict:
+    from app.services.vector_store import index_document, search_document, invalidate_document_cache
+
+    doc_id = f"bench-hybrid-{num_chunks}"
+    text, needles = _document(num_chunks)
+    started = time.perf_counter()
+    stats = index_document(doc_id, text)
+    index_s = time.perf_counter() - started
+
+    queries = {term: f"what is {term}" for term in _NEEDLE_TERMS}
+    counter, restore = _count_embed_calls()
+    results = {"chunks": stats["chunks"], "index_s": round(index_s, 3), "k": k}
+    try:
+        for mode in MODES:
+            invalidate_document_cache(doc_id)
+            _forget_queries(list(queries.values()))
+            counter["calls"] = 0
+            hits, reciprocal, cold, warm = 0, 0.0, [], []
+            for term, query in queries.items():
+                started = time.perf_counter()
+                top = search_document(doc_id, query, n_results=k, mode=mode)
+                cold.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                search_document(doc_id, query, n_results=k, mode=mode)
+                warm.append(time.perf_counter() - started)
+
+                ranks = [r for r, c in enumerate(top, start=1) if c["chunk_index"] in needles[term]]
+                if ranks:
+                    hits += 1
+                    reciprocal += 1 / ranks[0]
+            results[mode] = {
+                f"recall_at_{k}": round(hits / len(queries), 3),
+                "mrr": round(reciprocal / len(queries), 3),
+                "uncached_p50_ms": round(float(np.percentile(cold, 50)) * 1000, 3),
+                "uncached_p99_ms": round(float(np.percentile(cold, 99)) * 1000, 3),
+                "cached_p50_ms": round(float(np.percentile(warm, 50)) * 1000, 3),
+                "embedding_calls": counter["calls"],
+            }
+    finally:
+        restore()
+        _drop_document(doc_id)
+    return results
+
+
+def _drop_document(doc_id: str) -> None:
+    """Remove the benchmark document's chunks and indexes (matters with --live)."""
+    from app.db import db
+    from app.services.ann_index import delete_index
+    from app.services.lexical_index import delete_indexes_many
+    from app.services.vector_store import invalidate_document_cache
+
+    db.chunks.delete_many({"doc_id": doc_id})
+    delete_indexes_many([doc_id])
+    delete_index(doc_id)
+    invalidate_document_cache(doc_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=1000, help="approximate document size in chunks")
+    parser.add_argument("-k", type=int, default=8)
+    parser.add_argument("--live", action="store_true", help="use the configured MongoDB + embeddings")
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0, help="stand-in embedding round trip")
+    args = parser.parse_args()
+
+    if not args.live:
+        os.environ.setdefault("ANN_INDEX_DIR", tempfile.mkdtemp(prefix="bench-ann-"))
+        os.environ.setdefault("EMBED_REQUESTS_PER_MINUTE", "0")
+        stand_ins.install(embed_latency_ms=args.embed_latency_ms)
+
+    report = run(args.chunks, args.k)
+    # Lexical searches without a cached matrix read their top chunks by
+    # chunk_index; mongomock scans for that, MongoDB uses the index
+    report["store"] = "configured MongoDB" if args.live else "mongomock (in-process)"
+    print(json.dumps(report, indent=2))
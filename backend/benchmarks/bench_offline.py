@@ -0,0 +1,275 @@
+"""
+Offline benchmark suite: extraction, indexing, retrieval and endpoints.
+
+Runs without API keys or MongoDB: embeddings, the chat model and the
+database are local stand-ins (see stand_ins.py), so the numbers measure
+this backend's own overhead. The fake LLM answers after --llm-latency-ms
+to model Groq. Results are written as JSON for run-to-run comparison:
+
+    cd backend
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.bench_offline --output bench.json
+    python -m benchmarks.bench_offline --only search endpoints --quick
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from . import stand_ins
+
+SECTIONS = ("extraction", "indexing", "search", "endpoints")
+
+
+def _percentiles(samples_s: List[float]) -> Dict[str, float]:
+    ms = np.array(samples_s) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# ========= Extraction =========
+
+
+def bench_extraction(quick: bool) -> Dict:
+    from app.services.text_extraction import OCR_ENABLED, extract_text_from_bytes
+
+    scale = 1 if quick else 4
+    samples = {
+        "txt": ("notes.txt", stand_ins.sample_text(50_000 * scale).encode("utf-8")),
+        "docx": ("notes.docx", stand_ins.sample_docx(100 * scale)),
+        "pdf": ("notes.pdf", stand_ins.sample_pdf(20 * scale)),
+        # OCR path (0 chars extracted when OCR is off or Tesseract is missing)
+        "png": ("scan.png", stand_ins.sample_png(20 * scale)),
+    }
+    results = {}
+    for fmt, (filename, raw) in samples.items():
+        timings = []
+        chars = 0
+        for _ in range(3):
+            started = time.perf_counter()
+            chars = len(extract_text_from_bytes(raw, filename=filename))
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        results[fmt] = {
+            "bytes": len(raw),
+            "chars_extracted": chars,
+            "best_ms": round(best * 1000, 3),
+            "mb_per_s": round(len(raw) / best / 1e6, 2),
+        }
+    results["png"]["ocr_enabled"] = OCR_ENABLED
+    return results
+
+
+# ========= Indexing =========
+
+
+def bench_indexing(quick: bool) -> Dict:
+    from app.services.vector_store import index_document
+
+    sizes = [20_000, 100_000] if quick else [20_000, 100_000, 400_000]
+    results = {}
+    for i, words in enumerate(sizes):
+        text = stand_ins.sample_text(words, seed=100 + i)
+        started = time.perf_counter()
+        cold = index_document(f"bench-index-{i}", text)
+        cold_s = time.perf_counter() - started
+
+        # Same text again: every chunk embedding comes from the cache
+        started = time.perf_counter()
+        warm = index_document(f"bench-index-{i}-again", text)
+        warm_s = time.perf_counter() - started
+
+        results[f"{words}_words"] = {
+            "chunks": cold["chunks"],
+            "cold_s": round(cold_s, 3),
+            "cold_chunks_per_s": round(cold["chunks"] / cold_s, 1),
+            "cached_s": round(warm_s, 3),
+            "cached_chunks_per_s": round(warm["chunks"] / warm_s, 1),
+            "cache_hits": warm["cache_hits"],
+        }
+    return results
+
+
+# ========= Search =========
+
+
+def bench_search(quick: bool) -> Dict:
+    from app.services.vector_store import index_document, search_document, invalidate_document_cache
+
+    # ~800-character chunks; a sentence of the sample text is ~80 characters
+    chunk_counts = [100, 1000] if quick else [100, 1000, 5000]
+    queries = [f"{a} {b}" for a in stand_ins._WORDS[:10] for b in stand_ins._WORDS[10:20]]
+    results = {}
+    for count in chunk_counts:
+        doc_id = f"bench-search-{count}"
+        stats = index_document(doc_id, stand_ins.sample_text(count * 115, seed=count))
+
+        invalidate_document_cache(doc_id)
+        started = time.perf_counter()
+        search_document(doc_id, queries[0])
+        cold_ms = (time.perf_counter() - started) * 1000
+
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            search_document(doc_id, query)
+            timings.append(time.perf_counter() - started)
+
+        results[f"{stats['chunks']}_chunks"] = {
+            "chunks": stats["chunks"],
+            "cold_ms": round(cold_ms, 2),
+            "queries": len(timings),
+            **_percentiles(timings),
+        }
+    return results
+
+
+# ========= Endpoints =========
+
+
+async def _load(client, requests: List, concurrency: int) -> Dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+    errors = 0
+
+    async def one(path: str, body: Dict) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            resp = await client.post(path, json=body)
+            if resp.status_code != 200:
+                errors += 1
+                return
+            timings.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(path, body) for path, body in requests))
+    wall_s = time.perf_counter() - started
+    return {
+        "requests": len(requests),
+        "errors": errors,
+        "concurrency": concurrency,
+        "throughput_rps": round(len(timings) / wall_s, 1),
+        **(_percentiles(timings) if timings else {}),
+    }
+
+
+async def _bench_endpoints(quick: bool, concurrency: int) -> Dict:
+    import httpx
+
+    from app.db import db
+    from app.main import app
+    from app.services.vector_store import index_document
+
+    doc_id = "bench-endpoints"
+    index_document(doc_id, stand_ins.sample_text(20_000, seed=7))
+    db.documents.insert_one(
+        {"doc_id": doc_id, "created_at": datetime.datetime.utcnow(), "status": "done", "has_text": True}
+    )
+
+    total = 100 if quick else 400
+    workloads = {
+        # Distinct topics + refresh: every request runs retrieval and an LLM call
+        "topic_summary_uncached": [
+            ("/api/summaries/topic?refresh=true", {"doc_id": doc_id, "topic": f"topic {i}"})
+            for i in range(total)
+        ],
+        # Identical requests: served from the result cache after the first
+        "full_summary_cached": [("/api/summaries/full", {"doc_id": doc_id})] * total,
+        # refresh with 5 distinct num_questions: concurrent duplicates are coalesced
+        "questions_refresh": [
+            ("/api/questions/?refresh=true", {"doc_id": doc_id, "num_questions": 1 + i % 5})
+            for i in range(total)
+        ],
+    }
+
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        # Prime the result cache for the cached workload
+        await client.post("/api/summaries/full", json={"doc_id": doc_id})
+        for name, requests in workloads.items():
+            results[name] = await _load(client, requests, concurrency)
+    return results
+
+
+def bench_endpoints(quick: bool, concurrency: int) -> Dict:
+    return asyncio.run(_bench_endpoints(quick, concurrency))
+
+
+# ========= Runner =========
+
+
+def run(sections, quick: bool, llm_latency_ms: float, embed_latency_ms: float, concurrency: int) -> Dict:
+    stand_ins.install(llm_latency_ms=llm_latency_ms, embed_latency_ms=embed_latency_ms)
+
+    result = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "quick": quick,
+            "llm_latency_ms": llm_latency_ms,
+            "embed_latency_ms": embed_latency_ms,
+            "store": "mongomock (in-process; absolute DB timings differ from MongoDB)",
+        }
+    }
+    runners = {
+        "extraction": lambda: bench_extraction(quick),
+        "indexing": lambda: bench_indexing(quick),
+        "search": lambda: bench_search(quick),
+        "endpoints": lambda: bench_endpoints(quick, concurrency),
+    }
+    for section in sections:
+        started = time.perf_counter()
+        result[section] = runners[section]()
+        print(f"{section}: {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument("--quick", action="store_true", help="smaller inputs (CI smoke run)")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    # Keep ANN index files and the app's startup work out of the way
+    os.environ.setdefault("ANN_INDEX_DIR", tempfile.mkdtemp(prefix="bench-ann-"))
+    os.environ.setdefault("WARM_UP_ON_STARTUP", "0")
+    # The stand-in embeddings have no provider rate limit to respect
+    os.environ.setdefault("EMBED_REQUESTS_PER_MINUTE", "0")
+
+    report = run(args.only, args.quick, args.llm_latency_ms, args.embed_latency_ms, args.concurrency)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
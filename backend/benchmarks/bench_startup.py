@@ -0,0 +1,68 @@
+"""
+Cold import time of the backend and the cost of the startup warm-up.
+
+Each repeat imports app.main in a fresh interpreter (what a new uvicorn
+worker does) and records the wall time. With --warm-up it also runs
+resources.warm_up() and reports the time per resource; that step needs
+the real MONGODB_URI / GROQ_API_KEY / NOMIC_API_KEY.
+
+    cd backend
+    python -m benchmarks.bench_startup --repeats 5
+    python -m benchmarks.bench_startup --warm-up
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+_IMPORT_SNIPPET = """
+import json, time
+started = time.perf_counter()
+import app.main
+result = {"import_s": time.perf_counter() - started}
+if WARM_UP:
+    from app import resources
+    result["warm_up_s"] = resources.warm_up()
+print(json.dumps(result))
+"""
+
+
+def _run_once(warm_up: bool) -> dict:
+    env = dict(os.environ)
+    # Import must not need the keys; placeholders only matter for --warm-up
+    env.setdefault("GROQ_API_KEY", "")
+    env.setdefault("NOMIC_API_KEY", "")
+    out = subprocess.run(
+        [sys.executable, "-c", f"WARM_UP = {warm_up!r}\n" + _IMPORT_SNIPPET],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run(repeats: int, warm_up: bool) -> dict:
+    runs = [_run_once(warm_up) for _ in range(repeats)]
+    imports = [r["import_s"] * 1000 for r in runs]
+    result = {
+        "repeats": repeats,
+        "import_ms_median": round(float(np.median(imports)), 1),
+        "import_ms_max": round(float(np.max(imports)), 1),
+    }
+    if warm_up:
+        result["warm_up_s"] = runs[-1]["warm_up_s"]
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--warm-up", action="store_true")
+    args = parser.parse_args()
+    print(json.dumps(run(args.repeats, args.warm_up), indent=2))
@@ -0,0 +1,31 @@
+"""
+Assert that the hot MongoDB queries use indexes.
+
+Provisions the indexes (same as app startup), explains each query on the
+request / cleanup path and exits with status 1 if any of them does a
+collection scan or an in-memory sort. Needs a reachable MONGODB_URI;
+queries against an empty database still show the chosen plan.
+
+    cd backend
+    python -m benchmarks.check_query_plans [--doc-id <doc_id>]
+"""
+
+import argparse
+import json
+import sys
+
+from app.services.indexes import ensure_indexes, check_query_plans
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--doc-id", default=None)
+    args = parser.parse_args()
+
+    ensure_indexes()
+    plans = check_query_plans(args.doc_id)
+    print(json.dumps(plans, indent=2))
+    failed = [name for name, plan in plans.items() if not plan["ok"]]
+    if failed:
+        print(f"Unindexed queries: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,33 @@
+"""
+Convert chunk embeddings still stored as BSON float arrays (uploads from
+before the binary storage formats) to EMBEDDING_STORAGE, or --mode.
+
+Safe to re-run and to run while the app serves requests: search reads
+both formats, and converted documents' cached matrices are invalidated.
+Needs a reachable MONGODB_URI.
+
+    cd backend
+    python -m benchmarks.migrate_embeddings [--mode int8] [--dry-run]
+"""
+
+import argparse
+import json
+
+from app.config import EMBEDDING_STORAGE
+from app.db import db
+from app.services.embedding_codec import STORAGE_MODES
+from app.services.vector_store import migrate_embeddings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=STORAGE_MODES, default=EMBEDDING_STORAGE)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="only count the chunks to convert")
+    args = parser.parse_args()
+
+    legacy = db.chunks.count_documents({"embedding": {"$type": "array"}})
+    result = {"mode": args.mode, "legacy_chunks": legacy}
+    if not args.dry_run and legacy:
+        result["converted"] = migrate_embeddings(args.mode, batch_size=args.batch_size)
+    print(json.dumps(result, indent=2))
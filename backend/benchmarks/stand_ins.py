@@ -0,0 +1,327 @@
+"""
+Local stand-ins for the external services, for offline benchmarks:
+
+- FakeEmbeddings: deterministic vectors derived from a hash of the text
+- FakeChatModel: canned summaries / MCQ JSON after a configurable latency,
+  streamed word by word like a real chat model
+- MemoryDatabase / AsyncMemoryDatabase: mongomock, plus the few pieces
+  the backend needs that mongomock lacks (bulk_write with current
+  pymongo, an awaitable API)
+
+install() puts them into the shared resource registry, so the app code
+runs unchanged without API keys or a MongoDB server.
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import mongomock
+import numpy as np
+import pymongo
+from pymongo.results import BulkWriteResult
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+# ========= Embeddings =========
+
+
+class FakeEmbeddings:
+    """Random normal vectors seeded by a hash of the text (same text -> same vector)."""
+
+    def __init__(self, dim: int = 768, latency_ms: float = 0.0):
+        self.model = f"fake-embed-{dim}"
+        self.dim = dim
+        self.latency_ms = latency_ms
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency_ms / 1000)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency_ms / 1000)
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._vector(text)
+
+
+# ========= Chat model =========
+
+_MCQ = {
+    "question": "Which process converts light energy into chemical energy?",
+    "options": ["Respiration", "Photosynthesis", "Fermentation", "Digestion"],
+    "answer": "B",
+    "explanation": "Photosynthesis stores light energy as glucose.",
+}
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Answers after `latency_ms`: a JSON array of MCQs when the prompt asks
+    for one, otherwise a short summary. Streaming yields one word at a time.
+    """
+
+    latency_ms: float = 200.0
+    model_name: str = "fake-chat"
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        prompt = str(messages[-1].content)
+        if "JSON array" in prompt:
+            return json.dumps([_MCQ] * 5, indent=2)
+        return "This document explains its main ideas, key definitions and formulas in order."
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency_ms / 1000)
+        for word in self._reply(messages).split(" "):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        for word in self._reply(messages).split(" "):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+# ========= MongoDB =========
+
+
+class MemoryCollection:
+    """mongomock collection with a bulk_write that works with current pymongo."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def bulk_write(self, requests, ordered: bool = True, **kwargs):
+        counts = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []}
+
+        def updated(result):
+            counts["nMatched"] += result.matched_count
+            counts["nModified"] += result.modified_count
+            if result.upserted_id is not None:
+                counts["nUpserted"] += 1
+
+        for op in requests:
+            if isinstance(op, pymongo.InsertOne):
+                self._collection.insert_one(op._doc)
+                counts["nInserted"] += 1
+            elif isinstance(op, pymongo.UpdateOne):
+                updated(self._collection.update_one(op._filter, op._doc, upsert=op._upsert))
+            elif isinstance(op, pymongo.UpdateMany):
+                updated(self._collection.update_many(op._filter, op._doc, upsert=op._upsert))
+            elif isinstance(op, pymongo.ReplaceOne):
+                updated(self._collection.replace_one(op._filter, op._doc, upsert=op._upsert))
+            elif isinstance(op, pymongo.DeleteOne):
+                counts["nRemoved"] += self._collection.delete_one(op._filter).deleted_count
+            elif isinstance(op, pymongo.DeleteMany):
+                counts["nRemoved"] += self._collection.delete_many(op._filter).deleted_count
+            else:
+                raise TypeError(f"Unsupported bulk operation: {op!r}")
+        return BulkWriteResult(counts, acknowledged=True)
+
+
+class MemoryDatabase:
+    def __init__(self, name: str = "bench"):
+        self._db = mongomock.MongoClient()[name]
+
+    def __getattr__(self, name):
+        return MemoryCollection(self._db[name])
+
+    def __getitem__(self, name):
+        return MemoryCollection(self._db[name])
+
+    def command(self, *args, **kwargs):
+        return self._db.command(*args, **kwargs)
+
+
+class _AsyncCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, n: int):
+        self._cursor = self._cursor.limit(n)
+        return self
+
+    async def to_list(self, length=None):
+        return list(self._cursor)
+
+    async def __aiter__(self):
+        for doc in self._cursor:
+            yield doc
+
+
+class _AsyncCollection:
+    def __init__(self, collection: MemoryCollection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs):
+        return _AsyncCursor(self._collection.find(*args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+
+class AsyncMemoryDatabase:
+    """Awaitable view of a MemoryDatabase (same data), like AsyncMongoClient's API."""
+
+    def __init__(self, sync_db: MemoryDatabase):
+        self._db = sync_db
+
+    def __getattr__(self, name):
+        return _AsyncCollection(self._db[name])
+
+    def __getitem__(self, name):
+        return _AsyncCollection(self._db[name])
+
+
+def install(llm_latency_ms: float = 200.0, embed_latency_ms: float = 0.0, dim: int = 768) -> MemoryDatabase:
+    """Register the stand-ins as the app's shared resources; returns the database."""
+    from app import resources
+
+    memory_db = MemoryDatabase()
+    resources._instances.update(
+        {
+            "db": memory_db,
+            "async_db": AsyncMemoryDatabase(memory_db),
+            "llm": FakeChatModel(latency_ms=llm_latency_ms),
+            "embeddings": FakeEmbeddings(dim=dim, latency_ms=embed_latency_ms),
+        }
+    )
+    return memory_db
+
+
+# ========= Sample documents =========
+
+_WORDS = (
+    "photosynthesis converts light energy into chemical energy stored in glucose "
+    "chlorophyll absorbs red and blue light while reflecting green wavelengths "
+    "the calvin cycle fixes carbon dioxide using atp and nadph from the light reactions"
+).split()
+
+
+def sample_text(num_words: int, seed: int = 0) -> str:
+    rng = np.random.default_rng(seed)
+    words = rng.choice(_WORDS, size=num_words)
+    lines = [" ".join(words[i : i + 12]) + "." for i in range(0, num_words, 12)]
+    paragraphs = ["\n".join(lines[i : i + 8]) for i in range(0, len(lines), 8)]
+    return "\n\n".join(paragraphs)
+
+
+def sample_pdf(num_pages: int, lines_per_page: int = 40, seed: int = 0) -> bytes:
+    """Minimal text-layer PDF (Helvetica, one text object per page)."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in range(num_pages):
+        text = sample_text(lines_per_page * 12, seed=seed + page).replace("\n\n", "\n").split("\n")
+        ops = ["BT /F1 10 Tf 12 TL 40 800 Td"]
+        for line in text[:lines_per_page]:
+            ops.append("(" + line.replace("\\", "").replace("(", "").replace(")", "") + ") '")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % num_pages
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def sample_docx(num_paragraphs: int, seed: int = 0) -> bytes:
+    from docx import Document
+
+    document = Document()
+    for i in range(num_paragraphs):
+        document.add_paragraph(sample_text(60, seed=seed + i))
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+
+def sample_png(num_lines: int, seed: int = 0) -> bytes:
+    """Black-on-white scan of sample text lines (PIL's default font)."""
+    from PIL import Image, ImageDraw
+
+    lines = sample_text(num_lines * 10, seed=seed).replace("\n\n", "\n").split("\n")[:num_lines]
+    image = Image.new("L", (1200, 20 * len(lines) + 40), 255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((20, 20 + 20 * i), line, fill=0)
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
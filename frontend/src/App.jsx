@@ -433,6 +433,22 @@ function App() {
     };
   }, []);
 
+  // Uploads are indexed in the background; poll until the backend is done.
+  async function waitForIndexing(id, initialStatus, fileName) {
+    let status = { status: initialStatus };
+    while (status.status !== "done" && status.status !== "failed") {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      const res = await fetch(`${BACKEND_URL}/api/documents/${id}/status`);
+      if (!res.ok) {
+        return { status: "failed", error: "Could not read indexing status." };
+      }
+      status = await res.json();
+      const pct = Math.round((status.progress || 0) * 100);
+      setStatusMessage(`Indexing "${fileName}"… ${status.status} (${pct}%)`);
+    }
+    return status;
+  }
+
   async function handleUpload(e) {
     const file = e.target.files && e.target.files[0];
     if (!file) return;
@@ -461,8 +477,15 @@ function App() {
       }
 
       if (res.ok) {
-        setDocId(data.doc_id);
-        setStatusMessage(`"${file.name}" uploaded & indexed successfully.`);
+        const status = await waitForIndexing(data.doc_id, data.status, file.name);
+        if (status.status === "done") {
+          setDocId(data.doc_id);
+          setStatusMessage(`"${file.name}" uploaded & indexed successfully.`);
+        } else {
+          setDocId(null);
+          setStatusMessage("");
+          alert(status.error || "Indexing failed on backend.");
+        }
       } else {
         setDocId(null);
         setStatusMessage("");
@@ -478,18 +501,55 @@ function App() {
     }
   }
 
+  // POST to a streaming endpoint and call onEvent(event, data) for each
+  // server-sent event as it arrives.
+  async function streamEvents(path, body, onEvent) {
+    const res = await fetch(`${BACKEND_URL}${path}`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(body)
+    });
+    if (!res.ok || !res.body) {
+      throw new Error(`Request failed with status ${res.status}`);
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let sep;
+      while ((sep = buffer.indexOf("\n\n")) !== -1) {
+        const raw = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+        let event = "message";
+        let data = "";
+        for (const line of raw.split("\n")) {
+          if (line.startsWith("event: ")) event = line.slice(7);
+          else if (line.startsWith("data: ")) data += line.slice(6);
+        }
+        onEvent(event, data ? JSON.parse(data) : {});
+      }
+    }
+  }
+
   async function fetchFullSummary() {
     if (!docId) return;
     setActiveTab("summary");
     setSummary("Loading summary…");
     try {
-      const res = await fetch(`${BACKEND_URL}/api/summaries/full`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ doc_id: docId })
+      let text = "";
+      await streamEvents("/api/summaries/full/stream", { doc_id: docId }, (event, data) => {
+        if (event === "token") {
+          text += data.text;
+          setSummary(text);
+        } else if (event === "error") {
+          setSummary(data.detail || "Error generating summary");
+        }
       });
-      const data = await res.json();
-      setSummary(data.summary || data.error || "Error generating summary");
+      if (!text) setSummary((prev) => prev || "Error generating summary");
     } catch (err) {
       console.error("Summary error:", err);
       setSummary("Failed to reach backend.");
@@ -501,15 +561,16 @@ function App() {
     setActiveTab("topic");
     setTopicSummary("Loading topic summary…");
     try {
-      const res = await fetch(`${BACKEND_URL}/api/summaries/topic`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ doc_id: docId, topic })
+      let text = "";
+      await streamEvents("/api/summaries/topic/stream", { doc_id: docId, topic }, (event, data) => {
+        if (event === "token") {
+          text += data.text;
+          setTopicSummary(text);
+        } else if (event === "error") {
+          setTopicSummary(data.detail || "Error generating topic summary");
+        }
       });
-      const data = await res.json();
-      setTopicSummary(
-        data.summary || data.error || "Error generating topic summary"
-      );
+      if (!text) setTopicSummary((prev) => prev || "Error generating topic summary");
     } catch (err) {
       console.error("Topic summary error:", err);
       setTopicSummary("Failed to reach backend.");
@@ -522,18 +583,18 @@ function App() {
     setQuestions([]);
     setAnswers([]);
     try {
-      const res = await fetch(`${BACKEND_URL}/api/questions`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ doc_id: docId, num_questions: numQuestions })
-      });
-      const data = await res.json();
-      if (!res.ok) {
-        alert(data.error || "Failed to generate questions");
-        return;
-      }
-      setQuestions(data.questions || []);
-      setAnswers(data.answers || []);
+      await streamEvents(
+        "/api/questions/stream",
+        { doc_id: docId, num_questions: numQuestions },
+        (event, data) => {
+          if (event === "question") {
+            setQuestions((prev) => [...prev, data.question]);
+            setAnswers((prev) => [...prev, data.answer]);
+          } else if (event === "error") {
+            alert(data.detail || "Failed to generate questions");
+          }
+        }
+      );
     } catch (err) {
       console.error("Questions error:", err);
       alert("Failed to reach backend for questions.");